@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flask_cors import CORS
 from transformers import (
     AutoTokenizer,
@@ -9,55 +9,219 @@ from transformers import (
 import numpy as np
 import torch
 import re
-from word2number import w2n
 from spellchecker import SpellChecker
-from rapidfuzz import fuzz # For fuzzy matching medicine names
+from spelling_index import SymSpellIndex, symptoms_digest, vocabulary_from_names, vocabulary_from_symptoms_csv
 import json # NEW IMPORT: For loading JSON
 import os # NEW IMPORT: For checking file existence
+import time
+from functools import lru_cache
+from inference_batcher import MicroBatcher
+from medicine_matcher import MedicineMatcher
+from model_registry import ModelRegistry
+from inference_mode import INFERENCE_MODE, prepare_for_inference
+from stage_cache import SqliteCacheTier, StageCache
+from response_cache import ResponseCache, etag_matches
+from medicine_catalog import MedicineCatalog, load_catalog
+from detail_extraction import extract_segment_details, parse_ner_dosage, extract_general_advice
+from text_chunker import chunk_text, join_chunk_outputs, stitch_entities
+from model_bundle import BUNDLE_LOAD_KWARGS, BUNDLE_TOKENIZER_KWARGS, HUB_MODELS, bundled_model_path, model_version
+from metrics import CONTENT_TYPE, METRICS, record_request, record_stage, time_stage
+from tracing import TRACER, trace_event
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize spell checker (load once)
+# Initialize spell checker (load once); its word frequencies seed the symmetric-delete spelling index
 spell = SpellChecker()
+SYMPTOMS_CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "symptoms.csv")
 
 # Device configuration (for GPU if available, otherwise CPU)
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-print(f"Using device: {device}")
-
-# --- Load Biomedical NER model ---
-ner_model_name = "d4data/biomedical-ner-all"
-print(f"Loading NER model: {ner_model_name}...")
-ner_tokenizer = AutoTokenizer.from_pretrained(ner_model_name)
-ner_model = AutoModelForTokenClassification.from_pretrained(ner_model_name).to(device)
-ner_pipeline = pipeline(
-    "ner",
-    model=ner_model,
-    tokenizer=ner_tokenizer,
-    aggregation_strategy="simple",
-    device=0 if torch.cuda.is_available() else -1
-)
-print("SUCCESS: Biomedical NER model loaded.")
-
-# --- Load Grammar Correction model ---
-grammar_model_name = "vennify/t5-base-grammar-correction"
-print(f"Loading Grammar Correction model: {grammar_model_name}...")
-grammar_tokenizer = AutoTokenizer.from_pretrained(grammar_model_name)
-grammar_model = AutoModelForSeq2SeqLM.from_pretrained(grammar_model_name).to(device)
-print("SUCCESS: Grammar Correction model loaded.")
-
-# --- Load Abstractive Summarization Model (Still loaded, but its direct output will be used differently) ---
-summary_model_name = "t5-base"
-print(f"Loading Summarization model: {summary_model_name}...")
-summary_tokenizer = AutoTokenizer.from_pretrained(summary_model_name)
-summary_model = AutoModelForSeq2SeqLM.from_pretrained(summary_model_name).to(device)
-summary_pipeline = pipeline(
-    "summarization",
-    model=summary_model,
-    tokenizer=summary_tokenizer,
-    device=0 if torch.cuda.is_available() else -1
-)
-print("SUCCESS: Abstractive Summarization model loaded.")
+print(f"Using device: {device} (inference mode: {INFERENCE_MODE})")
+
+# --- Model registration (loaded lazily on first use or by the background warm-up) ---
+# MEDICARE_MODEL_MEMORY_BUDGET_MB / MEDICARE_MODEL_IDLE_SECONDS bound how much stays resident
+MODEL_REGISTRY = ModelRegistry.from_env()
+
+ner_model_name = HUB_MODELS["ner"]
+grammar_model_name = HUB_MODELS["grammar"]
+summary_model_name = HUB_MODELS["summary"]
+
+def pretrained_source(key):
+    """
+    Where to load model `key` from: (path or Hub name, tokenizer kwargs, model kwargs).
+    With MEDICARE_MODEL_BUNDLE set this is the local snapshot, loaded without any network access.
+    """
+    bundled_path = bundled_model_path(key)
+    if bundled_path is None:
+        return HUB_MODELS[key], {}, {}
+    return bundled_path, BUNDLE_TOKENIZER_KWARGS, BUNDLE_LOAD_KWARGS
+
+def load_ner_model(inference_mode=None):
+    """Loads the Biomedical NER model and wraps it in a token-classification pipeline."""
+    source, tokenizer_kwargs, model_kwargs = pretrained_source("ner")
+    print(f"Loading NER model: {source}...")
+    ner_tokenizer = AutoTokenizer.from_pretrained(source, **tokenizer_kwargs)
+    ner_model = prepare_for_inference(
+        AutoModelForTokenClassification.from_pretrained(source, **model_kwargs), device, inference_mode
+    )
+    ner_pipeline = pipeline(
+        "ner",
+        model=ner_model,
+        tokenizer=ner_tokenizer,
+        aggregation_strategy="simple",
+        device=0 if torch.cuda.is_available() else -1
+    )
+    print("SUCCESS: Biomedical NER model loaded.")
+    return ner_pipeline
+
+def load_grammar_model(inference_mode=None):
+    """Loads the grammar correction T5 model; returns (tokenizer, model)."""
+    source, tokenizer_kwargs, model_kwargs = pretrained_source("grammar")
+    print(f"Loading Grammar Correction model: {source}...")
+    grammar_tokenizer = AutoTokenizer.from_pretrained(source, **tokenizer_kwargs)
+    grammar_model = prepare_for_inference(
+        AutoModelForSeq2SeqLM.from_pretrained(source, **model_kwargs), device, inference_mode
+    )
+    print("SUCCESS: Grammar Correction model loaded.")
+    return grammar_tokenizer, grammar_model
+
+def load_summary_model(inference_mode=None):
+    """Loads the abstractive summarization model (only used when no symptoms/diseases are found)."""
+    source, tokenizer_kwargs, model_kwargs = pretrained_source("summary")
+    print(f"Loading Summarization model: {source}...")
+    summary_tokenizer = AutoTokenizer.from_pretrained(source, **tokenizer_kwargs)
+    summary_model = prepare_for_inference(
+        AutoModelForSeq2SeqLM.from_pretrained(source, **model_kwargs), device, inference_mode
+    )
+    summary_pipeline = pipeline(
+        "summarization",
+        model=summary_model,
+        tokenizer=summary_tokenizer,
+        device=0 if torch.cuda.is_available() else -1
+    )
+    print("SUCCESS: Abstractive Summarization model loaded.")
+    return summary_pipeline
+
+# Dummy inferences that prime allocations and kernels before real traffic arrives
+WARMUP_TEXT = "Patient has fever and headache. Take paracetamol 500 mg twice a day for three days."
+
+def warm_up_ner_model(ner_pipeline):
+    ner_pipeline(WARMUP_TEXT)
+
+def warm_up_grammar_model(grammar):
+    grammar_tokenizer, grammar_model = grammar
+    input_ids = grammar_tokenizer.encode(f"grammar: {WARMUP_TEXT}", return_tensors="pt").to(device)
+    grammar_model.generate(input_ids, max_length=128, num_beams=4, early_stopping=True)
+
+def warm_up_summary_model(summary_pipeline):
+    summary_pipeline(WARMUP_TEXT, max_new_tokens=20, min_length=5, do_sample=False)
+
+# Models the /ner path needs before this instance should receive traffic.
+# They are pinned so idle eviction never takes an instance out of readiness;
+# the fallback summarizer can be evicted and reloaded on demand.
+READINESS_MODELS = ("spelling", "ner", "grammar")
+
+def load_spelling_index():
+    """
+    Builds the symmetric-delete spelling index from the English dictionary plus the
+    medicine catalog and symptom vocabulary (takes a few seconds, so it is loaded like a model).
+    """
+    print("Building spelling index...")
+    protected_words = vocabulary_from_names(LOADED_MEDICINE_NAMES)
+    if os.path.exists(SYMPTOMS_CSV_FILE):
+        protected_words |= vocabulary_from_symptoms_csv(SYMPTOMS_CSV_FILE)
+    else:
+        print(f"WARNING: {SYMPTOMS_CSV_FILE} not found; spelling index built without the symptom vocabulary.")
+    spelling_index = SymSpellIndex(spell.word_frequency.dictionary, protected_words)
+    print(f"SUCCESS: Spelling index built over {len(spelling_index.words)} words.")
+    return spelling_index
+
+MODEL_REGISTRY.register("spelling", load_spelling_index, pinned=True)
+MODEL_REGISTRY.register("ner", load_ner_model, warm_up_ner_model, pinned=True)
+MODEL_REGISTRY.register("grammar", load_grammar_model, warm_up_grammar_model, pinned=True)
+MODEL_REGISTRY.register("summary", load_summary_model, warm_up_summary_model)
+
+# Comma-separated models to load and warm up in the background at startup (started once the
+# medicine catalog is loaded). The summarizer is left out by default so it stays lazy;
+# set to "" to disable warm-up.
+WARMUP_MODELS = [
+    name.strip()
+    for name in os.environ.get("MEDICARE_WARMUP_MODELS", ",".join(READINESS_MODELS)).split(",")
+    if name.strip()
+]
+
+# --- Cross-request micro-batching for the model stages ---
+# Concurrent /ner requests are collected for up to BATCH_MAX_WAIT_MS (or until
+# BATCH_MAX_SIZE inputs are queued) and run as one padded forward pass.
+BATCH_MAX_SIZE = int(os.environ.get("MEDICARE_BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.environ.get("MEDICARE_BATCH_MAX_WAIT_MS", "10"))
+
+def grammar_correct_batch(texts):
+    """Runs the grammar T5 model over a padded batch of texts."""
+    with MODEL_REGISTRY.use("grammar") as (grammar_tokenizer, grammar_model):
+        inputs = grammar_tokenizer(
+            [f"grammar: {text}" for text in texts], return_tensors="pt", padding=True
+        ).to(device)
+        outputs = grammar_model.generate(**inputs, max_length=128, num_beams=4, early_stopping=True)
+        return grammar_tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def ner_batch(texts):
+    """Runs the NER pipeline over a batch of texts, one entity list per text."""
+    with MODEL_REGISTRY.use("ner") as ner_pipeline:
+        return ner_pipeline(texts, batch_size=len(texts))
+
+def summarize_batch(texts):
+    """Runs the summarization pipeline over a batch of texts, one summary string per text."""
+    with MODEL_REGISTRY.use("summary") as summary_pipeline:
+        results = summary_pipeline(texts, max_new_tokens=100, min_length=20, do_sample=False, batch_size=len(texts))
+    return [result['summary_text'] for result in results]
+
+grammar_batcher = MicroBatcher("grammar", grammar_correct_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+ner_batcher = MicroBatcher("ner", ner_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+summary_batcher = MicroBatcher("summary", summarize_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS)
+
+# --- Sentence-aware chunking for long transcripts ---
+# Each model stage sees chunks of whole sentences that fit its window (characters, roughly
+# 4 per token); all chunks of a transcript are submitted together and batched.
+GRAMMAR_CHUNK_CHARS = int(os.environ.get("MEDICARE_GRAMMAR_CHUNK_CHARS", "300")) # output capped at 128 tokens
+NER_CHUNK_CHARS = int(os.environ.get("MEDICARE_NER_CHUNK_CHARS", "1000"))
+SUMMARY_CHUNK_CHARS = int(os.environ.get("MEDICARE_SUMMARY_CHUNK_CHARS", "1500"))
+NER_CONTEXT_SENTENCES = 1 # neighbouring sentences NER sees on each side of a chunk, within NER_CHUNK_CHARS
+
+def grammar_correct_chunked(text):
+    """Grammar-corrects `text` chunk by chunk and joins the corrected chunks."""
+    chunks = chunk_text(text, GRAMMAR_CHUNK_CHARS)
+    return join_chunk_outputs(grammar_batcher.map([chunk.text for chunk in chunks]))
+
+def ner_chunked(text):
+    """Runs NER over overlapping chunks of `text`; entity start/end are offsets into `text`."""
+    chunks = chunk_text(text, NER_CHUNK_CHARS, NER_CONTEXT_SENTENCES)
+    chunk_entities = convert_to_serializable(ner_batcher.map([chunk.text for chunk in chunks]))
+    return stitch_entities(chunks, chunk_entities)
+
+def summarize_chunked(text):
+    """Summarizes `text` chunk by chunk and joins the chunk summaries."""
+    chunks = chunk_text(text, SUMMARY_CHUNK_CHARS)
+    return join_chunk_outputs(summary_batcher.map([chunk.text for chunk in chunks]))
+
+# --- Per-stage result caches ---
+# Resubmitted transcripts skip spell check, the T5 calls and NER entirely. Keys include the
+# model version (the Hub name, or the model's file digests from the bundle manifest with
+# MEDICARE_MODEL_BUNDLE), so switching models, bundles or inference mode never serves stale results.
+# Set MEDICARE_STAGE_CACHE_DB to a file path to share an on-disk tier across workers.
+STAGE_CACHE_SIZE = int(os.environ.get("MEDICARE_STAGE_CACHE_SIZE", "1024"))
+STAGE_CACHE_TTL_SECONDS = float(os.environ.get("MEDICARE_STAGE_CACHE_TTL_SECONDS", "3600"))
+STAGE_CACHE_DB = os.environ.get("MEDICARE_STAGE_CACHE_DB")
+stage_cache_disk_tier = SqliteCacheTier(STAGE_CACHE_DB, STAGE_CACHE_TTL_SECONDS) if STAGE_CACHE_DB else None
+
+def _stage_cache(name, model_version):
+    return StageCache(name, model_version, STAGE_CACHE_SIZE, STAGE_CACHE_TTL_SECONDS, stage_cache_disk_tier)
+
+grammar_cache = _stage_cache("grammar", f"{model_version('grammar')}@{INFERENCE_MODE}:beams4-max128:chunk{GRAMMAR_CHUNK_CHARS}")
+ner_cache = _stage_cache("ner", f"{model_version('ner')}@{INFERENCE_MODE}:simple:chunk{NER_CHUNK_CHARS}")
+summary_cache = _stage_cache("summary", f"{model_version('summary')}@{INFERENCE_MODE}:new100-min20:chunk{SUMMARY_CHUNK_CHARS}")
+# spell_cache and STAGE_CACHES are created once the medicine names are loaded (below)
 
 
 # --- Utility function to make float/int JSON serializable ---
@@ -77,24 +241,20 @@ def convert_to_serializable(obj):
 
 # --- Spell Correction ---
 def spell_correct_text(text):
-    """Corrects common spelling mistakes in the input text."""
-    words = text.split()
-    corrected_words = []
-    for word in words:
-        correction = spell.correction(word)
-        corrected_words.append(correction if correction is not None else word)
-    return " ".join(corrected_words)
+    """
+    Corrects common spelling mistakes in the input text using the precomputed spelling index.
+    Numbers and medicine/symptom words are left untouched.
+    """
+    return MODEL_REGISTRY.get("spelling").correct_text(text)
 
 # --- Grammar correction step ---
 def grammar_correct(text):
     """
     Corrects grammar of the input text using the loaded T5-based model.
+    Long texts are corrected in sentence chunks; the chunks are batched with
+    concurrent requests by grammar_batcher.
     """
-    input_text = f"grammar: {text}"
-    input_ids = grammar_tokenizer.encode(input_text, return_tensors="pt").to(device)
-    outputs = grammar_model.generate(input_ids, max_length=128, num_beams=4, early_stopping=True)
-    corrected_text = grammar_tokenizer.decode(outputs[0], skip_special_tokens=True)
-    return corrected_text
+    return grammar_correct_chunked(text)
 
 # --- Normalize Number Words (e.g., "six fifty" to "six hundred fifty") ---
 def normalize_number_words(text):
@@ -158,122 +318,69 @@ def merge_tokens(entities):
     return merged_entities
 
 
-# --- Extract General Advice/Recommendations (Enhanced for General Purpose) ---
-def extract_general_advice(text):
-    """
-    Extracts common health advice phrases from the text using more flexible regex patterns.
-    """
-    advice_list = []
-    text_lower = text.lower()
-
-    # Water/Fluids
-    if re.search(r'\b(drink|have|take|give)\s+(plenty\s+of\s+)?water\b|\bhydrate\b', text_lower):
-        advice_list.append("Drink plenty of water.")
-    if re.search(r'\b(drink|have|take|give)\s+(some\s+)?juice\b', text_lower):
-        advice_list.append("Drink juice.")
-    
-    # Food/Diet
-    if re.search(r'\b(eat|have)\s+(fresh\s+)?fruits?\b', text_lower):
-        advice_list.append("Eat fruits.")
-    if re.search(r'\b(eat|have)\s+(raw\s+)?vegetables?\b|\bveggies\b', text_lower):
-        advice_list.append("Eat raw vegetables.")
-    
-    # Dietary restrictions
-    if re.search(r'\b(no|avoid|reduce)\s+(extra\s+)?salt\b', text_lower):
-        advice_list.append("Avoid excess salt.")
-    if re.search(r'\b(no|avoid|reduce)\s+(added\s+)?sugar\b', text_lower):
-        advice_list.append("Avoid excess sugar.")
-    if re.search(r'\b(avoid|reduce)\s+(oily|fried)\s+food\b', text_lower):
-        advice_list.append("Avoid oily/fried food.")
-    
-    # Rest/Activity
-    if re.search(r'\b(get\s+enough|take)\s+rest\b', text_lower):
-        advice_list.append("Get adequate rest.")
-    if re.search(r'\b(do|perform)\s+(light\s+)?exercise\b', text_lower):
-        advice_list.append("Do light exercise.")
-    
-    print(f"[DEBUG] Extracted Advice: {advice_list}")
-    return list(set(advice_list))
-
-# --- Mapping for common spelled-out numbers to digits ---
-NUMBER_WORDS = {
-    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5',
-    'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10',
-    'eleven': '11', 'twelve': '12', 'thirteen': '13', 'fourteen': '14', 'fifteen': '15',
-    'sixteen': '16', 'seventeen': '17', 'eighteen': '18', 'nineteen': '19', 'twenty': '20',
-    'thirty': '30', 'forty': '40', 'fifty': '50', 'sixty': '60', 'seventy': '70',
-    'eighty': '80', 'ninety': '90', 'hundred': '100', 'thousand': '1000',
-    'half': '0.5' # For dosages like "half tablet"
-}
-
 # --- Load medicine data from JSON file ---
 MEDICINE_DATA_FILE = "medicines_combined.json" # Assuming this file is in the same directory as app.py
 LOADED_MEDICINE_NAMES = []
-LOADED_MEDICINE_NAMES_LOWER_SET = set() # For faster lookup of lowercased names
+# Compiled once into an mmap'd artifact (medicine_catalog.py) that every worker shares read-only
+MEDICINE_CATALOG = MedicineCatalog.from_names([])
+FALLBACK_MEDICINE_NAMES = ["Paracetamol", "Vitamin C", "Amoxicillin", "Ibuprofen", "Diphtheria Antitoxin"] # Added for testing
 
 def load_medicine_names():
-    global LOADED_MEDICINE_NAMES, LOADED_MEDICINE_NAMES_LOWER_SET
-    if not os.path.exists(MEDICINE_DATA_FILE):
+    global LOADED_MEDICINE_NAMES, MEDICINE_CATALOG
+    try:
+        MEDICINE_CATALOG = load_catalog(MEDICINE_DATA_FILE)
+    except FileNotFoundError:
         print(f"ERROR: {MEDICINE_DATA_FILE} not found in the app.py directory.")
         print("Please ensure you have copied 'medicines_combined.json' to the same folder as 'app.py'.")
         # Fallback to a small dummy list if file not found, for continued operation
-        LOADED_MEDICINE_NAMES = ["Paracetamol", "Vitamin C", "Amoxicillin", "Ibuprofen", "Diphtheria Antitoxin"] # Added for testing
-        LOADED_MEDICINE_NAMES_LOWER_SET = {name.lower() for name in LOADED_MEDICINE_NAMES}
         print("WARNING: Using a dummy medicine list due to missing JSON file.")
-        return
-
-    try:
-        with open(MEDICINE_DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            names_to_load = []
-            for item in data:
-                if 'name' in item and isinstance(item['name'], str):
-                    names_to_load.append(item['name'].strip())
-                
-                # Extract core medicine name from 'strength' field if available
-                if 'strength' in item and isinstance(item['strength'], str):
-                    strength_match = re.match(r'([A-Za-z\s]+?)(?:\s*\(?\d+.*|\s+\d+.*|$)', item['strength'].strip())
-                    if strength_match:
-                        core_name = strength_match.group(1).strip()
-                        if core_name and core_name.lower() not in LOADED_MEDICINE_NAMES_LOWER_SET:
-                            names_to_load.append(core_name)
-            
-            unique_names = sorted(list(set(names_to_load)))
-            
-            LOADED_MEDICINE_NAMES = unique_names
-            LOADED_MEDICINE_NAMES_LOWER_SET = {n.lower() for n in unique_names}
-            
-            print(f"Successfully loaded {len(LOADED_MEDICINE_NAMES)} unique medicine names from {MEDICINE_DATA_FILE}.")
-            if "paracetamol" in LOADED_MEDICINE_NAMES_LOWER_SET:
-                print("DEBUG: 'Paracetamol' (lowercase) IS found in loaded medicine names set.")
-            else:
-                print("DEBUG: 'Paracetamol' (lowercase) NOT found in loaded medicine names set. Check JSON 'strength' field extraction.")
+        MEDICINE_CATALOG = MedicineCatalog.from_names(FALLBACK_MEDICINE_NAMES)
     except json.JSONDecodeError as e:
         print(f"ERROR: Failed to parse {MEDICINE_DATA_FILE}. Ensure it's valid JSON. Error: {e}")
         print("WARNING: Using a dummy medicine list due to JSON parsing error.")
-        LOADED_MEDICINE_NAMES = ["Paracetamol", "Vitamin C", "Amoxicillin", "Ibuprofen", "Diphtheria Antitoxin"]
-        LOADED_MEDICINE_NAMES_LOWER_SET = {name.lower() for name in LOADED_MEDICINE_NAMES}
+        MEDICINE_CATALOG = MedicineCatalog.from_names(FALLBACK_MEDICINE_NAMES)
     except Exception as e:
         print(f"ERROR: An unexpected error occurred while loading {MEDICINE_DATA_FILE}: {e}")
         print("WARNING: Using a dummy medicine list due to unexpected error.")
-        LOADED_MEDICINE_NAMES = ["Paracetamol", "Vitamin C", "Amoxicillin", "Ibuprofen", "Diphtheria Antitoxin"]
-        LOADED_MEDICINE_NAMES_LOWER_SET = {name.lower() for name in LOADED_MEDICINE_NAMES}
+        MEDICINE_CATALOG = MedicineCatalog.from_names(FALLBACK_MEDICINE_NAMES)
+    else:
+        print(f"Successfully loaded {len(MEDICINE_CATALOG)} unique medicine names from {MEDICINE_DATA_FILE}.")
+        if "paracetamol" in MEDICINE_CATALOG:
+            print("DEBUG: 'Paracetamol' (lowercase) IS found in loaded medicine names set.")
+        else:
+            print("DEBUG: 'Paracetamol' (lowercase) NOT found in loaded medicine names set. Check JSON 'strength' field extraction.")
+    LOADED_MEDICINE_NAMES = MEDICINE_CATALOG.names
 
 # Load medicines when the app starts
 load_medicine_names()
+MEDICINE_MATCHER = MedicineMatcher(LOADED_MEDICINE_NAMES) # Built once; shared by every /ner request
+
+# Spell corrections never touch catalog or symptom words, so their cache key tracks both vocabularies
+spell_cache = _stage_cache("spell", f"symspell-dl2:catalog-{MEDICINE_CATALOG.version}:symptoms-{symptoms_digest(SYMPTOMS_CSV_FILE)}")
+STAGE_CACHES = (spell_cache, grammar_cache, ner_cache, summary_cache)
+
+# Whole /ner responses (MEDICARE_RESPONSE_CACHE_SIZE, MEDICARE_RESPONSE_CACHE_TTL_SECONDS), keyed by the
+# stage model versions and the catalog; identical concurrent requests share one pipeline run.
+NER_RESPONSE_CACHE = ResponseCache.from_env("ner_response")
+NER_RESPONSE_VERSION = ":".join(
+    [cache.model_version for cache in STAGE_CACHES] + [MEDICINE_CATALOG.version]
+)
+
+if WARMUP_MODELS:
+    MODEL_REGISTRY.start_background_warmup(WARMUP_MODELS)
 
 FUZZY_MATCH_THRESHOLD = 70 # Minimum similarity score to consider a fuzzy match valid
 
 # --- Helper for extracting dosage, frequency, duration from raw text segment (now takes full_text) ---
+@lru_cache(maxsize=4096)
+def _medication_name_pattern(med_name_lower):
+    return re.compile(r'\b' + re.escape(med_name_lower) + r'\b')
+
 def extract_med_details_from_segment(full_text: str, med_start_index: int, med_end_index: int, med_name_lower: str) -> (str, str, str):
     """
     Extracts dosage, frequency, and duration from the full text, focusing on the context
     around a specific medication.
     """
-    dosage = "N/A"
-    frequency = "N/A"
-    duration = "N/A"
-
     # Define a broader search window around the medication entity
     # This window will be used for regex matching
     context_start = max(0, med_start_index - 70) # Increased context before
@@ -281,307 +388,363 @@ def extract_med_details_from_segment(full_text: str, med_start_index: int, med_e
     
     segment_for_extraction = full_text[context_start:context_end].lower()
     
-    print(f"[DEBUG] Extracting details for '{med_name_lower}' from segment: '{segment_for_extraction}'")
 
     # To avoid matching the medication name itself as part of other details,
     # temporarily replace it in the segment. Use word boundaries.
-    temp_segment_lower = re.sub(r'\b' + re.escape(med_name_lower) + r'\b', 'MED_PLACEHOLDER', segment_for_extraction, 1)
-
-
-    # 1. Extract Dosage (number + unit)
-    # This pattern tries to capture number words or digits, followed by optional units.
-    # It's made more flexible to capture things like "six hundred fifty milligrams"
-    num_word_pattern = r'(?:' + '|'.join(NUMBER_WORDS.keys()) + r'|\d+(?:\.\d+)?)(?:\s+(?:' + '|'.join(NUMBER_WORDS.keys()) + r'))*'
-    units_pattern = r'(?:mg|g|ml|mcg|unit|tablet|pill|capsule|spoon(?:ful)?|units?|tabs?|caps?|bottles?|vials?|sachets?|pouches?|drops?|puffs?|sprays?|inhalations?|patches?|milligrams|grams|liters?|tablets|pills)\b'
-    
-    dosage_match = re.search(rf'({num_word_pattern})\s*({units_pattern})?', temp_segment_lower)
-    if dosage_match:
-        num_part = dosage_match.group(1).strip()
-        unit_part = dosage_match.group(2) if dosage_match.group(2) else ""
-        
-        try:
-            converted_num = str(w2n.word_to_num(num_part))
-            dosage = converted_num
-            if unit_part:
-                dosage += f" {unit_part}"
-        except ValueError:
-            dosage = num_part # Fallback if w2n fails
-            if unit_part:
-                dosage += f" {unit_part}"
-        
-        temp_segment_lower = temp_segment_lower.replace(dosage_match.group(0), '', 1)
-        print(f"[DEBUG] Extracted Dosage: {dosage}, Remaining segment: '{temp_segment_lower}'")
-
-
-    # 2. Extract Frequency
-    frequency_patterns = [
-        r'\b(?:once|twice|thrice)\s+a\s+day\b',
-        r'\b(?:one|two|three|four|five|six|seven|eight|nine|\d+)\s+times\s+a\s+day\b',
-        r'\b(?:daily|every\s+day)\b',
-        r'\b(?:every\s+\d+\s*hours?)\b',
-        r'\b(?:b\.?d\.?|t\.?i\.?d\.?|o\.?d\.?|q\.?i\.?d\.?|bd|tid|od|qid|bid|tds|qds|qd|prn|stat|as needed)\b',
-        r'\b(?:weekly|monthly|yearly)\b',
-        r'\b(?:once)\b',
-        r'\b(?:before\s+meals|after\s+meals|with\s+food|empty\s+stomach|at\s+night|in\s+the\s+morning|in\s+the\s+evening)\b' # Added common timings
-    ]
-    for pattern in frequency_patterns:
-        freq_match = re.search(pattern, temp_segment_lower)
-        if freq_match:
-            frequency = freq_match.group(0).strip()
-            for word, digit in NUMBER_WORDS.items(): 
-                 frequency = re.sub(r'\b' + word + r'\b', digit, frequency, flags=re.IGNORECASE)
-            temp_segment_lower = temp_segment_lower.replace(freq_match.group(0), '', 1)
-            print(f"[DEBUG] Extracted Frequency: {frequency}, Remaining segment: '{temp_segment_lower}'")
-            break
-
-
-    # 3. Extract Duration
-    duration_patterns = [
-        r'\b(?:for\s+)?(?:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|\d+)\s+(?:day|week|month|year|hour)s?\b',
-        r'\b(?:a\s+couple\s+of\s+days?)\b',
-        r'\b(?:long\s+term|indefinitely|as\s+long\s+as\s+needed)\b' # Added more duration phrases
-    ]
-    for pattern in duration_patterns:
-        dur_match = re.search(pattern, temp_segment_lower)
-        if dur_match:
-            duration = dur_match.group(0).strip()
-            for word, digit in NUMBER_WORDS.items():
-                 duration = re.sub(r'\b' + word + r'\b', digit, duration, flags=re.IGNORECASE)
-            temp_segment_lower = temp_segment_lower.replace(dur_match.group(0), '', 1)
-            print(f"[DEBUG] Extracted Duration: {duration}, Remaining segment: '{temp_segment_lower}'")
-            break
+    temp_segment_lower = _medication_name_pattern(med_name_lower).sub('MED_PLACEHOLDER', segment_for_extraction, 1)
 
+    dosage, frequency, duration = extract_segment_details(temp_segment_lower)
+    trace_event("segment_details", medication=med_name_lower, segment=segment_for_extraction,
+                dosage=dosage, frequency=frequency, duration=duration)
     return dosage, frequency, duration
 
 
 # --- API Endpoints ---
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    # For /ner/stream this is the time to the first byte, not to the end of the stream
+    started = g.pop("request_started", None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        record_request(endpoint, response.status_code, time.perf_counter() - started)
+    return response
+
 @app.route("/")
 def home():
     return "AI-Powered Medical Backend is running!"
 
-@app.route("/ner", methods=["POST"])
-def extract_entities():
+@app.route("/ready")
+def ready():
     """
-    Processes input text to apply spell/grammar correction, extract entities,
-    and generate a structured medical summary.
+    Readiness probe: 200 once the models on the /ner path are loaded, 503 before that.
+    Always reports the per-model load state.
     """
-    try:
+    is_ready = all(MODEL_REGISTRY.is_loaded(name) for name in READINESS_MODELS)
+    return jsonify({"ready": is_ready, "models": MODEL_REGISTRY.states()}), (200 if is_ready else 503)
+
+@app.route("/cache_stats")
+def cache_stats():
+    """Reports hit/miss statistics of the per-stage result caches and the /ner response cache."""
+    stats = {cache.name: cache.stats() for cache in STAGE_CACHES}
+    stats[NER_RESPONSE_CACHE.name] = NER_RESPONSE_CACHE.stats()
+    return jsonify(stats)
+
+@app.route("/model_stats")
+def model_stats():
+    """Reports model load/evict counters and resident memory against the configured budget."""
+    return jsonify(MODEL_REGISTRY.stats())
+
+@app.route("/batch_stats")
+def batch_stats():
+    """Reports per-batch occupancy of the model micro-batchers for tuning the batching window."""
+    return jsonify({
+        batcher.name: batcher.stats()
+        for batcher in (grammar_batcher, ner_batcher, summary_batcher)
+    })
+
+@app.route("/debug/traces", methods=["GET", "PUT"])
+def debug_traces():
+    """
+    GET: the most recent sampled request traces, newest first (?limit=N).
+    PUT {"sample_rate": 0.05}: changes the fraction of requests traced, effective immediately.
+    Both need "Authorization: Bearer $MEDICARE_DEBUG_TOKEN"; without a configured token the endpoint is off.
+    """
+    status = TRACER.debug_access_status(request.headers.get("Authorization"))
+    if status != 200:
+        return jsonify({"error": "Not found" if status == 404 else "Unauthorized"}), status
+    if request.method == "PUT":
         data = request.get_json(force=True)
-        text = data.get("text", "").strip()
-        if not text:
-            return jsonify({"error": "Missing or empty 'text' field"}), 400
+        try:
+            TRACER.sample_rate = data.get("sample_rate")
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(TRACER.stats())
+    limit = request.args.get("limit", type=int)
+    return jsonify({**TRACER.stats(), "traces": TRACER.traces(limit)})
+
+@app.route("/metrics")
+def metrics():
+    """Prometheus metrics: request and per-stage latency, cache hits, fuzzy comparisons, batch sizes."""
+    return Response(METRICS.render(), mimetype=CONTENT_TYPE)
+
+# Stages streamed by /ner/stream, in the order their results become available
+NER_STAGES = ("corrected_text", "entities", "medication_prescriptions", "advice", "summary")
+
+def ner_stages(text):
+    """
+    Runs the /ner pipeline on non-empty `text`: spell/grammar correction, entity extraction
+    and the structured summary. Yields (stage, result) pairs in NER_STAGES order as soon
+    as each stage's result is ready.
+    """
+    # --- Step 1: Pre-processing (Spell Check -> Grammar Correction -> Number Word Normalization) ---
+    with time_stage("spell"):
+        spell_checked_text = spell_cache.get_or_compute(text, spell_correct_text)
+    
+    with time_stage("grammar"):
+        grammar_corrected_text = grammar_cache.get_or_compute(spell_checked_text, grammar_correct)
 
-        # --- Step 1: Pre-processing (Spell Check -> Grammar Correction -> Number Word Normalization) ---
-        spell_checked_text = spell_correct_text(text)
-        print(f"[INFO] Spell-Corrected Text: {spell_checked_text}")
-        
-        grammar_corrected_text = grammar_correct(spell_checked_text)
-        print(f"[INFO] Grammar-Corrected Text: {grammar_corrected_text}")
+    # Normalize number words before NER and summarization
+    processed_text_for_models = normalize_number_words(grammar_corrected_text)
+    trace_event("corrected_text", spell_checked=spell_checked_text, grammar_corrected=grammar_corrected_text,
+                normalized=processed_text_for_models)
 
-        # Normalize number words before NER and summarization
-        processed_text_for_models = normalize_number_words(grammar_corrected_text)
-        print(f"[INFO] Normalized Number Words Text: {processed_text_for_models}")
+    yield "corrected_text", {
+        "spell_checked_text": spell_checked_text,
+        "grammar_corrected_text": grammar_corrected_text,
+        "text": processed_text_for_models
+    }
 
 
-        # --- Step 2: Named Entity Recognition (NER) using BioBERT ---
-        raw_entities = ner_pipeline(processed_text_for_models)
-        # Convert to serializable format and merge subword tokens, preserving spans
-        cleaned_entities = merge_tokens(convert_to_serializable(raw_entities))
-        print(f"[DEBUG] Cleaned Entities (with spans): {cleaned_entities}") 
+    # --- Step 2: Named Entity Recognition (NER) using BioBERT ---
+    with time_stage("ner"):
+        raw_entities = ner_cache.get_or_compute(processed_text_for_models, ner_chunked)
+    # Merge subword tokens, preserving spans (on a copy: merge_tokens sorts in place and the list is cached)
+    cleaned_entities = merge_tokens(list(raw_entities))
+    trace_event("entities", entities=cleaned_entities)
 
-        # --- Step 3: Extract & Normalize Specific Details from NER Output ---
-        
-        # Symptoms (Filter out semantically incorrect ones like "signs of recovery")
-        all_symptoms = [ent["word"] for ent in cleaned_entities if ent["entity"] == "Sign_symptom"]
-        extracted_symptoms = list(set([s for s in all_symptoms if "recovery" not in s.lower()]))
+    yield "entities", cleaned_entities
 
+    # --- Step 3: Extract & Normalize Specific Details from NER Output ---
+    
+    # Symptoms (Filter out semantically incorrect ones like "signs of recovery")
+    all_symptoms = [ent["word"] for ent in cleaned_entities if ent["entity"] == "Sign_symptom"]
+    extracted_symptoms = list(set([s for s in all_symptoms if "recovery" not in s.lower()]))
 
-        # Diseases/Conditions
-        extracted_diseases = list(set([ent["word"] for ent in cleaned_entities if ent["entity"] == "Disease"]))
-        
-        # Tests/Procedures
-        extracted_tests_procedures = list(set([ent["word"] for ent in cleaned_entities if ent["entity"] == "Procedure"])) 
-        # Add a heuristic for "check body temperature" if BioBERT doesn't tag it as Procedure
-        if "check your body temperature" in processed_text_for_models.lower() and "body temperature check" not in extracted_tests_procedures:
-            extracted_tests_procedures.append("Body temperature check")
-
-        # Medications with Dosage/Frequency/Duration (Robust extraction)
-        medication_prescriptions = [] # Store final structured medication entries
-        processed_med_names_lower = set() # Use a set to track lowercased, validated medicine names
-
-        # Keep track of dosage/frequency/duration entities that have been "consumed" by a medication
-        # This will be used to prevent re-associating them if they are explicitly tagged by NER
-        consumed_ner_detail_indices = set() 
-
-        # First pass: Link NER-tagged Medication to proximate NER-tagged Dosage/Frequency/Duration
-        for i, ent in enumerate(cleaned_entities):
-            if ent["entity"] in ["Medication", "Chemical"] and ent["word"].lower() not in processed_med_names_lower:
-                potential_med_name = ent["word"].strip()
+
+    # Diseases/Conditions
+    extracted_diseases = list(set([ent["word"] for ent in cleaned_entities if ent["entity"] == "Disease"]))
+    
+    # Tests/Procedures
+    extracted_tests_procedures = list(set([ent["word"] for ent in cleaned_entities if ent["entity"] == "Procedure"])) 
+    # Add a heuristic for "check body temperature" if BioBERT doesn't tag it as Procedure
+    if "check your body temperature" in processed_text_for_models.lower() and "body temperature check" not in extracted_tests_procedures:
+        extracted_tests_procedures.append("Body temperature check")
+
+    # Medications with Dosage/Frequency/Duration (Robust extraction)
+    linking_started = time.perf_counter()
+    medication_prescriptions = [] # Store final structured medication entries
+    processed_med_names_lower = set() # Use a set to track lowercased, validated medicine names
+
+    # Keep track of dosage/frequency/duration entities that have been "consumed" by a medication
+    # This will be used to prevent re-associating them if they are explicitly tagged by NER
+    consumed_ner_detail_indices = set() 
+
+    # First pass: Link NER-tagged Medication to proximate NER-tagged Dosage/Frequency/Duration
+    for i, ent in enumerate(cleaned_entities):
+        if ent["entity"] in ["Medication", "Chemical"] and ent["word"].lower() not in processed_med_names_lower:
+            potential_med_name = ent["word"].strip()
+            
+            # Exact match via the lowercase index, otherwise fuzzy match over length-pruned candidates
+            best_match_name, max_similarity = MEDICINE_MATCHER.best_match(
+                potential_med_name, score_cutoff=FUZZY_MATCH_THRESHOLD
+            )
+
+            trace_event("catalog_match", entity=potential_med_name, match=best_match_name, similarity=max_similarity)
+
+            if max_similarity >= FUZZY_MATCH_THRESHOLD:
+                # Found a valid medication
+                processed_med_names_lower.add(best_match_name.lower())
                 
-                best_match_name = "N/A"
-                max_similarity = 0.0
-
-                if potential_med_name.lower() in LOADED_MEDICINE_NAMES_LOWER_SET:
-                    best_match_name = next((n for n in LOADED_MEDICINE_NAMES if n.lower() == potential_med_name.lower()), potential_med_name)
-                    max_similarity = 100.0
-                else:
-                    for loaded_name in LOADED_MEDICINE_NAMES:
-                        current_similarity = fuzz.ratio(potential_med_name.lower(), loaded_name.lower())
-                        if current_similarity > max_similarity:
-                            max_similarity = current_similarity
-                            best_match_name = loaded_name
+                current_dosage = "N/A"
+                current_frequency = "N/A"
+                current_duration = "N/A"
+
+                # Search for associated NER entities in a forward window
+                search_window_indices = 5 # Look at next 5 entities
+                for j in range(i + 1, min(i + 1 + search_window_indices, len(cleaned_entities))):
+                    other_ent = cleaned_entities[j]
+                    # Check if entity is already consumed or too far
+                    if j in consumed_ner_detail_indices or (other_ent["start"] - ent["end"] > 70): # Increased proximity window for NER details
+                        continue
+
+                    if other_ent["entity"] == "Dosage" and current_dosage == "N/A":
+                        # Convert word numbers to digits for dosage, keeping the unit
+                        current_dosage = parse_ner_dosage(other_ent["word"])
+                        consumed_ner_detail_indices.add(j)
+                        trace_event("ner_detail", medication=best_match_name, dosage=current_dosage)
+
+                    elif other_ent["entity"] == "Frequency" and current_frequency == "N/A":
+                        current_frequency = other_ent["word"]
+                        consumed_ner_detail_indices.add(j)
+                        trace_event("ner_detail", medication=best_match_name, frequency=current_frequency)
+
+                    elif other_ent["entity"] == "Duration" and current_duration == "N/A":
+                        current_duration = other_ent["word"]
+                        consumed_ner_detail_indices.add(j)
+                        trace_event("ner_detail", medication=best_match_name, duration=current_duration)
                 
-                print(f"[DEBUG] Potential NER Med: '{potential_med_name}', Best Fuzzy Match: '{best_match_name}' (Similarity: {max_similarity})")
-
-                if max_similarity >= FUZZY_MATCH_THRESHOLD:
-                    # Found a valid medication
-                    processed_med_names_lower.add(best_match_name.lower())
+                # If any detail is still N/A, try to extract it using regex from a broader segment
+                # This is a fallback if NER didn't tag it or missed it
+                if current_dosage == "N/A" or current_frequency == "N/A" or current_duration == "N/A":
+                    trace_event("regex_fallback", medication=best_match_name)
                     
-                    current_dosage = "N/A"
-                    current_frequency = "N/A"
-                    current_duration = "N/A"
-
-                    # Search for associated NER entities in a forward window
-                    search_window_indices = 5 # Look at next 5 entities
-                    for j in range(i + 1, min(i + 1 + search_window_indices, len(cleaned_entities))):
-                        other_ent = cleaned_entities[j]
-                        # Check if entity is already consumed or too far
-                        if j in consumed_ner_detail_indices or (other_ent["start"] - ent["end"] > 70): # Increased proximity window for NER details
-                            continue
-
-                        if other_ent["entity"] == "Dosage" and current_dosage == "N/A":
-                            # Try to convert word numbers to digits for dosage
-                            try:
-                                # This regex specifically targets the numerical part and optional unit within the Dosage entity's word
-                                num_unit_match = re.search(r'((?:' + '|'.join(NUMBER_WORDS.keys()) + r'|\d+(?:\.\d+)?)(?:\s+(?:' + '|'.join(NUMBER_WORDS.keys()) + r'))*)?\s*(mg|ml|g|units?|milligrams|grams|liters?|tablet|pill|capsule|spoon(?:ful)?)?', other_ent["word"].lower())
-                                if num_unit_match and num_unit_match.group(1): # Ensure a number part is found
-                                    num_words_only = num_unit_match.group(1).strip()
-                                    unit = num_unit_match.group(2) if num_unit_match.group(2) else ""
-                                    converted_num = str(w2n.word_to_num(num_words_only))
-                                    current_dosage = converted_num
-                                    if unit:
-                                        current_dosage += f" {unit}"
-                                else: # If no clear number words, just take the word as is
-                                    current_dosage = other_ent["word"]
-                            except ValueError:
-                                current_dosage = other_ent["word"] # Fallback if w2n fails
-                            consumed_ner_detail_indices.add(j)
-                            print(f"[DEBUG] Found NER Dosage for '{best_match_name}': {current_dosage}")
-
-                        elif other_ent["entity"] == "Frequency" and current_frequency == "N/A":
-                            current_frequency = other_ent["word"]
-                            consumed_ner_detail_indices.add(j)
-                            print(f"[DEBUG] Found NER Frequency for '{best_match_name}': {current_frequency}")
-
-                        elif other_ent["entity"] == "Duration" and current_duration == "N/A":
-                            current_duration = other_ent["word"]
-                            consumed_ner_detail_indices.add(j)
-                            print(f"[DEBUG] Found NER Duration for '{best_match_name}': {current_duration}")
-                    
-                    # If any detail is still N/A, try to extract it using regex from a broader segment
-                    # This is a fallback if NER didn't tag it or missed it
-                    if current_dosage == "N/A" or current_frequency == "N/A" or current_duration == "N/A":
-                        print(f"[DEBUG] Falling back to regex for '{best_match_name}' details.")
-                        
-                        # Use the entire processed_text_for_models and medication's original span for context
-                        temp_dosage, temp_frequency, temp_duration = extract_med_details_from_segment(
-                            processed_text_for_models, ent["start"], ent["end"], potential_med_name.lower()
-                        )
-
-                        if current_dosage == "N/A" and temp_dosage != "N/A":
-                            current_dosage = temp_dosage
-                        if current_frequency == "N/A" and temp_frequency != "N/A":
-                            current_frequency = temp_frequency
-                        if current_duration == "N/A" and temp_duration != "N/A":
-                            current_duration = temp_duration
-
-
-                    medication_prescriptions.append({
-                        "medication": best_match_name,
-                        "dosage": current_dosage,
-                        "frequency": current_frequency,
-                        "duration": current_duration
-                    })
-                else:
-                    print(f"[DEBUG] Skipped '{potential_med_name}' (Similarity: {max_similarity}) - below threshold or already processed.")
-            else: 
-                print(f"[DEBUG] Entity '{ent['word']}' with group '{ent['entity']}' is not a primary medicine type.")
-
-        print(f"[DEBUG] Medication Prescriptions: {medication_prescriptions}")
-        
-        # Extract General Advice
+                    # Use the entire processed_text_for_models and medication's original span for context
+                    temp_dosage, temp_frequency, temp_duration = extract_med_details_from_segment(
+                        processed_text_for_models, ent["start"], ent["end"], potential_med_name.lower()
+                    )
+
+                    if current_dosage == "N/A" and temp_dosage != "N/A":
+                        current_dosage = temp_dosage
+                    if current_frequency == "N/A" and temp_frequency != "N/A":
+                        current_frequency = temp_frequency
+                    if current_duration == "N/A" and temp_duration != "N/A":
+                        current_duration = temp_duration
+
+
+                medication_prescriptions.append({
+                    "medication": best_match_name,
+                    "dosage": current_dosage,
+                    "frequency": current_frequency,
+                    "duration": current_duration
+                })
+            else:
+                trace_event("skipped_medication", entity=potential_med_name, similarity=max_similarity)
+        else: 
+            trace_event("skipped_entity", entity=ent["word"], group=ent["entity"])
+
+    record_stage("medication_linking", linking_started)
+    trace_event("medication_prescriptions", prescriptions=medication_prescriptions)
+    yield "medication_prescriptions", medication_prescriptions
+    
+    # Extract General Advice
+    with time_stage("advice"):
         general_advice = extract_general_advice(processed_text_for_models)
+    trace_event("advice", advice=general_advice)
+    yield "advice", general_advice
 
-        # --- Step 4: Construct the Structured Summary ---
-        
-        structured_summary_parts = []
-
-        # 4.1: Patient Overview / Chief Complaints
-        if extracted_symptoms or extracted_diseases:
-            patient_summary_line = "Patient reports "
-            if extracted_symptoms:
-                patient_summary_line += f"symptoms of {', '.join(extracted_symptoms)}"
-            if extracted_symptoms and extracted_diseases:
-                patient_summary_line += " and "
-            if extracted_diseases:
-                patient_summary_line += f"diagnosed with {', '.join(extracted_diseases)}"
-            patient_summary_line += "."
-            structured_summary_parts.append(patient_summary_line)
-        else:
-            # Fallback to a general summary from T5 if no specific symptoms/diseases extracted
-            generated_general_summary = summary_pipeline(
-                processed_text_for_models,
-                max_new_tokens=100,
-                min_length=20,
-                do_sample=False
-            )[0]['summary_text']
-            if generated_general_summary:
-                structured_summary_parts.append(generated_general_summary.strip())
-
-
-        # 4.2: Tests/Procedures Recommended
-        if extracted_tests_procedures:
-            structured_summary_parts.append(f"Tests/Procedures recommended: {', '.join(extracted_tests_procedures)}.")
-
-        # 4.3: Prescribed Medications
-        if medication_prescriptions:
-            med_lines = []
-            for med in medication_prescriptions:
-                line = f"{med['medication']}"
-                if med['dosage'] != "N/A":
-                    line += f" {med['dosage']}"
-                if med['frequency'] != "N/A":
-                    line += f" {med['frequency']}"
-                if med['duration'] != "N/A":
-                    line += f" for {med['duration']}" # Add 'for' for duration
-                med_lines.append(line)
-            structured_summary_parts.append(f"Prescribed medications: {'; '.join(med_lines)}.")
-
-        # 4.4: Additional Advice
-        if general_advice:
-            structured_summary_parts.append(f"Additional advice: {'; '.join(general_advice)}.")
-        
-        # Combine all parts into the final structured summary
-        final_structured_summary = " ".join(structured_summary_parts).strip()
-        final_structured_summary = re.sub(r'\s+', ' ', final_structured_summary).strip()
-        # Final punctuation cleanup for the whole summary
-        if final_structured_summary and not final_structured_summary.endswith(('.', '!', '?')):
-            final_structured_summary += "."
-        final_structured_summary = re.sub(r'\.\s*\.', '.', final_structured_summary) # Fix double periods
-
-
-        # --- Return results ---
-        return jsonify({
-            "entities": cleaned_entities, # Keep entities for potential future use or debugging
-            "summary": final_structured_summary,
-            "medication_prescriptions": medication_prescriptions # Explicitly return this structured list
-        })
+    # --- Step 4: Construct the Structured Summary ---
+    
+    structured_summary_parts = []
+
+    # 4.1: Patient Overview / Chief Complaints
+    if extracted_symptoms or extracted_diseases:
+        patient_summary_line = "Patient reports "
+        if extracted_symptoms:
+            patient_summary_line += f"symptoms of {', '.join(extracted_symptoms)}"
+        if extracted_symptoms and extracted_diseases:
+            patient_summary_line += " and "
+        if extracted_diseases:
+            patient_summary_line += f"diagnosed with {', '.join(extracted_diseases)}"
+        patient_summary_line += "."
+        structured_summary_parts.append(patient_summary_line)
+    else:
+        # Fallback to a general summary from T5 if no specific symptoms/diseases extracted
+        with time_stage("summary"):
+            generated_general_summary = summary_cache.get_or_compute(processed_text_for_models, summarize_chunked)
+        if generated_general_summary:
+            structured_summary_parts.append(generated_general_summary.strip())
+
+
+    # 4.2: Tests/Procedures Recommended
+    if extracted_tests_procedures:
+        structured_summary_parts.append(f"Tests/Procedures recommended: {', '.join(extracted_tests_procedures)}.")
+
+    # 4.3: Prescribed Medications
+    if medication_prescriptions:
+        med_lines = []
+        for med in medication_prescriptions:
+            line = f"{med['medication']}"
+            if med['dosage'] != "N/A":
+                line += f" {med['dosage']}"
+            if med['frequency'] != "N/A":
+                line += f" {med['frequency']}"
+            if med['duration'] != "N/A":
+                line += f" for {med['duration']}" # Add 'for' for duration
+            med_lines.append(line)
+        structured_summary_parts.append(f"Prescribed medications: {'; '.join(med_lines)}.")
+
+    # 4.4: Additional Advice
+    if general_advice:
+        structured_summary_parts.append(f"Additional advice: {'; '.join(general_advice)}.")
+    
+    # Combine all parts into the final structured summary
+    final_structured_summary = " ".join(structured_summary_parts).strip()
+    final_structured_summary = re.sub(r'\s+', ' ', final_structured_summary).strip()
+    # Final punctuation cleanup for the whole summary
+    if final_structured_summary and not final_structured_summary.endswith(('.', '!', '?')):
+        final_structured_summary += "."
+    final_structured_summary = re.sub(r'\.\s*\.', '.', final_structured_summary) # Fix double periods
+
+    yield "summary", final_structured_summary
+
+def _ner_response(text):
+    results = dict(ner_stages(text))
+    return {
+        "entities": results["entities"], # Keep entities for potential future use or debugging
+        "summary": results["summary"],
+        "medication_prescriptions": results["medication_prescriptions"] # Explicitly return this structured list
+    }
+
+@app.route("/ner", methods=["POST"])
+def extract_entities():
+    """
+    Processes input text to apply spell/grammar correction, extract entities,
+    and generate a structured medical summary.
+    """
+    try:
+        data = request.get_json(force=True)
+        text = data.get("text", "").strip()
+        if not text:
+            return jsonify({"error": "Missing or empty 'text' field"}), 400
+
+        key = NER_RESPONSE_CACHE.key("/ner", {"text": text}, NER_RESPONSE_VERSION)
+        with TRACER.request("/ner", text=text):
+            cached, outcome = NER_RESPONSE_CACHE.get_or_compute(key, lambda: _ner_response(text))
+            trace_event("response_cache", result=outcome)
+
+        if etag_matches(request.headers.get("If-None-Match"), cached.etag):
+            return Response(status=304, headers={"ETag": cached.etag})
+        return Response(cached.body, mimetype="application/json", headers={"ETag": cached.etag})
 
     except Exception as e:
         print(f"[ERROR] during /ner processing: {e}")
         return jsonify({"error": "Failed to process text", "details": str(e)}), 500
 
+@app.route("/ner/stream", methods=["POST"])
+def extract_entities_stream():
+    """
+    Streaming variant of /ner: sends each stage's result as soon as it is ready, so the
+    client can show corrected text and entities before the summary is done.
+    Responds with newline-delimited JSON ({"stage": ..., "data": ...} per line), or with
+    server-sent events ("event: <stage>") when the client accepts text/event-stream.
+    A failure mid-stream is sent as a final "error" stage.
+    """
+    # Nothing is streamed yet, so a bad body still gets a plain JSON 400
+    data = request.get_json(force=True, silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    text = data.get("text", "")
+    text = text.strip() if isinstance(text, str) else ""
+    if not text:
+        return jsonify({"error": "Missing or empty 'text' field"}), 400
+
+    use_sse = request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+
+    def encode(stage, payload):
+        if use_sse:
+            return f"event: {stage}\ndata: {json.dumps(payload)}\n\n"
+        return json.dumps({"stage": stage, "data": payload}) + "\n"
+
+    def generate():
+        try:
+            with TRACER.request("/ner/stream", text=text):
+                for stage, payload in ner_stages(text):
+                    yield encode(stage, payload)
+        except Exception as e:
+            print(f"[ERROR] during /ner/stream processing: {e}")
+            yield encode("error", {"error": "Failed to process text", "details": str(e)})
+
+    return Response(
+        generate(),
+        mimetype="text/event-stream" if use_sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # don't let proxies buffer the stream
+    )
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5000)
 
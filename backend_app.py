@@ -1,94 +1,107 @@
 # backend_app.py
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
 import uvicorn
 import re
 import json
 import os # For checking file existence
+import time
 from transformers import AutoTokenizer, AutoModelForTokenClassification, pipeline
 import torch # Required by transformers[torch]
 from rapidfuzz import fuzz # Using rapidfuzz for string similarity
+from medicine_matcher import MedicineMatcher
+from gazetteer import Gazetteer
+from typeahead import TypeaheadIndex
+from feedback_store import FeedbackStore
+from model_registry import ModelRegistry, FAILED
+from detail_extraction import assign_details
+from inference_mode import prepare_for_inference
+from inference_pool import InferencePool, PoolSaturated
+from response_cache import ResponseCache, etag_matches
+from medicine_catalog import MedicineCatalog, load_catalog
+from model_bundle import (
+    BUNDLE_LOAD_KWARGS, BUNDLE_TOKENIZER_KWARGS, BUNDLE_VERSION, FINE_TUNED_NER_PATH, HUB_MODELS, bundled_model_path
+)
+from metrics import CONTENT_TYPE, FUZZY_COMPARISONS, METRICS, SIZE_BUCKETS, record_request, time_stage
+from tracing import TRACER, trace_event
 
 # --- Model Loading and Data Loading ---
 # Path to your fine-tuned BioBERT model (if you've trained it)
-FINE_TUNED_MODEL_PATH = "./fine_tuned_biobert_model"
-tokenizer = None
-model = None
-nlp_pipeline = None # Hugging Face pipeline for easier NER
+FINE_TUNED_MODEL_PATH = FINE_TUNED_NER_PATH
 
 # Using d4data/biomedical-ner-all, which is a general biomedical NER model
-GENERIC_BIOBERT_MODEL = "d4data/biomedical-ner-all" 
-
-try:
-    if os.path.exists(FINE_TUNED_MODEL_PATH):
+GENERIC_BIOBERT_MODEL = HUB_MODELS["ner"]
+
+# The NER model is loaded on demand through the registry, so it can be evicted when idle
+# under MEDICARE_MODEL_MEMORY_BUDGET_MB / MEDICARE_MODEL_IDLE_SECONDS and reloaded on next use.
+MODEL_REGISTRY = ModelRegistry.from_env()
+
+def load_ner_pipeline():
+    bundled_path = bundled_model_path("backend_ner")
+    if bundled_path is not None:
+        # MEDICARE_MODEL_BUNDLE is set: load strictly from the local snapshot, never from the network
+        print(f"Loading NER model from model bundle {BUNDLE_VERSION}: {bundled_path}...")
+        tokenizer = AutoTokenizer.from_pretrained(bundled_path, **BUNDLE_TOKENIZER_KWARGS)
+        model = prepare_for_inference(
+            AutoModelForTokenClassification.from_pretrained(bundled_path, **BUNDLE_LOAD_KWARGS), "cpu"
+        )
+        ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+        print(f"SUCCESS: NER model loaded from model bundle {BUNDLE_VERSION}.")
+    elif os.path.exists(FINE_TUNED_MODEL_PATH):
         print(f"Attempting to load fine-tuned BioBERT tokenizer and model from local path: {FINE_TUNED_MODEL_PATH}...")
         tokenizer = AutoTokenizer.from_pretrained(FINE_TUNED_MODEL_PATH)
-        model = AutoModelForTokenClassification.from_pretrained(FINE_TUNED_MODEL_PATH)
-        nlp_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+        model = prepare_for_inference(AutoModelForTokenClassification.from_pretrained(FINE_TUNED_MODEL_PATH), "cpu")
+        ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
         print("SUCCESS: Fine-tuned BioBERT model and tokenizer loaded.")
     else:
         print(f"INFO: Fine-tuned model not found at {FINE_TUNED_MODEL_PATH}.")
         print(f"Attempting to download/load pre-trained NER model from Hugging Face Hub: {GENERIC_BIOBERT_MODEL}...")
         tokenizer = AutoTokenizer.from_pretrained(GENERIC_BIOBERT_MODEL)
-        model = AutoModelForTokenClassification.from_pretrained(GENERIC_BIOBERT_MODEL)
-        nlp_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
+        model = prepare_for_inference(AutoModelForTokenClassification.from_pretrained(GENERIC_BIOBERT_MODEL), "cpu")
+        ner_pipeline = pipeline("ner", model=model, tokenizer=tokenizer, aggregation_strategy="simple")
         print(f"SUCCESS: NER model '{GENERIC_BIOBERT_MODEL}' loaded.")
+    return ner_pipeline
+
+MODEL_REGISTRY.register("ner", load_ner_pipeline)
+
+def get_nlp_pipeline():
+    """
+    Returns the NER pipeline, loading it if it is not resident, or None if it could not be
+    loaded. A failed load is not retried, so extraction keeps using the basic fallback.
+    """
+    if MODEL_REGISTRY.state("ner") == FAILED:
+        return None
+    try:
+        return MODEL_REGISTRY.get("ner")
+    except Exception as e:
+        print(f"CRITICAL ERROR: Failed to load any BioBERT model.")
+        print(f"This often indicates a network issue, firewall blocking Hugging Face, or insufficient memory/GPU resources.")
+        print(f"Please ensure you have a stable internet connection and no firewalls/proxies are blocking access to 'huggingface.co'.")
+        print(f"Also, consider if other large models are running simultaneously.")
+        print(f"Detailed error: {e}")
+        print("Medicine extraction will fall back to basic keyword matching and regex.")
+        return None
 
-except Exception as e:
-    print(f"CRITICAL ERROR: Failed to load any BioBERT model.")
-    print(f"This often indicates a network issue, firewall blocking Hugging Face, or insufficient memory/GPU resources.")
-    print(f"Please ensure you have a stable internet connection and no firewalls/proxies are blocking access to 'huggingface.co'.")
-    print(f"Also, consider if other large models are running simultaneously.")
-    print(f"Detailed error: {e}")
-    print("Medicine extraction will fall back to basic keyword matching and regex.")
-    tokenizer = None
-    model = None
-    nlp_pipeline = None
+# Load the model when the app starts, as before; it may later be evicted and reloaded on demand
+get_nlp_pipeline()
 
 # --- Load medicine data from JSON file ---
 MEDICINE_DATA_FILE = "medicines_combined.json" # Corrected filename
 LOADED_MEDICINE_NAMES: List[str] = []
-LOADED_MEDICINE_NAMES_LOWER_SET: set = set() # For faster lookup of lowercased names
+# Compiled once into an mmap'd artifact (medicine_catalog.py) that every worker shares read-only
+MEDICINE_CATALOG = MedicineCatalog.from_names([])
 
 def load_medicine_names():
-    global LOADED_MEDICINE_NAMES, LOADED_MEDICINE_NAMES_LOWER_SET
-    if not os.path.exists(MEDICINE_DATA_FILE):
+    global LOADED_MEDICINE_NAMES, MEDICINE_CATALOG
+    try:
+        MEDICINE_CATALOG = load_catalog(MEDICINE_DATA_FILE)
+    except FileNotFoundError:
         print(f"ERROR: {MEDICINE_DATA_FILE} not found in the backend directory.")
         print("Please ensure you have copied 'medicines_combined.json' from your Flutter assets to the 'medicare_backend' folder.")
         return []
-
-    try:
-        with open(MEDICINE_DATA_FILE, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            names_to_load = []
-            for item in data:
-                if 'name' in item and isinstance(item['name'], str):
-                    names_to_load.append(item['name'].strip())
-                
-                # Extract core medicine name from 'strength' field
-                if 'strength' in item and isinstance(item['strength'], str):
-                    # Regex to find the main medicine name before dosage/form in strength
-                    # e.g., "Paracetamol (500mg)" -> "Paracetamol"
-                    # e.g., "Cetirizine 10mg" -> "Cetirizine"
-                    strength_match = re.match(r'([A-Za-z\s]+?)(?:\s*\(?\d+.*|\s+\d+.*|$)', item['strength'].strip())
-                    if strength_match:
-                        core_name = strength_match.group(1).strip()
-                        if core_name and core_name.lower() not in LOADED_MEDICINE_NAMES_LOWER_SET: # Avoid duplicates
-                            names_to_load.append(core_name)
-            
-            # Remove duplicates and sort for consistency (optional, but good for debugging)
-            unique_names = sorted(list(set(names_to_load)))
-            
-            LOADED_MEDICINE_NAMES = unique_names
-            LOADED_MEDICINE_NAMES_LOWER_SET = {n.lower() for n in unique_names} # Populate the set for quick lowercase lookups
-            
-            print(f"Successfully loaded {len(LOADED_MEDICINE_NAMES)} unique medicine names from {MEDICINE_DATA_FILE}.")
-            if "paracetamol" in LOADED_MEDICINE_NAMES_LOWER_SET:
-                print("DEBUG: 'Paracetamol' (lowercase) IS found in loaded medicine names set.")
-            else:
-                print("DEBUG: 'Paracetamol' (lowercase) NOT found in loaded medicine names set. Check JSON 'strength' field extraction.")
-            return LOADED_MEDICINE_NAMES
     except json.JSONDecodeError as e:
         print(f"ERROR: Failed to parse {MEDICINE_DATA_FILE}. Ensure it's valid JSON. Error: {e}")
         return []
@@ -96,11 +109,47 @@ def load_medicine_names():
         print(f"ERROR: An unexpected error occurred while loading {MEDICINE_DATA_FILE}: {e}")
         return []
 
+    # Names from each item's 'name' and the core names parsed from its 'strength', unique and sorted
+    LOADED_MEDICINE_NAMES = MEDICINE_CATALOG.names
+    print(f"Successfully loaded {len(LOADED_MEDICINE_NAMES)} unique medicine names from {MEDICINE_DATA_FILE}.")
+    if "paracetamol" in MEDICINE_CATALOG:
+        print("DEBUG: 'Paracetamol' (lowercase) IS found in loaded medicine names set.")
+    else:
+        print("DEBUG: 'Paracetamol' (lowercase) NOT found in loaded medicine names set. Check JSON 'strength' field extraction.")
+    return LOADED_MEDICINE_NAMES
+
 # Load medicines when the app starts
 LOADED_MEDICINE_NAMES = load_medicine_names()
+MEDICINE_MATCHER = MedicineMatcher(LOADED_MEDICINE_NAMES) # Built once; shared by extraction and suggestion
+GAZETTEER = Gazetteer(LOADED_MEDICINE_NAMES) # Built once; finds catalog names in text when NER is unavailable
+TYPEAHEAD_MAX_LIMIT = 50
+# Built once; /typeahead ranks by how often feedback confirmed a name
+TYPEAHEAD = TypeaheadIndex(LOADED_MEDICINE_NAMES, top_k=TYPEAHEAD_MAX_LIMIT)
+CATALOG_VERSION = MEDICINE_CATALOG.version # Part of every response cache key
+
+# --- Adaptive Learning: Persistent storage for feedback ---
+# Entries are plain dicts (FeedbackRequest.dict()) appended to an SQLite file shared by all workers
+# (MEDICARE_FEEDBACK_DB); each worker keeps a capped hot index of them in memory.
+LEARNED_FEEDBACK = FeedbackStore.from_env(on_feedback=TYPEAHEAD.record_feedback)
+FEEDBACK_SCAN_LENGTH = METRICS.histogram(
+    "medicare_feedback_scan_entries", "Learned feedback entries compared per lookup.", buckets=SIZE_BUCKETS
+)
 
-# --- Adaptive Learning: In-memory storage for feedback ---
-LEARNED_FEEDBACK: List[Dict] = []
+# NER and fuzzy matching block, so they run on a bounded thread pool instead of the event loop
+# (MEDICARE_INFERENCE_WORKERS threads, MEDICARE_INFERENCE_QUEUE_DEPTH waiting calls, then 503).
+INFERENCE_POOL = InferencePool.from_env("backend")
+# /extract_medicines_batch: texts per request, and texts per NER forward pass
+BATCH_MAX_TEXTS = int(os.environ.get("MEDICARE_EXTRACT_BATCH_MAX_TEXTS", "256"))
+NER_BATCH_SIZE = int(os.environ.get("MEDICARE_NER_BATCH_SIZE", "16"))
+
+# Whole /extract_medicines responses (MEDICARE_RESPONSE_CACHE_SIZE, MEDICARE_RESPONSE_CACHE_TTL_SECONDS).
+# Keys include the catalog and learned-feedback versions, so feedback stored by any worker or a
+# different catalog is never answered from an older entry; identical concurrent requests share one run.
+RESPONSE_CACHE = ResponseCache.from_env("extract_medicines")
+
+def _response_cache_version() -> str:
+    extraction_path = "basic" if MODEL_REGISTRY.state("ner") == FAILED else "ner"
+    return f"{CATALOG_VERSION}:feedback{LEARNED_FEEDBACK.version()}:{extraction_path}"
 
 app = FastAPI(
     title="Medicare Medicine Extraction Backend",
@@ -133,129 +182,33 @@ class SuggestionRequest(BaseModel):
 class SuggestionResponse(BaseModel):
     suggestion: str
 
+class BatchMedicineRequest(BaseModel):
+    texts: List[str]
+
+class BatchMedicineResult(BaseModel):
+    medicines: List[MedicineResponse]
+    error: Optional[str] = None
+
+class TypeaheadResponse(BaseModel):
+    suggestions: List[str]
+    match: str # "prefix", "fuzzy" or "none"
+
 class FeedbackRequest(BaseModel):
     original_text: str
     corrected_medicines: List[MedicineDetail]
 
 # --- Helper Functions for Regex Extraction (used after name identification) ---
 
-# Mapping for common spelled-out numbers to digits
-NUMBER_WORDS = {
-    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5',
-    'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10',
-    'eleven': '11', 'twelve': '12', 'thirteen': '13', 'fourteen': '14', 'fifteen': '15',
-    'sixteen': '16', 'seventeen': '17', 'eighteen': '18', 'nineteen': '19', 'twenty': '20',
-    'thirty': '30', 'forty': '40', 'fifty': '50', 'sixty': '60', 'seventy': '70',
-    'eighty': '80', 'ninety': '90', 'hundred': '100', 'thousand': '1000',
-    'half': '0.5' # For dosages like "half tablet"
-}
-
-def word_to_num(text_segment):
-    """Converts a string segment containing spelled-out numbers to digits.
-    Handles simple single words and common two-word numbers like "six fifty".
-    """
-    text_segment_lower = text_segment.lower().strip()
-    
-    # Direct mapping for single words
-    if text_segment_lower in NUMBER_WORDS:
-        return NUMBER_WORDS[text_segment_lower]
-
-    # Handle compound numbers like "six fifty" -> "650"
-    parts = text_segment_lower.split()
-    if len(parts) == 2:
-        if parts[0] in NUMBER_WORDS and parts[1] in NUMBER_WORDS:
-            try:
-                val1 = float(NUMBER_WORDS[parts[0]])
-                val2 = float(NUMBER_WORDS[parts[1]])
-                # Heuristic: if first number is <100 and second is >=10, it's likely a combination like "six fifty"
-                if val1 < 100 and val2 >= 10:
-                    return str(int(val1 * 100 + val2)) # e.g., 6 * 100 + 50 = 650
-            except ValueError:
-                pass # Not convertible to number
-    
-    # Fallback: Try to parse as a float if it contains digits
-    try:
-        if re.match(r'^\d+(\.\d+)?$', text_segment_lower):
-            return text_segment_lower
-    except ValueError:
-        pass
-
-    return text_segment # Return original if no conversion happened
-
-def _extract_dosage(text: str) -> str:
-    # Pattern for numbers (digits or spelled out)
-    num_pattern = r'(?:(?:\d+(?:\.\d+)?)|' + r'|'.join(NUMBER_WORDS.keys()) + r')'
-    
-    # Units pattern
-    units_pattern = r'(?:mg|g|ml|mcg|unit|tablet|pill|capsule|spoon(?:ful)?|units?|tabs?|caps?|bottles?|vials?|sachets?|pouches?|drops?|puffs?|sprays?|inhalations?|patches?|ml|drops|units|tabs|caps|bottles|vials|sachets|pouches|puffs|sprays|inhalations|patches)\b'
-    
-    # Try to find a number followed by a unit (e.g., "50 mg", "two tablets", "six fifty mg")
-    # This pattern tries to capture multi-word numbers like "six fifty"
-    regex = re.search(rf'({num_pattern}(?:\s*{num_pattern})*\s*{units_pattern})', text, re.IGNORECASE)
-    if regex:
-        matched_str = regex.group(0).strip() # Get the full matched string
-        
-        # Extract the numerical part to convert it
-        num_part_match = re.search(rf'({num_pattern}(?:\s*{num_pattern})*)', matched_str, re.IGNORECASE)
-        unit_part_match = re.search(units_pattern, matched_str, re.IGNORECASE)
-        
-        if num_part_match and unit_part_match:
-            converted_value = word_to_num(num_part_match.group(0))
-            return f"{converted_value} {unit_part_match.group(0).strip()}"
-        return matched_str # Fallback if parts not found
-    
-    # Fallback: Just a number that might be a dosage (e.g., "paracetamol 650")
-    # Look for a number pattern that is not necessarily followed by a unit, but is a standalone number
-    regex_just_num = re.search(rf'(\b{num_pattern}(?:\s*{num_pattern})*\b)', text, re.IGNORECASE)
-    if regex_just_num:
-        converted_value = word_to_num(regex_just_num.group(0))
-        # Only append "mg" as a common default if no unit was explicitly found nearby
-        # This is a heuristic, adjust if it causes false positives
-        if not re.search(units_pattern, text, re.IGNORECASE): # Check entire text for units
-            return f"{converted_value} mg" 
-        return converted_value # Return just the number if a unit was present but not captured by main regex
-    
-    return 'N/A'
-
-def _extract_duration(text: str) -> str:
-    # Captures number + time unit (days, weeks, months, years, hours)
-    num_pattern = r'(?:(?:\d+(?:\.\d+)?)|' + r'|'.join(NUMBER_WORDS.keys()) + r')'
-    duration_units = r'(?:day|week|month|year|hr|hour)s?'
-    regex = re.search(rf'(?:for\s+)?({num_pattern}(?:\s*{num_pattern})*\s*{duration_units})\b', text, re.IGNORECASE)
-    if regex:
-        matched_str = regex.group(0).strip()
-        num_part_match = re.search(rf'({num_pattern}(?:\s*{num_pattern})*)', matched_str, re.IGNORECASE)
-        unit_part_match = re.search(duration_units, matched_str, re.IGNORECASE)
-        if num_part_match and unit_part_match:
-            converted_value = word_to_num(num_part_match.group(0))
-            return f"{converted_value} {unit_part_match.group(0).strip()}"
-        return matched_str
-    
-    return 'N/A'
-
-def _extract_frequency(text: str) -> str:
-    # Captures common frequency terms and abbreviations
-    num_pattern = r'(?:(?:\d+(?:\.\d+)?)|' + r'|'.join(NUMBER_WORDS.keys()) + r')'
-    frequency_terms = r'(twice daily|once a day|thrice daily|three times a day|four times a day|daily|every\s+' + num_pattern + r'\s*hours|b\.?d\.?|t\.?i\.?d\.?|o\.?d\.?|q\.?i\.?d\.?|bd|tid|od|qid|bid|tds|qds|qd|prn|stat|as needed|every other day|alternate day|weekly|monthly|once)\b'
-    regex = re.search(frequency_terms, text, re.IGNORECASE)
-    if regex:
-        matched_str = regex.group(0).strip()
-        # If it contains a number word, try to convert it
-        num_match = re.search(num_pattern, matched_str, re.IGNORECASE)
-        if num_match:
-            converted_num = word_to_num(num_match.group(0))
-            # Replace the word number with digit
-            return re.sub(re.escape(num_match.group(0)), converted_num, matched_str, flags=re.IGNORECASE) # Use re.escape for safety
-        return matched_str
-    return 'N/A'
-
-def _extract_timing(text: str) -> str:
-    # Captures common timing phrases
-    timing_terms = r'(before food|after food|at night|morning|evening|bedtime|before meal|after meal|empty stomach|with food|after breakfast|after lunch|after dinner|before breakfast|before lunch|before dinner)\b'
-    regex = re.search(timing_terms, text, re.IGNORECASE)
-    if regex:
-        return regex.group(0).strip()
-    return 'N/A'
+# The text is scanned once per request (detail_extraction.scan_details; app.py keeps its own
+# per-segment rules) and each medicine gets the dosage, duration, frequency and timing
+# mentioned nearest to it.
+def _attach_details(text: str, medicines: List[Dict], spans: List[Optional[tuple]]) -> List[Dict]:
+    """Adds dosage/duration/frequency/timing to each {"name": ...} in `medicines`, located at `spans` in `text`."""
+    if not medicines:
+        return medicines
+    with time_stage("detail_extraction"):
+        details = assign_details(text, spans)
+    return [{**medicine, **medicine_details} for medicine, medicine_details in zip(medicines, details)]
 
 # Helper to merge subword tokens from NER results
 def merge_ner_tokens(ner_results):
@@ -278,118 +231,172 @@ def merge_ner_tokens(ner_results):
         merged_entities.append(current_entity)
     return merged_entities
 
+# --- Learned feedback lookup ---
+def _find_learned_feedback(text_lower: str) -> Optional[Dict]:
+    """Returns the first learned feedback entry whose original text is highly similar to `text_lower`, or None."""
+    with time_stage("feedback_lookup"):
+        # High threshold (90 out of 100) for direct reuse; the earliest stored entry above it wins
+        match, similarity_score, scanned = LEARNED_FEEDBACK.find(text_lower, threshold=90)
+    if match is not None:
+        trace_event("feedback_match", score=similarity_score, original_text=match['original_text'])
+    FEEDBACK_SCAN_LENGTH.observe(scanned)
+    FUZZY_COMPARISONS.inc(scanned, source="feedback")
+    return match
+
 # --- Core Extraction Logic (Prioritizes Learned Feedback) ---
 def _extract_medicines(text: str) -> List[Dict]:
-    print(f"DEBUG: nlp_pipeline status at _extract_medicines start: {nlp_pipeline is not None}")
+    nlp_pipeline = get_nlp_pipeline()
     text_lower = text.lower()
 
     # 1. Check LEARNED_FEEDBACK first for highly similar inputs
-    for feedback_entry in LEARNED_FEEDBACK:
-        original_feedback_text_lower = feedback_entry['original_text'].lower()
-        similarity_score = fuzz.ratio(text_lower, original_feedback_text_lower) # Returns a score out of 100
-        if similarity_score > 90: # High threshold (e.g., 90 out of 100) for direct reuse
-            print(f"DEBUG: Found highly similar input in learned feedback (score: {similarity_score}). Returning corrected data.")
-            return [med.dict() for med in feedback_entry['corrected_medicines']]
+    feedback_entry = _find_learned_feedback(text_lower)
+    if feedback_entry is not None:
+        return [dict(med) for med in feedback_entry['corrected_medicines']]
 
     # 2. If no direct feedback match, proceed with NER model (or fallback)
     if nlp_pipeline:
-        print(f"DEBUG: Processing input text with NER model: '{text}'")
-        return _extract_medicines_with_biobert(text) # Function name remains, but uses new model
+        trace_event("extraction_path", path="ner")
+        return _extract_medicines_with_biobert(text, nlp_pipeline) # Function name remains, but uses new model
     else:
-        print(f"DEBUG: Processing input text with basic keyword matching: '{text}'")
+        trace_event("extraction_path", path="basic")
         return _extract_medicines_basic(text)
 
 # --- NER Model-based Extraction (if loaded) ---
-def _extract_medicines_with_biobert(text: str) -> List[Dict]:
+# d4data/biomedical-ner-all uses 'Chemical' and 'Medication' for drugs.
+# We'll target 'Chemical' and 'Medication' for medicine names.
+MEDICINE_ENTITY_GROUPS = ['Chemical', 'CHEMICAL', 'DRUG', 'MEDICINE', 'COMPOUND', 'Medication']
+
+def _extract_medicines_with_biobert(text: str, nlp_pipeline) -> List[Dict]:
+    with time_stage("ner"):
+        raw_ner_results = nlp_pipeline(text)
+    return _medicines_from_ner(text, raw_ner_results, None)
+
+def _medicines_from_ner(text: str, raw_ner_results, catalog_matches: Optional[Dict]) -> List[Dict]:
+    """
+    Catalog medicines (with details) for the NER results of `text`. `catalog_matches` holds
+    precomputed best matches by entity text (batch extraction); otherwise each is matched here.
+    """
     extracted_data = []
-    raw_ner_results = nlp_pipeline(text)
-    print(f"DEBUG: Raw NER results from NER model (before merging): {raw_ner_results}")
+    spans = []
+    trace_event("raw_entities", entities=raw_ner_results)
     
     # Merge subword tokens first
     ner_results = merge_ner_tokens(raw_ner_results)
-    print(f"DEBUG: Merged NER results: {ner_results}")
+    trace_event("entities", entities=ner_results)
 
     identified_medicine_names = set()
 
     for entity in ner_results:
-        # d4data/biomedical-ner-all uses 'Chemical' and 'Medication' for drugs.
-        # We'll target 'Chemical' and 'Medication' for medicine names.
-        if entity['entity_group'] in ['Chemical', 'CHEMICAL', 'DRUG', 'MEDICINE', 'COMPOUND', 'Medication']: 
+        if entity['entity_group'] in MEDICINE_ENTITY_GROUPS: 
             potential_med_name = entity['word'].strip()
-            print(f"DEBUG: Potential medicine recognized by NER model: '{potential_med_name}' (Entity Group: {entity['entity_group']})")
-            
-            best_match_from_list = "N/A"
-            max_similarity = 0.0
             
-            # Prioritize exact match first using the lowercased set for efficiency
-            if potential_med_name.lower() in LOADED_MEDICINE_NAMES_LOWER_SET:
-                # Find the original casing from the full list
-                best_match_from_list = next((n for n in LOADED_MEDICINE_NAMES if n.lower() == potential_med_name.lower()), potential_med_name)
-                max_similarity = 100.0 # Assign 100% for exact match
-                print(f"DEBUG: Exact match found for '{potential_med_name}': '{best_match_from_list}'")
-            else: # Then proceed with fuzzy matching
-                for loaded_name in LOADED_MEDICINE_NAMES:
-                    current_similarity = fuzz.ratio(potential_med_name.lower(), loaded_name.lower()) # Score out of 100
-                    if current_similarity > max_similarity:
-                        max_similarity = current_similarity
-                        best_match_from_list = loaded_name
-                print(f"DEBUG: Best fuzzy match for '{potential_med_name}' from loaded list: '{best_match_from_list}' (Similarity: {max_similarity})")
+            if catalog_matches is not None:
+                best_match_from_list, max_similarity = catalog_matches[potential_med_name]
+            else:
+                # Exact match via the lowercase index first, then fuzzy matching over length-pruned candidates
+                with time_stage("catalog_match"):
+                    best_match_from_list, max_similarity = MEDICINE_MATCHER.best_match(potential_med_name, score_cutoff=65)
+            trace_event("catalog_match", entity=potential_med_name, group=entity['entity_group'],
+                        match=best_match_from_list, similarity=max_similarity)
 
             # Only add if similarity is above threshold and not already identified
             if max_similarity > 65 and best_match_from_list != "N/A": 
                 if best_match_from_list.lower() not in identified_medicine_names:
                     identified_medicine_names.add(best_match_from_list.lower())
-                    extracted_data.append({
-                        "name": best_match_from_list,
-                        "dosage": _extract_dosage(text),
-                        "duration": _extract_duration(text), 
-                        "frequency": _extract_frequency(text),
-                        "timing": _extract_timing(text),
-                    })
-                    print(f"DEBUG: Added extracted medicine (high similarity): {best_match_from_list}")
+                    extracted_data.append({"name": best_match_from_list})
+                    spans.append((entity['start'], entity['end']) if 'start' in entity else None)
             else:
-                print(f"DEBUG: Skipped '{potential_med_name}' (Similarity: {max_similarity}) as it's below threshold or not a valid match.")
+                trace_event("skipped_medication", entity=potential_med_name, similarity=max_similarity)
         else: 
-            print(f"DEBUG: Entity '{entity['word']}' with group '{entity['entity_group']}' is not a recognized medicine type.")
+            trace_event("skipped_entity", entity=entity['word'], group=entity['entity_group'])
 
-    print(f"DEBUG: Final extracted data from NER model: {extracted_data}")
+    extracted_data = _attach_details(text, extracted_data, spans)
+    trace_event("extracted", medicines=extracted_data)
     return extracted_data
 
+# --- Batch Extraction ---
+def _extract_medicines_batch(texts: List[str]) -> List[Dict]:
+    """
+    _extract_medicines() for many texts: one batched NER call over every text without a
+    feedback match, and one vectorized catalog match over all of their medicine entities.
+    Returns {"medicines": [...], "error": None} or {"medicines": [], "error": "..."} per text, in order.
+    """
+    results: List[Optional[Dict]] = [None] * len(texts)
+    pending = []
+    for position, text in enumerate(texts):
+        try:
+            feedback_entry = _find_learned_feedback(text.lower())
+        except Exception as e:
+            results[position] = {"medicines": [], "error": f"Feedback lookup failed: {e}"}
+            continue
+        if feedback_entry is not None:
+            results[position] = {"medicines": [dict(med) for med in feedback_entry['corrected_medicines']], "error": None}
+        else:
+            pending.append(position)
+
+    nlp_pipeline = get_nlp_pipeline()
+    if not nlp_pipeline:
+        trace_event("extraction_path", path="basic", texts=len(pending))
+        for position in pending:
+            try:
+                results[position] = {"medicines": _extract_medicines_basic(texts[position]), "error": None}
+            except Exception as e:
+                results[position] = {"medicines": [], "error": f"Extraction failed: {e}"}
+        return results
+
+    trace_event("extraction_path", path="ner", texts=len(pending))
+    raw_by_position = {}
+    if pending:
+        try:
+            with time_stage("ner"):
+                batch_output = nlp_pipeline([texts[position] for position in pending], batch_size=NER_BATCH_SIZE)
+            raw_by_position = dict(zip(pending, batch_output))
+        except Exception as e:
+            # Rerun one by one so a single bad input fails alone
+            print(f"WARNING: Batched NER failed ({e}); retrying texts individually.")
+            for position in pending:
+                try:
+                    with time_stage("ner"):
+                        raw_by_position[position] = nlp_pipeline(texts[position])
+                except Exception as item_error:
+                    results[position] = {"medicines": [], "error": f"NER failed: {item_error}"}
+
+    entity_names = [
+        entity['word'].strip()
+        for raw_ner_results in raw_by_position.values()
+        for entity in merge_ner_tokens(raw_ner_results)
+        if entity['entity_group'] in MEDICINE_ENTITY_GROUPS
+    ]
+    with time_stage("catalog_match"):
+        catalog_matches = dict(zip(entity_names, MEDICINE_MATCHER.best_matches(entity_names, score_cutoff=65)))
+
+    for position, raw_ner_results in raw_by_position.items():
+        try:
+            results[position] = {
+                "medicines": _medicines_from_ner(texts[position], raw_ner_results, catalog_matches), "error": None
+            }
+        except Exception as e:
+            results[position] = {"medicines": [], "error": f"Extraction failed: {e}"}
+    return results
+
 # Fallback basic extraction (if NER model not loaded or fails)
 def _extract_medicines_basic(text: str) -> List[Dict]:
+    with time_stage("basic_extraction"):
+        return _scan_catalog_basic(text)
+
+def _scan_catalog_basic(text: str) -> List[Dict]:
     extracted_data = []
-    text_lower = text.lower()
-    # Sort by length descending to match longer names first (e.g., "Vitamin C" before "Vitamin")
-    sorted_available_medicines = sorted(LOADED_MEDICINE_NAMES, key=len, reverse=True)
-    matched_names = set()
-    print(f"DEBUG: Basic extraction for text: '{text}'")
-
-    for med_name in sorted_available_medicines:
-        med_name_lower = med_name.lower()
-        # Check for direct containment or high fuzzy ratio
-        if med_name_lower in text_lower and med_name_lower not in matched_names:
-            print(f"DEBUG: Basic direct containment match found: '{med_name}'")
-            extracted_data.append({
-                "name": med_name,
-                "dosage": _extract_dosage(text),
-                "duration": _extract_duration(text),
-                "frequency": _extract_frequency(text),
-                "timing": _extract_timing(text),
-            })
-            matched_names.add(med_name_lower)
-        else:
-            similarity_score = fuzz.ratio(med_name_lower, text_lower) # Get similarity score
-            if similarity_score > 60 and med_name_lower not in matched_names: # Use 60 as the fuzzy threshold
-                print(f"DEBUG: Basic fuzzy match found: '{med_name}' (Similarity: {similarity_score})")
-                extracted_data.append({
-                    "name": med_name,
-                    "dosage": _extract_dosage(text),
-                    "duration": _extract_duration(text),
-                    "frequency": _extract_frequency(text),
-                    "timing": _extract_timing(text),
-                })
-                matched_names.add(med_name_lower)
-    print(f"DEBUG: Final extracted data from basic: {extracted_data}")
+    spans = []
+    # Exact catalog names in one automaton pass (longest match first, e.g. "Vitamin C" before "Vitamin"),
+    # then fuzzy matches of the remaining token windows against trigram-blocked candidates
+    matches, fuzzy_comparisons = GAZETTEER.find(text)
+    for match in matches:
+        trace_event("basic_match", name=match.name, kind=match.kind, similarity=match.score)
+        extracted_data.append({"name": match.name})
+        spans.append((match.start, match.end))
+    FUZZY_COMPARISONS.inc(fuzzy_comparisons, source="basic_extraction")
+    extracted_data = _attach_details(text, extracted_data, spans)
+    trace_event("extracted", medicines=extracted_data)
     return extracted_data
 
 
@@ -398,21 +405,20 @@ def _get_medicine_suggestion(input_text: str, patient_summary: str) -> str:
     input_lower = input_text.lower()
     
     # Prioritize learned feedback for suggestions too
-    for feedback_entry in LEARNED_FEEDBACK:
-        original_feedback_text_lower = feedback_entry['original_text'].lower()
-        similarity_score = fuzz.ratio(input_lower, original_feedback_text_lower) # Returns a score out of 100
-        if similarity_score > 90: # High threshold (e.g., 90 out of 100) for direct reuse
-            for corrected_med in feedback_entry['corrected_medicines']:
-                if fuzz.ratio(input_lower, corrected_med.name.lower()) > 75:
-                    print(f"DEBUG: Suggestion from learned feedback: {corrected_med.name}")
-                    return corrected_med.name
-            return "N/A" # If feedback matches but no medicine in feedback matches input
+    feedback_entry = _find_learned_feedback(input_lower)
+    if feedback_entry is not None:
+        for corrected_med in feedback_entry['corrected_medicines']:
+            if fuzz.ratio(input_lower, corrected_med['name'].lower()) > 75:
+                trace_event("suggestion", source="feedback", suggestion=corrected_med['name'])
+                return corrected_med['name']
+        return "N/A" # If feedback matches but no medicine in feedback matches input
     
+    nlp_pipeline = get_nlp_pipeline()
     if nlp_pipeline:
-        print("DEBUG: No direct feedback match for suggestion. Using NER model.")
-        return _get_medicine_suggestion_with_biobert(input_text, patient_summary) # Function name remains
+        trace_event("suggestion_path", path="ner")
+        return _get_medicine_suggestion_with_biobert(input_text, patient_summary, nlp_pipeline) # Function name remains
     else:
-        print("DEBUG: No direct feedback match for suggestion and NER model not loaded. Falling back to basic matching.")
+        trace_event("suggestion_path", path="basic")
         best_match = "N/A"
         highest_similarity = 0.0
         for med_name in LOADED_MEDICINE_NAMES:
@@ -420,12 +426,14 @@ def _get_medicine_suggestion(input_text: str, patient_summary: str) -> str:
             if current_similarity > 60:
                 highest_similarity = current_similarity
                 best_match = med_name
+        FUZZY_COMPARISONS.inc(len(LOADED_MEDICINE_NAMES), source="basic_suggestion")
         return best_match if highest_similarity > 60 else "N/A"
 
-def _get_medicine_suggestion_with_biobert(input_text: str, patient_summary: str) -> str:
+def _get_medicine_suggestion_with_biobert(input_text: str, patient_summary: str, nlp_pipeline) -> str:
     input_lower = input_text.lower()
     
-    raw_ner_results = nlp_pipeline(input_text)
+    with time_stage("ner"):
+        raw_ner_results = nlp_pipeline(input_text)
     ner_results = merge_ner_tokens(raw_ner_results) # Merge subwords for suggestion too
     
     potential_drug_entity = None
@@ -435,22 +443,11 @@ def _get_medicine_suggestion_with_biobert(input_text: str, patient_summary: str)
             break
 
     if potential_drug_entity:
-        best_match_name = "N/A"
-        max_similarity = 0.0
-        
-        # Prioritize exact match first for suggestion
-        if potential_drug_entity.lower() in LOADED_MEDICINE_NAMES_LOWER_SET:
-            best_match_name = next((n for n in LOADED_MEDICINE_NAMES if n.lower() == potential_drug_entity.lower()), potential_drug_entity)
-            max_similarity = 100.0
-            print(f"DEBUG: Exact match found for suggestion '{potential_drug_entity}': '{best_match_name}'")
-        else: # Then proceed with fuzzy matching
-            for loaded_name in LOADED_MEDICINE_NAMES:
-                current_similarity = fuzz.ratio(potential_drug_entity.lower(), loaded_name.lower())
-                if current_similarity > max_similarity:
-                    max_similarity = current_similarity
-                    best_match_name = loaded_name
-            print(f"DEBUG: Best fuzzy match for suggestion '{potential_drug_entity}': '{best_match_name}' (Similarity: {max_similarity})")
-        
+        # Prioritize exact match first for suggestion, then fuzzy matching over length-pruned candidates
+        with time_stage("catalog_match"):
+            best_match_name, max_similarity = MEDICINE_MATCHER.best_match(potential_drug_entity, score_cutoff=65)
+        trace_event("catalog_match", entity=potential_drug_entity, match=best_match_name, similarity=max_similarity)
+
         if max_similarity > 65: # Use the same fuzzy threshold as extraction
             return best_match_name
     
@@ -458,8 +455,28 @@ def _get_medicine_suggestion_with_biobert(input_text: str, patient_summary: str)
 
 
 # --- API Endpoints ---
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        record_request(route.path if route else "unmatched", status, time.perf_counter() - started)
+
+@app.exception_handler(PoolSaturated)
+async def pool_saturated_handler(request: Request, exc: PoolSaturated):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Server is busy. Retry shortly."},
+        headers={"Retry-After": str(exc.retry_after_seconds)},
+    )
+
 @app.post("/extract_medicines", response_model=List[MedicineResponse])
-async def extract_medicines_api(request: MedicineRequest):
+async def extract_medicines_api(request: MedicineRequest, http_request: Request):
     """
     Extracts medicine prescriptions from a given text (summary or voice input)
     by prioritizing learned feedback, then using BioBERT, then basic matching.
@@ -467,12 +484,35 @@ async def extract_medicines_api(request: MedicineRequest):
     if not LOADED_MEDICINE_NAMES:
         raise HTTPException(status_code=500, detail="Medicine data not loaded on backend. Check server logs.")
 
-    extracted = _extract_medicines(request.text)
-    
-    if not extracted:
-        return []
-    
-    return extracted
+    # The version syncs learned feedback from SQLite, so it is read off the event loop
+    key = RESPONSE_CACHE.key("/extract_medicines", request.dict(), await run_in_threadpool(_response_cache_version))
+    with TRACER.request("/extract_medicines", text=request.text):
+        cached, outcome = await RESPONSE_CACHE.get_or_compute_async(key, lambda: _extract_medicines_response(request.text))
+        trace_event("response_cache", result=outcome)
+
+    # Served as pre-serialized JSON, so response_model validation happens in _extract_medicines_response
+    if etag_matches(http_request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=304, headers={"ETag": cached.etag})
+    return Response(content=cached.body, media_type="application/json", headers={"ETag": cached.etag})
+
+async def _extract_medicines_response(text: str) -> List[Dict]:
+    extracted = await INFERENCE_POOL.run(_extract_medicines, text)
+    return [MedicineResponse(**medicine).dict() for medicine in extracted]
+
+@app.post("/extract_medicines_batch", response_model=List[BatchMedicineResult])
+async def extract_medicines_batch_api(request: BatchMedicineRequest):
+    """
+    Extracts medicine prescriptions from many texts in one call, batching the NER
+    forward passes and catalog matching. Results are in input order; a text that
+    fails gets an empty list and an error message without failing the others.
+    """
+    if not LOADED_MEDICINE_NAMES:
+        raise HTTPException(status_code=500, detail="Medicine data not loaded on backend. Check server logs.")
+    if len(request.texts) > BATCH_MAX_TEXTS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_TEXTS} texts per batch.")
+
+    with TRACER.request("/extract_medicines_batch", texts=len(request.texts)):
+        return await INFERENCE_POOL.run(_extract_medicines_batch, request.texts)
 
 @app.post("/suggest_medicine", response_model=SuggestionResponse)
 async def suggest_medicine_api(request: SuggestionRequest):
@@ -483,21 +523,99 @@ async def suggest_medicine_api(request: SuggestionRequest):
     if not LOADED_MEDICINE_NAMES:
         raise HTTPException(status_code=500, detail="Medicine data not loaded on backend. Check server logs.")
 
-    suggestion = _get_medicine_suggestion(
-        request.input_text,
-        request.patient_summary
-    )
+    with TRACER.request("/suggest_medicine", input_text=request.input_text):
+        suggestion = await INFERENCE_POOL.run(
+            _get_medicine_suggestion,
+            request.input_text,
+            request.patient_summary
+        )
     return {"suggestion": suggestion}
 
+@app.get("/typeahead", response_model=TypeaheadResponse)
+async def typeahead_api(q: str, limit: int = 10):
+    """
+    Ranked catalog names for a partially typed medicine name, for per-keystroke use.
+    Served from a prefix index built at startup; never runs the NER model.
+    """
+    if not LOADED_MEDICINE_NAMES:
+        raise HTTPException(status_code=500, detail="Medicine data not loaded on backend. Check server logs.")
+    suggestions, match = TYPEAHEAD.suggest(q, max(1, min(limit, TYPEAHEAD_MAX_LIMIT)))
+    return {"suggestions": suggestions, "match": match}
+
 @app.post("/feedback_extraction")
 async def feedback_extraction(feedback: FeedbackRequest):
     """
     Receives feedback on extracted medicines to 'learn' from user corrections.
-    This data is stored in-memory for demonstration.
+    Stored on disk and picked up by every worker on its next lookup.
     """
-    LEARNED_FEEDBACK.append(feedback.dict())
-    print(f"DEBUG: Received feedback. Current learned feedback count: {len(LEARNED_FEEDBACK)}")
-    print(f"DEBUG: Stored feedback for original text (first 50 chars): {feedback.original_text[:50]}...")
+    with TRACER.request("/feedback_extraction"):
+        await run_in_threadpool(LEARNED_FEEDBACK.add, feedback.original_text, feedback.dict())
+        RESPONSE_CACHE.invalidate()
+        trace_event("feedback_stored", count=len(LEARNED_FEEDBACK), original_text=feedback.original_text[:50])
     return {"message": "Feedback received and stored conceptually."}
 
+@app.get("/feedback_stats")
+async def feedback_stats():
+    """
+    Reports stored feedback, the hot index size against its cap, and evictions.
+    """
+    return await run_in_threadpool(LEARNED_FEEDBACK.stats)
+
+@app.get("/model_stats")
+async def model_stats():
+    """
+    Reports model load/evict counters and resident memory against the configured budget.
+    """
+    return MODEL_REGISTRY.stats()
+
+@app.get("/inference_stats")
+async def inference_stats():
+    """
+    Reports running and queued inference calls and how many were rejected with 503.
+    """
+    return INFERENCE_POOL.stats()
+
+@app.get("/response_cache_stats")
+async def response_cache_stats():
+    """
+    Reports /extract_medicines response cache hits, misses and requests coalesced onto a running one.
+    """
+    return {**RESPONSE_CACHE.stats(), "catalog_version": CATALOG_VERSION}
+
+class TraceSettings(BaseModel):
+    sample_rate: float
+
+def _require_debug_access(request: Request):
+    # Traces hold raw transcripts: off unless MEDICARE_DEBUG_TOKEN is set, then bearer-token only
+    status = TRACER.debug_access_status(request.headers.get("authorization"))
+    if status != 200:
+        raise HTTPException(status_code=status, detail="Not Found" if status == 404 else "Unauthorized")
+
+@app.get("/debug/traces")
+async def debug_traces(request: Request, limit: Optional[int] = None):
+    """
+    The most recent sampled request traces, newest first. Needs the debug bearer token.
+    """
+    _require_debug_access(request)
+    return {**TRACER.stats(), "traces": TRACER.traces(limit)}
+
+@app.put("/debug/traces")
+async def set_trace_sample_rate(request: Request, settings: TraceSettings):
+    """
+    Changes the fraction of requests traced, effective immediately. Needs the debug bearer token.
+    """
+    _require_debug_access(request)
+    try:
+        TRACER.sample_rate = settings.sample_rate
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TRACER.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: request and per-stage latency, fuzzy comparisons and feedback-scan length.
+    """
+    return Response(METRICS.render(), media_type=CONTENT_TYPE)
+
 # To run this file: uvicorn backend_app:app --reload --host 0.0.0.0 --port 8000
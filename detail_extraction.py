@@ -0,0 +1,332 @@
+# detail_extraction.py
+"""
+Precompiled dosage / frequency / duration / timing / advice extraction shared by
+app.py and backend_app.py.
+
+Every pattern is built from NUMBER_WORDS and compiled once at import, and number
+words are normalized with one compiled alternation instead of a re.sub per word.
+
+`scan_details` is the single-pass engine: one combined alternation with named
+groups that returns every detail mention in a text with its span. backend_app.py
+assigns those mentions to medicines with `assign_details`; app.py keeps its
+original sequential segment rules (`extract_segment_details`) on top of the same
+precompiled patterns. tests/detail_extraction_corpus.json holds the regression
+corpus they are checked against.
+"""
+import bisect
+import re
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from word2number import w2n
+
+# Mapping for common spelled-out numbers to digits
+NUMBER_WORDS = {
+    'one': '1', 'two': '2', 'three': '3', 'four': '4', 'five': '5',
+    'six': '6', 'seven': '7', 'eight': '8', 'nine': '9', 'ten': '10',
+    'eleven': '11', 'twelve': '12', 'thirteen': '13', 'fourteen': '14', 'fifteen': '15',
+    'sixteen': '16', 'seventeen': '17', 'eighteen': '18', 'nineteen': '19', 'twenty': '20',
+    'thirty': '30', 'forty': '40', 'fifty': '50', 'sixty': '60', 'seventy': '70',
+    'eighty': '80', 'ninety': '90', 'hundred': '100', 'thousand': '1000',
+    'half': '0.5' # For dosages like "half tablet"
+}
+
+_NUMBER_WORDS_ALT = '|'.join(NUMBER_WORDS.keys())
+
+# A single spelled-out number word (whole word), for digit substitution
+NUMBER_WORD_RE = re.compile(r'\b(?:' + _NUMBER_WORDS_ALT + r')\b', re.IGNORECASE)
+
+
+def replace_number_words(text: str) -> str:
+    """Replaces every whole spelled-out number word with its digits ("two times" -> "2 times")."""
+    return NUMBER_WORD_RE.sub(lambda match: NUMBER_WORDS[match.group(0).lower()], text)
+
+
+# --- backend_app.py patterns (case-insensitive) ---
+_NUM = r'(?:(?:\d+(?:\.\d+)?)|' + _NUMBER_WORDS_ALT + r')'
+_DOSAGE_UNITS = r'(?:mg|g|ml|mcg|unit|tablet|pill|capsule|spoon(?:ful)?|units?|tabs?|caps?|bottles?|vials?|sachets?|pouches?|drops?|puffs?|sprays?|inhalations?|patches?|ml|drops|units|tabs|caps|bottles|vials|sachets|pouches|puffs|sprays|inhalations|patches)\b'
+
+NUMBER_RUN_RE = re.compile(rf'({_NUM}(?:\s*{_NUM})*)', re.IGNORECASE)
+DOSAGE_UNIT_RE = re.compile(_DOSAGE_UNITS, re.IGNORECASE)
+BARE_NUMBER_RE = re.compile(rf'(\b{_NUM}(?:\s*{_NUM})*\b)', re.IGNORECASE)
+_DIGITS_RE = re.compile(r'^\d+(\.\d+)?$')
+
+# --- app.py patterns (run on lowercased text) ---
+_SEGMENT_NUMBER = r'(?:' + _NUMBER_WORDS_ALT + r'|\d+(?:\.\d+)?)(?:\s+(?:' + _NUMBER_WORDS_ALT + r'))*'
+_SEGMENT_UNITS = r'(?:mg|g|ml|mcg|unit|tablet|pill|capsule|spoon(?:ful)?|units?|tabs?|caps?|bottles?|vials?|sachets?|pouches?|drops?|puffs?|sprays?|inhalations?|patches?|milligrams|grams|liters?|tablets|pills)\b'
+
+SEGMENT_DOSAGE_RE = re.compile(rf'({_SEGMENT_NUMBER})\s*({_SEGMENT_UNITS})?')
+SEGMENT_FREQUENCY_RES = [re.compile(pattern) for pattern in (
+    r'\b(?:once|twice|thrice)\s+a\s+day\b',
+    r'\b(?:one|two|three|four|five|six|seven|eight|nine|\d+)\s+times\s+a\s+day\b',
+    r'\b(?:daily|every\s+day)\b',
+    r'\b(?:every\s+\d+\s*hours?)\b',
+    r'\b(?:b\.?d\.?|t\.?i\.?d\.?|o\.?d\.?|q\.?i\.?d\.?|bd|tid|od|qid|bid|tds|qds|qd|prn|stat|as needed)\b',
+    r'\b(?:weekly|monthly|yearly)\b',
+    r'\b(?:once)\b',
+    r'\b(?:before\s+meals|after\s+meals|with\s+food|empty\s+stomach|at\s+night|in\s+the\s+morning|in\s+the\s+evening)\b', # Added common timings
+)]
+SEGMENT_DURATION_RES = [re.compile(pattern) for pattern in (
+    r'\b(?:for\s+)?(?:one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|\d+)\s+(?:day|week|month|year|hour)s?\b',
+    r'\b(?:a\s+couple\s+of\s+days?)\b',
+    r'\b(?:long\s+term|indefinitely|as\s+long\s+as\s+needed)\b', # Added more duration phrases
+)]
+# Number and unit inside an NER-tagged Dosage entity
+NER_DOSAGE_RE = re.compile(r'((?:' + _NUMBER_WORDS_ALT + r'|\d+(?:\.\d+)?)(?:\s+(?:' + _NUMBER_WORDS_ALT + r'))*)?\s*(mg|ml|g|units?|milligrams|grams|liters?|tablet|pill|capsule|spoon(?:ful)?)?')
+
+# Advice phrase -> pattern, in reporting order
+ADVICE_PATTERNS = (
+    ("Drink plenty of water.", r'\b(drink|have|take|give)\s+(plenty\s+of\s+)?water\b|\bhydrate\b'),
+    ("Drink juice.", r'\b(drink|have|take|give)\s+(some\s+)?juice\b'),
+    ("Eat fruits.", r'\b(eat|have)\s+(fresh\s+)?fruits?\b'),
+    ("Eat raw vegetables.", r'\b(eat|have)\s+(raw\s+)?vegetables?\b|\bveggies\b'),
+    ("Avoid excess salt.", r'\b(no|avoid|reduce)\s+(extra\s+)?salt\b'),
+    ("Avoid excess sugar.", r'\b(no|avoid|reduce)\s+(added\s+)?sugar\b'),
+    ("Avoid oily/fried food.", r'\b(avoid|reduce)\s+(oily|fried)\s+food\b'),
+    ("Get adequate rest.", r'\b(get\s+enough|take)\s+rest\b'),
+    ("Do light exercise.", r'\b(do|perform)\s+(light\s+)?exercise\b'),
+)
+ADVICE_RES = [(advice, re.compile(pattern)) for advice, pattern in ADVICE_PATTERNS]
+
+
+# --- Single-pass scan ---
+class DetailMatch(NamedTuple):
+    kind: str # "dosage", "frequency", "duration", "timing" or "advice"
+    text: str # matched text as it appears in the input
+    value: str # normalized value (digits for number words; the advice phrase for advice)
+    start: int
+    end: int
+
+
+def _strip_groups(pattern):
+    """Makes every capturing group non-capturing so patterns can be nested in the scanner."""
+    return re.sub(r'(?<!\\)\((?!\?)', '(?:', pattern)
+
+_SCAN_ALTERNATIVES = [
+    # Earlier alternatives win when two kinds start at the same position
+    ("frequency", r'\b(?:(?:once|twice|thrice)\s+(?:a\s+day|daily)|' + _NUM + r'\s+times\s+a\s+day'
+                  r'|every\s+' + _NUM + r'\s*(?:hours?|hrs?)|every\s+(?:day|other\s+day)|alternate\s+day'
+                  r'|daily|weekly|monthly|yearly|b\.?d\.?|t\.?i\.?d\.?|o\.?d\.?|q\.?i\.?d\.?|bid|tds|qds|qd'
+                  r'|prn|stat|as\s+needed|once)\b'),
+    ("duration", r'\b(?:for\s+)?' + _NUM + r'(?:\s*' + _NUM + r')*\s*(?:day|week|month|year|hr|hour)s?\b'
+                 r'|\b(?:a\s+couple\s+of\s+days?|long\s+term|indefinitely|as\s+long\s+as\s+needed)\b'),
+    ("dosage", r'\b' + _NUM + r'(?:\s*' + _NUM + r')*\s*' + _SEGMENT_UNITS),
+    ("timing", r'\b(?:(?:before|after|with)\s+(?:food|meals?|breakfast|lunch|dinner)|at\s+night'
+               r'|(?:in\s+the\s+)?(?:morning|evening)|bedtime|empty\s+stomach)\b'),
+] + [(f"advice_{index}", _strip_groups(pattern)) for index, (_, pattern) in enumerate(ADVICE_PATTERNS)]
+
+DETAIL_SCAN_RE = re.compile(
+    '|'.join(f'(?P<{name}>{pattern})' for name, pattern in _SCAN_ALTERNATIVES), re.IGNORECASE
+)
+
+
+def _normalize_dosage(matched: str) -> str:
+    number = NUMBER_RUN_RE.match(matched)
+    unit = matched[number.end():].strip() if number else ''
+    return f"{word_to_num(number.group(0))} {unit}".strip() if number else matched
+
+
+def scan_details(text: str) -> List[DetailMatch]:
+    """
+    Scans `text` once and returns every dosage, frequency, duration, timing and advice
+    mention, in order of appearance, with its character span.
+    """
+    matches = []
+    for match in DETAIL_SCAN_RE.finditer(text):
+        kind = match.lastgroup
+        matched = match.group(0)
+        if kind.startswith("advice_"):
+            matches.append(DetailMatch("advice", matched, ADVICE_PATTERNS[int(kind[7:])][0], match.start(), match.end()))
+        elif kind == "dosage":
+            matches.append(DetailMatch(kind, matched, _normalize_dosage(matched), match.start(), match.end()))
+        else:
+            matches.append(DetailMatch(kind, matched, replace_number_words(matched.lower()), match.start(), match.end()))
+    return matches
+
+
+# --- backend_app.py extraction rules ---
+def word_to_num(text_segment):
+    """Converts a string segment containing spelled-out numbers to digits.
+    Handles simple single words and common two-word numbers like "six fifty".
+    """
+    text_segment_lower = text_segment.lower().strip()
+
+    # Direct mapping for single words
+    if text_segment_lower in NUMBER_WORDS:
+        return NUMBER_WORDS[text_segment_lower]
+
+    # Handle compound numbers like "six fifty" -> "650"
+    parts = text_segment_lower.split()
+    if len(parts) == 2:
+        if parts[0] in NUMBER_WORDS and parts[1] in NUMBER_WORDS:
+            try:
+                val1 = float(NUMBER_WORDS[parts[0]])
+                val2 = float(NUMBER_WORDS[parts[1]])
+                # Heuristic: if first number is <100 and second is >=10, it's likely a combination like "six fifty"
+                if val1 < 100 and val2 >= 10:
+                    return str(int(val1 * 100 + val2)) # e.g., 6 * 100 + 50 = 650
+            except ValueError:
+                pass # Not convertible to number
+
+    # Fallback: Try to parse as a float if it contains digits
+    if _DIGITS_RE.match(text_segment_lower):
+        return text_segment_lower
+
+    return text_segment # Return original if no conversion happened
+
+
+DETAIL_KINDS = ("dosage", "duration", "frequency", "timing")
+_LEADING_FOR_RE = re.compile(r'^for\s+')
+
+
+def _mention_value(detail: DetailMatch) -> str:
+    """A scanned mention formatted as a detail value ("for 5 days" -> "5 days")."""
+    if detail.kind == "dosage":
+        return detail.value
+    if detail.kind == "duration":
+        return _LEADING_FOR_RE.sub('', detail.value.strip())
+    if detail.kind == "frequency":
+        return replace_number_words(detail.text.strip())
+    return detail.text.strip()
+
+
+def assign_details(text: str, spans: Sequence[Optional[Tuple[int, int]]]) -> List[Dict[str, str]]:
+    """
+    Dosage, duration, frequency and timing for each medicine mentioned at `spans` (character
+    offsets into `text`), from a single scan of the text. Prescriptions read "drug, dose,
+    frequency, timing", so a mention belongs to the medicine before it (mentions ahead of
+    the first medicine belong to the first one), and each medicine gets the nearest of its
+    own mentions of every kind. Durations are often shared ("continue both for 7 days"), so a
+    medicine without its own duration takes the next one after it that no other medicine
+    has as its own. A span of None (medicine not located in the text) gets the first
+    mention of each kind.
+    """
+    # Medicine names are blanked out (keeping offsets) before scanning, so the strength in a
+    # name ("Dolo 650") is never taken for a dosage, bare or with a unit after it
+    unclaimed = list(text)
+    for span in spans:
+        if span is not None:
+            unclaimed[span[0]:span[1]] = ' ' * (span[1] - span[0])
+    details_text = ''.join(unclaimed)
+    mentions = {kind: [] for kind in DETAIL_KINDS}
+    for detail in scan_details(details_text):
+        if detail.kind in mentions:
+            mentions[detail.kind].append((detail.start, detail.end, _mention_value(detail)))
+    # Bare numbers ("paracetamol 650") are dosages for a medicine without a unit-bearing one;
+    # numbers inside other mentions ("three times a day") are blanked out first as well
+    for kind_mentions in mentions.values():
+        for start, end, _ in kind_mentions:
+            unclaimed[start:end] = ' ' * (end - start)
+    default_unit = '' if DOSAGE_UNIT_RE.search(details_text) else ' mg'
+    bare_numbers = [
+        (match.start(), match.end(), word_to_num(match.group(0)) + default_unit)
+        for match in BARE_NUMBER_RE.finditer(''.join(unclaimed))
+    ]
+
+    starts = sorted({span[0] for span in spans if span is not None})
+    own_details = []
+    for span in spans:
+        if span is None:
+            own_details.append(None)
+            continue
+        # Own stretch: from this medicine (or the text start, for the first) to the next medicine
+        position = bisect.bisect_left(starts, span[0])
+        own_start = span[0] if position > 0 else 0
+        own_end = starts[position + 1] if position + 1 < len(starts) else len(text)
+
+        def nearest_own(candidates):
+            own = [mention for mention in candidates if own_start <= mention[0] and mention[1] <= own_end]
+            if not own:
+                return None
+            return min(own, key=lambda mention: max(mention[0] - span[1], span[0] - mention[1]))
+
+        details = {kind: nearest_own(mentions[kind]) for kind in DETAIL_KINDS}
+        if details["dosage"] is None:
+            details["dosage"] = nearest_own(bare_numbers)
+        own_details.append(details)
+
+    # A medicine without a duration of its own shares the next one nobody else has
+    claimed_durations = {details["duration"] for details in own_details if details and details["duration"]}
+    results = []
+    for span, details in zip(spans, own_details):
+        if details is None:
+            details = {kind: mentions[kind][0][2] if mentions[kind] else 'N/A' for kind in DETAIL_KINDS}
+            if details["dosage"] == 'N/A' and bare_numbers:
+                details["dosage"] = bare_numbers[0][2]
+            results.append(details)
+            continue
+        if details["duration"] is None:
+            details["duration"] = next(
+                (mention for mention in mentions["duration"]
+                 if mention[0] >= span[1] and mention not in claimed_durations),
+                None,
+            )
+        results.append({kind: mention[2] if mention is not None else 'N/A' for kind, mention in details.items()})
+    return results
+
+
+# --- app.py extraction rules ---
+def extract_segment_details(temp_segment_lower: str):
+    """
+    Extracts (dosage, frequency, duration) from a lowercased context segment in which the
+    medication name has already been replaced by a placeholder. Each detail found is
+    removed from the segment before the next one is searched for.
+
+    This stays a short sequence of precompiled searches rather than a scan_details() pass:
+    the removals join the remaining text into new matches ("3 daily week" loses "daily" and
+    yields the duration "3 week"), which one left-to-right scan of the segment cannot see.
+    """
+    dosage = "N/A"
+    frequency = "N/A"
+    duration = "N/A"
+
+    # 1. Extract Dosage (number + unit), e.g. "six hundred fifty milligrams"
+    dosage_match = SEGMENT_DOSAGE_RE.search(temp_segment_lower)
+    if dosage_match:
+        num_part = dosage_match.group(1).strip()
+        unit_part = dosage_match.group(2) if dosage_match.group(2) else ""
+
+        try:
+            dosage = str(w2n.word_to_num(num_part))
+        except ValueError:
+            dosage = num_part # Fallback if w2n fails
+        if unit_part:
+            dosage += f" {unit_part}"
+
+        temp_segment_lower = temp_segment_lower.replace(dosage_match.group(0), '', 1)
+
+    # 2. Extract Frequency
+    for pattern in SEGMENT_FREQUENCY_RES:
+        freq_match = pattern.search(temp_segment_lower)
+        if freq_match:
+            frequency = replace_number_words(freq_match.group(0).strip())
+            temp_segment_lower = temp_segment_lower.replace(freq_match.group(0), '', 1)
+            break
+
+    # 3. Extract Duration
+    for pattern in SEGMENT_DURATION_RES:
+        dur_match = pattern.search(temp_segment_lower)
+        if dur_match:
+            duration = replace_number_words(dur_match.group(0).strip())
+            break
+
+    return dosage, frequency, duration
+
+def parse_ner_dosage(entity_word: str) -> str:
+    """Converts the number words of an NER-tagged Dosage entity to digits, keeping its unit."""
+    try:
+        num_unit_match = NER_DOSAGE_RE.search(entity_word.lower())
+        if num_unit_match and num_unit_match.group(1): # Ensure a number part is found
+            num_words_only = num_unit_match.group(1).strip()
+            unit = num_unit_match.group(2) if num_unit_match.group(2) else ""
+            dosage = str(w2n.word_to_num(num_words_only))
+            if unit:
+                dosage += f" {unit}"
+            return dosage
+        return entity_word # If no clear number words, just take the word as is
+    except ValueError:
+        return entity_word # Fallback if w2n fails
+
+def extract_general_advice(text: str) -> List[str]:
+    """Extracts common health advice phrases from the text, each phrase at most once."""
+    text_lower = text.lower()
+    return [advice for advice, pattern in ADVICE_RES if pattern.search(text_lower)]
@@ -0,0 +1,134 @@
+# feedback_index.py
+"""
+Indexed lookup of learned feedback (doctor corrections) by original input text.
+
+Replaces the linear fuzz.ratio scan over every stored correction. Texts are
+lowercased once when they are added. A lookup first checks an exact-text hash
+table, then scores only the entries whose length can still reach the threshold
+(fuzz.ratio(a, b) <= 200 * min(len) / (len(a) + len(b))), all at once with
+rapidfuzz's vectorized cdist. The result is the same as the linear scan: the
+earliest stored entry scoring above the threshold.
+
+Entry ids must increase with insertion (feedback_store.py uses SQLite row ids), and
+entries can be removed again so a caller can keep the index at a fixed size.
+"""
+import bisect
+import math
+import threading
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+# Above this many candidates, cdist scores on all cores
+PARALLEL_CANDIDATES = 5000
+
+
+class FeedbackIndex:
+    """Feedback entries in id order, searchable by similarity of their original text."""
+
+    def __init__(self):
+        self._entries = {} # entry id -> (lowercase original text, stored feedback), in id order
+        self._exact = {} # lowercase original text -> earliest entry id
+        self._next_id = 0
+        # Entries ordered by text length, then id, so a length band is one contiguous slice
+        self._lengths = []
+        self._sorted_texts = []
+        self._sorted_ids = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, entry_id):
+        return entry_id in self._entries
+
+    def entry_ids(self):
+        """Ids of the stored entries, oldest first."""
+        with self._lock:
+            return list(self._entries)
+
+    def add(self, original_text, payload, entry_id=None):
+        """Stores `payload` under `original_text` and returns its entry id (by default the next one)."""
+        text_lower = original_text.lower()
+        with self._lock:
+            if entry_id is None:
+                entry_id = self._next_id
+            elif entry_id < self._next_id:
+                raise ValueError(f"Entry ids must increase: got {entry_id} after {self._next_id - 1}")
+            self._next_id = entry_id + 1
+            self._entries[entry_id] = (text_lower, payload)
+            self._exact.setdefault(text_lower, entry_id)
+            # After existing entries of the same length, keeping each length run in id order
+            position = bisect.bisect_right(self._lengths, len(text_lower))
+            self._lengths.insert(position, len(text_lower))
+            self._sorted_texts.insert(position, text_lower)
+            self._sorted_ids.insert(position, entry_id)
+        return entry_id
+
+    def remove(self, entry_id):
+        """Drops an entry; the next stored entry with the same text becomes the exact match for it."""
+        with self._lock:
+            entry = self._entries.pop(entry_id, None)
+            if entry is None:
+                return
+            text_lower = entry[0]
+            low = bisect.bisect_left(self._lengths, len(text_lower))
+            high = bisect.bisect_right(self._lengths, len(text_lower))
+            position = bisect.bisect_left(self._sorted_ids, entry_id, low, high)
+            del self._lengths[position], self._sorted_texts[position], self._sorted_ids[position]
+            if self._exact.get(text_lower) == entry_id:
+                del self._exact[text_lower]
+                for index in range(position, high - 1):
+                    if self._sorted_texts[index] == text_lower:
+                        self._exact[text_lower] = self._sorted_ids[index]
+                        break
+
+    @staticmethod
+    def _length_band(query_length, threshold):
+        """Stored text lengths that can score strictly above `threshold` against a query of this length."""
+        if threshold < 0:
+            return 0, math.inf
+        return (
+            math.floor(query_length * threshold / (200 - threshold)),
+            math.ceil(query_length * (200 - threshold) / threshold) if threshold > 0 else math.inf,
+        )
+
+    def _payload(self, entry_id):
+        with self._lock:
+            entry = self._entries.get(entry_id)
+        return entry[1] if entry is not None else None
+
+    def find(self, text_lower, threshold=90):
+        """
+        Returns (payload, score, candidates_scored) for the earliest entry whose original text
+        scores above `threshold` against `text_lower`, or (None, 0.0, candidates_scored).
+        """
+        with self._lock:
+            exact_id = self._exact.get(text_lower)
+            if exact_id is not None and exact_id == next(iter(self._entries)):
+                return self._entries[exact_id][1], 100.0, 0
+            min_length, max_length = self._length_band(len(text_lower), threshold)
+            low = bisect.bisect_left(self._lengths, min_length)
+            high = bisect.bisect_right(self._lengths, max_length)
+            candidate_texts = self._sorted_texts[low:high]
+            candidate_ids = np.array(self._sorted_ids[low:high], dtype=np.int64)
+
+        if exact_id is not None:
+            # Only entries stored before the exact match can still win
+            earlier = candidate_ids < exact_id
+            candidate_ids = candidate_ids[earlier]
+            candidate_texts = [text for text, keep in zip(candidate_texts, earlier) if keep]
+        scanned = len(candidate_texts)
+        match_id, score = exact_id, 100.0
+        if candidate_texts:
+            scores = process.cdist(
+                [text_lower], candidate_texts, scorer=fuzz.ratio, score_cutoff=threshold, dtype=np.float64,
+                workers=-1 if scanned > PARALLEL_CANDIDATES else 1,
+            )[0]
+            matches = np.flatnonzero(scores > threshold)
+            if len(matches):
+                best = matches[np.argmin(candidate_ids[matches])]
+                match_id, score = int(candidate_ids[best]), float(scores[best])
+        # None as well when the entry was removed while it was being scored
+        payload = self._payload(match_id) if match_id is not None else None
+        return payload, (score if payload is not None else 0.0), scanned
@@ -0,0 +1,187 @@
+# feedback_store.py
+"""
+Persistent learned-feedback store shared by every backend worker.
+
+Feedback is appended to an SQLite database in WAL mode, so it survives restarts
+and every worker process sees every correction. Each worker keeps only a capped
+hot index in memory (feedback_index.FeedbackIndex over the lowercase original
+texts and row ids). Full payloads stay on disk and are read back on a hit.
+
+Before each lookup, a worker pulls the rows appended since its last sync. When the
+hot index grows beyond its capacity, the least-used entries are evicted (oldest
+first among equal use counts), along with entries older than the optional maximum
+age. Evicted entries can still be matched by their exact text through the table's
+index. At startup only the newest `capacity` rows are loaded, in chunks, so memory
+stays flat however much feedback accumulates. An optional `on_feedback` callback
+sees the payload of every row as it is loaded or synced, from any worker.
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from feedback_index import FeedbackIndex
+
+LOAD_CHUNK_ROWS = 1000
+# Next to the service modules rather than in whatever directory the process was started from
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "learned_feedback.db")
+
+
+class FeedbackStore:
+    """Append-only feedback table on disk with a bounded, similarity-searchable hot index."""
+
+    def __init__(self, path, hot_capacity=10000, max_age_seconds=None, sync_interval_seconds=0.5, on_feedback=None):
+        self.path = path
+        self.on_feedback = on_feedback
+        self.hot_capacity = hot_capacity
+        self.max_age_seconds = max_age_seconds
+        self.sync_interval_seconds = sync_interval_seconds
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        self._index = FeedbackIndex()
+        self._hot = {} # row id -> [created, uses], in row id order
+        self._last_row_id = 0
+        self._last_sync = 0.0
+        self._evictions = 0
+        self._cold_hits = 0
+
+        connection = self._connect()
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS feedback ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL NOT NULL,"
+            " text_lower TEXT NOT NULL, payload TEXT NOT NULL)"
+        )
+        connection.execute("CREATE INDEX IF NOT EXISTS feedback_text_lower ON feedback (text_lower)")
+        # Start the hot index at the newest `hot_capacity` rows
+        row = connection.execute(
+            "SELECT id FROM feedback ORDER BY id DESC LIMIT 1 OFFSET ?", (max(hot_capacity, 1) - 1,)
+        ).fetchone()
+        self._last_row_id = row[0] - 1 if row else 0
+        self.sync(force=True)
+
+    @classmethod
+    def from_env(cls, on_feedback=None):
+        """Configured by MEDICARE_FEEDBACK_DB, MEDICARE_FEEDBACK_HOT_ENTRIES,
+        MEDICARE_FEEDBACK_HOT_MAX_AGE_DAYS and MEDICARE_FEEDBACK_SYNC_SECONDS."""
+        max_age_days = os.environ.get("MEDICARE_FEEDBACK_HOT_MAX_AGE_DAYS")
+        return cls(
+            os.environ.get("MEDICARE_FEEDBACK_DB", DEFAULT_DB_PATH),
+            hot_capacity=int(os.environ.get("MEDICARE_FEEDBACK_HOT_ENTRIES", "10000")),
+            max_age_seconds=float(max_age_days) * 86400 if max_age_days else None,
+            sync_interval_seconds=float(os.environ.get("MEDICARE_FEEDBACK_SYNC_SECONDS", "0.5")),
+            on_feedback=on_feedback,
+        )
+
+    def _connect(self):
+        # One connection per thread, reopened after fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def __len__(self):
+        """Entries in the hot index."""
+        return len(self._index)
+
+    def add(self, original_text, payload):
+        """Appends one feedback entry for every worker and returns its row id."""
+        cursor = self._connect().execute(
+            "INSERT INTO feedback (created, text_lower, payload) VALUES (?, ?, ?)",
+            (time.time(), original_text.lower(), json.dumps(payload)),
+        )
+        self.sync(force=True)
+        return cursor.lastrowid
+
+    def version(self):
+        """Newest row id this worker has synced; changes whenever any worker adds feedback."""
+        self.sync()
+        return self._last_row_id
+
+    def sync(self, force=False):
+        """Pulls rows appended by any worker since the last sync into the hot index, then evicts."""
+        now = time.monotonic()
+        if not force and now - self._last_sync < self.sync_interval_seconds:
+            return
+        with self._sync_lock:
+            self._last_sync = now
+            # Payloads are only read when a callback wants them
+            payload_column = "payload" if self.on_feedback is not None else "NULL"
+            cursor = self._connect().execute(
+                f"SELECT id, created, text_lower, {payload_column} FROM feedback WHERE id > ? ORDER BY id",
+                (self._last_row_id,),
+            )
+            while True:
+                rows = cursor.fetchmany(LOAD_CHUNK_ROWS)
+                if not rows:
+                    break
+                for row_id, created, text_lower, payload in rows:
+                    if payload is not None:
+                        self.on_feedback(json.loads(payload))
+                    self._index.add(text_lower, row_id, entry_id=row_id)
+                    self._hot[row_id] = [created, 0]
+                    self._last_row_id = row_id
+                self._evict()
+
+    def _evict(self):
+        if self.max_age_seconds is not None:
+            cutoff = time.time() - self.max_age_seconds
+            expired = []
+            for row_id, (created, _) in self._hot.items():
+                if created >= cutoff:
+                    break
+                expired.append(row_id)
+            for row_id in expired:
+                self._drop(row_id)
+        excess = len(self._hot) - self.hot_capacity
+        if excess > 0:
+            # Evict a tenth of the capacity at once, so a full index doesn't re-rank on every append
+            count = min(len(self._hot), excess + self.hot_capacity // 10)
+            for row_id in heapq.nsmallest(count, self._hot, key=lambda row_id: (self._hot[row_id][1], row_id)):
+                self._drop(row_id)
+
+    def _drop(self, row_id):
+        self._index.remove(row_id)
+        del self._hot[row_id]
+        self._evictions += 1
+
+    def _load_payload(self, row_id):
+        row = self._connect().execute("SELECT payload FROM feedback WHERE id = ?", (row_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, text_lower, threshold=90):
+        """
+        Returns (payload, score, candidates_scored) for the earliest hot entry scoring above
+        `threshold` against `text_lower`, falling back to an exact match among evicted rows.
+        """
+        self.sync()
+        row_id, score, scanned = self._index.find(text_lower, threshold)
+        if row_id is None:
+            row = self._connect().execute(
+                "SELECT id FROM feedback WHERE text_lower = ? ORDER BY id LIMIT 1", (text_lower,)
+            ).fetchone()
+            if row is None:
+                return None, 0.0, scanned
+            row_id, score = row[0], 100.0
+            self._cold_hits += 1
+        usage = self._hot.get(row_id)
+        if usage is not None:
+            usage[1] += 1
+        payload = self._load_payload(row_id)
+        return payload, (score if payload is not None else 0.0), scanned
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "stored_entries": self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM feedback").fetchone()[0],
+            "hot_entries": len(self._index),
+            "hot_capacity": self.hot_capacity,
+            "max_age_seconds": self.max_age_seconds,
+            "evictions": self._evictions,
+            "cold_exact_hits": self._cold_hits,
+        }
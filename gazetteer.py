@@ -0,0 +1,210 @@
+# gazetteer.py
+"""
+Catalog gazetteer for backend_app.py's basic (no-NER) medicine extraction.
+
+Built once when the catalog loads. Catalog names and input text are split into
+lowercase alphanumeric tokens ("Dolo-650" -> dolo, 650), and an Aho-Corasick
+automaton over token sequences finds every catalog name in the text in one
+linear scan. Overlapping hits resolve longest match first, so "Vitamin C" wins
+over "Vitamin".
+
+Tokens not covered by an exact hit then go through a fuzzy pass. Each window of
+up to `max_window_tokens` consecutive tokens is compared only against catalog
+names that share enough character trigrams with it and whose length can still
+reach the cutoff, and is scored with rapidfuzz. Per-window results are cached,
+since most windows are everyday words that recur in every transcript.
+"""
+import math
+import re
+from collections import deque
+from functools import lru_cache
+from typing import List, NamedTuple, Tuple
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_DIGITS_RE = re.compile(r"^[0-9]+$")
+
+
+class GazetteerMatch(NamedTuple):
+    name: str # catalog casing
+    start: int # character span in the input text
+    end: int
+    score: float # 100.0 for exact hits
+    kind: str # "exact" or "fuzzy"
+
+
+def _trigrams(key):
+    padded = f" {key} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class Gazetteer:
+    """Token-level Aho-Corasick automaton over the catalog plus a trigram-blocked fuzzy pass."""
+
+    def __init__(self, names, fuzzy_cutoff=85.0, min_shared_trigrams=0.5, max_window_tokens=4, min_window_chars=4,
+                 cache_size=65536):
+        self.names = list(names)
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.min_shared_trigrams = min_shared_trigrams
+        self.min_window_chars = min_window_chars
+
+        # Distinct token sequences ("keys"); the first catalog entry wins the casing, as in MedicineMatcher
+        self._token_ids = {}
+        self.keys = []
+        self._key_names = []
+        key_index = {}
+        for name in self.names:
+            tokens = tuple(self._token_id(token, create=True) for token in _TOKEN_RE.findall(name.lower()))
+            if tokens and tokens not in key_index:
+                key_index[tokens] = len(self.keys)
+                self.keys.append(tokens)
+                self._key_names.append(name)
+        self.max_window_tokens = min(max_window_tokens, max((len(key) for key in self.keys), default=1))
+        self._build_automaton()
+        self._build_trigram_index()
+        self.fuzzy_best = lru_cache(maxsize=cache_size)(self._fuzzy_best)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _token_id(self, token, create=False):
+        token_id = self._token_ids.get(token)
+        if token_id is None and create:
+            token_id = self._token_ids[token] = len(self._token_ids)
+        return token_id
+
+    # --- Exact matching ---
+    def _build_automaton(self):
+        self._goto = [{}] # node -> {token id: child node}
+        self._output = [-1] # node -> key ending exactly here, or -1
+        self._depth = [0]
+        for key_id, key in enumerate(self.keys):
+            node = 0
+            for token_id in key:
+                child = self._goto[node].get(token_id)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto[node][token_id] = child
+                    self._goto.append({})
+                    self._output.append(-1)
+                    self._depth.append(self._depth[node] + 1)
+                node = child
+            self._output[node] = key_id
+
+        # Failure links (longest proper suffix that is also a trie path) and dictionary links
+        # (nearest failure ancestor with an output), breadth first
+        self._fail = [0] * len(self._goto)
+        self._dict_link = [-1] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for token_id, child in self._goto[node].items():
+                fallback = self._fail[node]
+                while fallback and token_id not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(token_id, 0)
+                self._fail[child] = target if target != child else 0
+                self._dict_link[child] = target if self._output[target] >= 0 else self._dict_link[target]
+                queue.append(child)
+
+    def _exact_hits(self, token_ids):
+        """Every (first token, last token + 1, key id) occurrence, in one pass over the tokens."""
+        hits = []
+        node = 0
+        for position, token_id in enumerate(token_ids):
+            if token_id is None: # not in any catalog name
+                node = 0
+                continue
+            while node and token_id not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(token_id, 0)
+            match_node = node if self._output[node] >= 0 else self._dict_link[node]
+            while match_node > 0:
+                hits.append((position + 1 - self._depth[match_node], position + 1, self._output[match_node]))
+                match_node = self._dict_link[match_node]
+        return hits
+
+    # --- Fuzzy matching ---
+    def _build_trigram_index(self):
+        id_tokens = {token_id: token for token, token_id in self._token_ids.items()}
+        self._key_texts = [" ".join(id_tokens[token_id] for token_id in key) for key in self.keys]
+        self._key_lengths = np.array([len(text) for text in self._key_texts], dtype=np.int64)
+        postings = {}
+        for key_id, text in enumerate(self._key_texts):
+            for gram in _trigrams(text):
+                postings.setdefault(gram, []).append(key_id)
+        self._postings = {gram: np.array(ids, dtype=np.int64) for gram, ids in postings.items()}
+        self._key_gram_counts = np.array([len(_trigrams(text)) for text in self._key_texts], dtype=np.int64)
+
+    def _fuzzy_best(self, window):
+        """(key id, score, keys scored) of the best catalog name for `window`, or (None, 0.0, scored)."""
+        grams = _trigrams(window)
+        gram_postings = [self._postings[gram] for gram in grams if gram in self._postings]
+        if not gram_postings:
+            return None, 0.0, 0
+        key_ids, shared = np.unique(np.concatenate(gram_postings), return_counts=True)
+        # Blocking: enough shared trigrams relative to the larger trigram set, and a length that can reach the cutoff
+        needed = np.ceil(self.min_shared_trigrams * np.maximum(self._key_gram_counts[key_ids], len(grams)))
+        lengths = self._key_lengths[key_ids]
+        min_length = math.floor(len(window) * self.fuzzy_cutoff / (200 - self.fuzzy_cutoff))
+        max_length = math.ceil(len(window) * (200 - self.fuzzy_cutoff) / self.fuzzy_cutoff)
+        candidates = key_ids[(shared >= needed) & (lengths >= min_length) & (lengths <= max_length)]
+        if len(candidates) == 0:
+            return None, 0.0, 0
+        result = process.extractOne(
+            window, [self._key_texts[key_id] for key_id in candidates], scorer=fuzz.ratio,
+            score_cutoff=self.fuzzy_cutoff,
+        )
+        if result is None:
+            return None, 0.0, len(candidates)
+        return int(candidates[result[2]]), result[1], len(candidates)
+
+    # --- Lookup ---
+    def find(self, text) -> Tuple[List[GazetteerMatch], int]:
+        """
+        Catalog names in `text` as (matches in order of appearance, fuzzy comparisons).
+        Each catalog name is reported once, at its first match.
+        """
+        spans = [(match.start(), match.end(), match.group(0)) for match in _TOKEN_RE.finditer(text.lower())]
+        token_ids = [self._token_id(token) for _, _, token in spans]
+
+        # Longest match first, then leftmost; hits may not overlap
+        covered = [False] * len(spans)
+        chosen = []
+        for first, last, key_id in sorted(self._exact_hits(token_ids), key=lambda hit: (hit[0] - hit[1], hit[0])):
+            if not any(covered[first:last]):
+                covered[first:last] = [True] * (last - first)
+                chosen.append((first, last, key_id, 100.0, "exact"))
+
+        comparisons = 0
+        if self.fuzzy_cutoff is not None and self.fuzzy_cutoff <= 100:
+            fuzzy_hits = []
+            for first in range(len(spans)):
+                if covered[first]:
+                    continue
+                for last in range(first + 1, min(first + self.max_window_tokens, len(spans)) + 1):
+                    if covered[last - 1]:
+                        break
+                    window = " ".join(token for _, _, token in spans[first:last])
+                    if len(window) < self.min_window_chars or _DIGITS_RE.match(window.replace(" ", "")):
+                        continue
+                    key_id, score, scored = self.fuzzy_best(window)
+                    comparisons += scored
+                    if key_id is not None:
+                        fuzzy_hits.append((first, last, key_id, score))
+            # Best score first, then the longer window, then leftmost
+            for first, last, key_id, score in sorted(fuzzy_hits, key=lambda hit: (-hit[3], hit[0] - hit[1], hit[0])):
+                if not any(covered[first:last]):
+                    covered[first:last] = [True] * (last - first)
+                    chosen.append((first, last, key_id, score, "fuzzy"))
+
+        matches = []
+        seen = set()
+        for first, last, key_id, score, kind in sorted(chosen):
+            if key_id in seen:
+                continue
+            seen.add(key_id)
+            matches.append(GazetteerMatch(self._key_names[key_id], spans[first][0], spans[last - 1][1], score, kind))
+        return matches, comparisons
@@ -0,0 +1,161 @@
+# inference_batcher.py
+"""
+Cross-request micro-batching for the transformer stages of the /ner pipeline.
+
+Each request thread submits a single input and blocks on a Future. A background
+worker collects inputs until either `max_batch_size` items are queued or the
+oldest item has waited `max_wait_ms`, runs them through the batch function as one
+padded forward pass, and scatters the results back to the waiting requests.
+"""
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+from metrics import METRICS, SIZE_BUCKETS
+from tracing import trace_event
+
+BATCH_SIZE = METRICS.histogram(
+    "medicare_inference_batch_size", "Inputs per batched model call.", ("model",), buckets=SIZE_BUCKETS
+)
+BATCH_SECONDS = METRICS.histogram(
+    "medicare_inference_batch_seconds", "Run time of one batched model call.", ("model",)
+)
+BATCH_WAIT_SECONDS = METRICS.histogram(
+    "medicare_inference_batch_wait_seconds", "Time the oldest input of a batch waited for the model call.", ("model",)
+)
+
+
+class MicroBatcher:
+    """Collects single-item calls from concurrent requests into batched calls."""
+
+    def __init__(self, name, batch_fn, max_batch_size=8, max_wait_ms=10.0, history_size=256):
+        """
+        `batch_fn` takes a list of inputs and must return a list of outputs of the
+        same length and order.
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.name = name
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_s = max(0.0, max_wait_ms) / 1000.0
+
+        self._pending = deque() # (item, future, enqueue_time, caller context)
+        self._cond = threading.Condition()
+        self._worker = None
+        self._worker_pid = None
+
+        # Occupancy statistics (guarded by self._cond)
+        self._batches_run = 0
+        self._items_run = 0
+        self._occupancy_sum = 0.0
+        self._recent_batches = deque(maxlen=history_size)
+
+    def submit(self, item):
+        """Queues one input and returns a Future resolving to its output."""
+        future = Future()
+        with self._cond:
+            self._ensure_worker()
+            self._pending.append((item, future, time.perf_counter(), contextvars.copy_context()))
+            self._cond.notify()
+        return future
+
+    def __call__(self, item):
+        """Blocking convenience wrapper around `submit`."""
+        return self.submit(item).result()
+
+    def map(self, items):
+        """Submits all `items` at once (so they can share batches) and returns their outputs in order."""
+        futures = [self.submit(item) for item in items]
+        return [future.result() for future in futures]
+
+    def _ensure_worker(self):
+        # Started lazily (and restarted after fork) so that a pre-forking server
+        # gets one worker thread per process. Must hold self._cond.
+        if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+        self._worker_pid = os.getpid()
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{self.name}", daemon=True)
+        self._worker.start()
+
+    def _collect_batch(self):
+        """Waits for the first item, then fills the batch until it is full or the window closes."""
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            deadline = self._pending[0][2] + self.max_wait_s
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = []
+            while self._pending and len(batch) < self.max_batch_size:
+                batch.append(self._pending.popleft())
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            items = [entry[0] for entry in batch]
+            started = time.perf_counter()
+            try:
+                results = self.batch_fn(items)
+                if len(results) != len(items):
+                    raise RuntimeError(
+                        f"{self.name} batch function returned {len(results)} results for {len(items)} inputs"
+                    )
+            except Exception as e:
+                error, results = e, None
+            finished = time.perf_counter()
+            try:
+                self._record_batch(batch, started, finished, results is not None)
+            finally:
+                if results is None:
+                    for _, future, _, _ in batch:
+                        future.set_exception(error)
+                else:
+                    for (_, future, _, _), result in zip(batch, results):
+                        future.set_result(result)
+
+    def _record_batch(self, batch, started, finished, ok):
+        size = len(batch)
+        waited_s = started - batch[0][2]
+        ran_s = finished - started
+        occupancy = size / self.max_batch_size
+        BATCH_SIZE.observe(size, model=self.name)
+        BATCH_SECONDS.observe(ran_s, model=self.name)
+        BATCH_WAIT_SECONDS.observe(waited_s, model=self.name)
+        # On each submitting request's trace (a no-op for requests that are not sampled)
+        for _, _, enqueued, context in batch:
+            context.run(trace_event, "inference_batch", model=self.name, size=size,
+                        waited_ms=round((started - enqueued) * 1000, 2),
+                        run_ms=round(ran_s * 1000, 2), ok=ok)
+        with self._cond:
+            self._batches_run += 1
+            self._items_run += size
+            self._occupancy_sum += occupancy
+            self._recent_batches.append({
+                "size": size,
+                "occupancy": round(occupancy, 3),
+                "max_wait_ms": round(waited_s * 1000, 2),
+                "run_ms": round(ran_s * 1000, 2),
+                "ok": ok,
+            })
+
+    def stats(self):
+        """Returns aggregate and recent per-batch occupancy for tuning the batching window."""
+        with self._cond:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_s * 1000,
+                "queued": len(self._pending),
+                "batches_run": self._batches_run,
+                "items_run": self._items_run,
+                "mean_batch_size": (self._items_run / self._batches_run) if self._batches_run else 0.0,
+                "mean_occupancy": (self._occupancy_sum / self._batches_run) if self._batches_run else 0.0,
+                "recent_batches": list(self._recent_batches),
+            }
@@ -0,0 +1,40 @@
+# inference_mode.py
+"""
+Opt-in reduced-precision CPU inference for the transformer models.
+
+MEDICARE_INFERENCE_MODE=int8 serves dynamically quantized weights: every nn.Linear
+is converted to int8 with activations quantized on the fly, which typically cuts
+CPU latency and resident memory 2-4x for BERT/T5-sized models. The default (fp32)
+serves the original weights. Run quantization_check.py to measure the quality loss
+against fp32 on a fixed corpus before switching a deployment over.
+"""
+import os
+
+import torch
+
+FP32 = "fp32"
+INT8 = "int8"
+INFERENCE_MODES = (FP32, INT8)
+
+INFERENCE_MODE = os.environ.get("MEDICARE_INFERENCE_MODE", FP32).strip().lower()
+if INFERENCE_MODE not in INFERENCE_MODES:
+    raise ValueError(f"MEDICARE_INFERENCE_MODE must be one of {INFERENCE_MODES}, got '{INFERENCE_MODE}'")
+
+
+def prepare_for_inference(model, device, mode=None):
+    """
+    Puts `model` in eval mode on `device` and, in int8 mode, replaces its Linear layers
+    with dynamically quantized ones. Quantized kernels are CPU-only, so on a GPU the
+    fp32 model is served instead.
+    """
+    mode = mode or INFERENCE_MODE
+    if mode not in INFERENCE_MODES:
+        raise ValueError(f"Unknown inference mode '{mode}'; expected one of {INFERENCE_MODES}")
+    model = model.to(device).eval()
+    if mode == FP32:
+        return model
+    if torch.device(device).type != "cpu":
+        print(f"WARNING: int8 dynamic quantization is CPU-only; serving fp32 weights on {device}.")
+        return model
+    # In place, so the fp32 Linear weights are released instead of briefly doubling memory
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
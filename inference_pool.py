@@ -0,0 +1,110 @@
+# inference_pool.py
+"""
+Bounded worker pool for the blocking model and fuzzy-matching work of backend_app.py.
+
+The FastAPI handlers are coroutines, so running the NER pipeline on the event loop
+stalls every other request (including /feedback_extraction and /metrics). Handlers
+instead await `InferencePool.run(fn, ...)`, which executes `fn` on one of
+`max_workers` threads. Torch and rapidfuzz release the GIL for their inner loops.
+At most `max_queue` further calls may wait for a thread; beyond that,
+`run` raises PoolSaturated at once, so the caller can answer 503 with Retry-After
+instead of letting a burst pile up unbounded latency.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import METRICS
+
+POOL_REJECTIONS = METRICS.counter(
+    "medicare_inference_pool_rejections_total", "Calls rejected because the inference queue was full.", ("pool",)
+)
+POOL_WAIT_SECONDS = METRICS.histogram(
+    "medicare_inference_pool_wait_seconds", "Time a call waited for a free inference thread.", ("pool",)
+)
+
+
+class PoolSaturated(Exception):
+    """Raised when every inference thread is busy and the queue is full."""
+
+    def __init__(self, pool, retry_after_seconds):
+        super().__init__(f"Inference pool '{pool}' is saturated")
+        self.retry_after_seconds = retry_after_seconds
+
+
+class InferencePool:
+    """Runs blocking calls on a fixed set of threads with a bounded admission queue."""
+
+    def __init__(self, name, max_workers=2, max_queue=16, retry_after_seconds=1):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.retry_after_seconds = retry_after_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-inference")
+        self._lock = threading.Lock()
+        self._admitted = 0 # running + queued
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+
+    @classmethod
+    def from_env(cls, name):
+        """Configured by MEDICARE_INFERENCE_WORKERS, MEDICARE_INFERENCE_QUEUE_DEPTH and MEDICARE_RETRY_AFTER_SECONDS."""
+        return cls(
+            name,
+            max_workers=int(os.environ.get("MEDICARE_INFERENCE_WORKERS", "2")),
+            max_queue=int(os.environ.get("MEDICARE_INFERENCE_QUEUE_DEPTH", "16")),
+            retry_after_seconds=int(os.environ.get("MEDICARE_RETRY_AFTER_SECONDS", "1")),
+        )
+
+    def _admit(self):
+        with self._lock:
+            if self._admitted >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                POOL_REJECTIONS.inc(pool=self.name)
+                raise PoolSaturated(self.name, self.retry_after_seconds)
+            self._admitted += 1
+
+    def _call(self, context, submitted, fn, args, kwargs):
+        POOL_WAIT_SECONDS.observe(time.perf_counter() - submitted, pool=self.name)
+        with self._lock:
+            self._running += 1
+        try:
+            # In the caller's context, so trace events land on the request's trace
+            return context.run(fn, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._admitted -= 1
+                self._completed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Runs `fn(*args, **kwargs)` on a pool thread; raises PoolSaturated when the queue is full."""
+        self._admit()
+        try:
+            future = self._executor.submit(
+                self._call, contextvars.copy_context(), time.perf_counter(), fn, args, kwargs
+            )
+        except BaseException:
+            with self._lock:
+                self._admitted -= 1
+            raise
+        return await asyncio.wrap_future(future)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._admitted - self._running,
+                "completed": self._completed,
+                "rejected": self._rejected,
+            }
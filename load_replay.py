@@ -0,0 +1,297 @@
+# load_replay.py
+"""
+End-to-end load replay against locally started instances of app.py and backend_app.py.
+
+Replays a JSONL request log (one {"path": ..., "body": {...}} object per line;
+/ner goes to app.py, /extract_medicines and /suggest_medicine to backend_app.py)
+at a sweep of concurrency levels. For every service and level it reports
+throughput, p50/p95/p99 latency, error rate and the peak RSS of the server
+process, and marks the level at which throughput stops improving (saturation).
+
+With --stand-in-models the servers run on the deterministic stand-ins of
+stand_in_models.py (set MEDICARE_STAND_IN_LATENCY_MS to emulate model cost), so
+the harness needs no model downloads; without it the real models are loaded.
+
+Usage:
+  python load_replay.py synth --out requests.jsonl [--count 500]
+  python load_replay.py run --log requests.jsonl [--levels 1,2,4,8,16,32] [--requests 200]
+                            [--stand-in-models] [--json report.json]
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+SERVICES = {
+    "app": {"paths": ("/ner",), "health": "/model_stats"},
+    "backend": {"paths": ("/extract_medicines", "/suggest_medicine"), "health": "/model_stats"},
+}
+# Throughput gain below which one more concurrency step counts as saturated
+SATURATION_GAIN = 1.05
+
+
+# --- Request logs ---
+def synthetic_log(count, seed=20240601):
+    """`count` requests mixing /ner, /extract_medicines and /suggest_medicine over distinct transcripts."""
+    from microbenchmarks import misspell, synthetic_catalog, synthetic_transcript
+
+    rng = random.Random(seed)
+    catalog = synthetic_catalog(2000, seed)
+    requests = []
+    for index in range(count):
+        transcript = synthetic_transcript(rng.randint(1, 12), rng.sample(catalog, 20), seed + index)
+        kind = index % 3
+        if kind == 0:
+            requests.append({"path": "/ner", "body": {"text": transcript}})
+        elif kind == 1:
+            requests.append({"path": "/extract_medicines", "body": {"text": transcript}})
+        else:
+            medicine = rng.choice(catalog).split(" ")[0].lower()
+            requests.append({"path": "/suggest_medicine",
+                             "body": {"input_text": misspell(medicine, rng), "patient_summary": transcript}})
+    return requests
+
+
+def read_log(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def service_for(path):
+    for service, config in SERVICES.items():
+        if path in config["paths"]:
+            return service
+    raise ValueError(f"No service handles {path}")
+
+
+# --- Local servers ---
+def serve(service, port, stand_in_models):
+    """Runs one app in this process (the child side of start_server)."""
+    os.environ.setdefault("MEDICARE_TRACE_SAMPLE_RATE", "0")
+    # Replayed feedback must not end up in the working directory's feedback store
+    os.environ.setdefault("MEDICARE_FEEDBACK_DB", os.path.join(tempfile.mkdtemp(prefix="medicare-replay-"), "feedback.db"))
+    if stand_in_models:
+        import stand_in_models as stand_ins
+        stand_ins.install()
+    if service == "app":
+        from werkzeug.serving import make_server
+        import app
+        make_server("127.0.0.1", port, app.app, threaded=True).serve_forever()
+    else:
+        import uvicorn
+        import backend_app
+        uvicorn.run(backend_app.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(service, stand_in_models, startup_timeout):
+    """Starts `service` in a subprocess and waits until it answers; returns (process, base_url)."""
+    port = _free_port()
+    command = [sys.executable, os.path.abspath(__file__), "serve", service, "--port", str(port)]
+    if stand_in_models:
+        command.append("--stand-in-models")
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{service} server exited with status {process.returncode} during startup")
+        try:
+            with urllib.request.urlopen(base_url + SERVICES[service]["health"], timeout=2):
+                return process, base_url
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"{service} server did not become ready within {startup_timeout}s")
+
+
+def rss_bytes(pid):
+    """Resident set size of `pid` and its children (Linux /proc), or None if unavailable."""
+    total = 0
+    pids = [pid]
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            pids.extend(int(child) for child in f.read().split())
+    except OSError:
+        pass
+    for process_id in pids:
+        try:
+            with open(f"/proc/{process_id}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1]) * 1024
+        except OSError:
+            if process_id == pid:
+                return None
+    return total
+
+
+class RssSampler:
+    """Polls a server's RSS on a background thread and keeps the peak."""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = rss_bytes(self.pid)
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Replay ---
+def _send(base_url, entry, timeout):
+    data = json.dumps(entry["body"]).encode("utf-8")
+    request = urllib.request.Request(base_url + entry["path"], data=data, method=entry.get("method", "POST"),
+                                     headers={"Content-Type": "application/json"})
+    started = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status < 400
+    except (urllib.error.URLError, ConnectionError, TimeoutError, OSError):
+        ok = False
+    return time.perf_counter() - started, ok
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def replay_level(base_url, entries, concurrency, total_requests, timeout, pid):
+    """Sends `total_requests` requests (cycling through `entries`) with `concurrency` in flight."""
+    schedule = [entries[index % len(entries)] for index in range(total_requests)]
+    with RssSampler(pid) as sampler:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda entry: _send(base_url, entry, timeout), schedule))
+        elapsed = time.perf_counter() - started
+    latencies = sorted(latency for latency, _ in outcomes)
+    errors = sum(1 for _, ok in outcomes if not ok)
+    return {
+        "concurrency": concurrency,
+        "requests": len(outcomes),
+        "throughput_rps": round(len(outcomes) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 1),
+        "error_rate": round(errors / len(outcomes), 4),
+        "peak_rss_mb": round(sampler.peak / (1024 * 1024), 1) if sampler.peak is not None else None,
+    }
+
+
+def saturation_level(levels):
+    """Lowest concurrency after which throughput improves by less than SATURATION_GAIN (or None)."""
+    for current, following in zip(levels, levels[1:]):
+        if following["throughput_rps"] < current["throughput_rps"] * SATURATION_GAIN:
+            return current["concurrency"]
+    return None
+
+
+def run(args):
+    entries = read_log(args.log)
+    by_service = {}
+    for entry in entries:
+        by_service.setdefault(service_for(entry["path"]), []).append(entry)
+    levels = [int(level) for level in args.levels.split(",")]
+
+    report = {"stand_in_models": args.stand_in_models, "services": {}}
+    for service, service_entries in by_service.items():
+        print(f"INFO: Starting {service} ({len(service_entries)} logged requests)...")
+        process, base_url = start_server(service, args.stand_in_models, args.startup_timeout)
+        try:
+            # One untimed pass so lazy loading and warm-up don't count against the first level
+            replay_level(base_url, service_entries, 1, min(len(service_entries), args.warmup_requests),
+                         args.timeout, process.pid)
+            results = []
+            for concurrency in levels:
+                result = replay_level(base_url, service_entries, concurrency, args.requests, args.timeout, process.pid)
+                results.append(result)
+                print(f"{service:<8} c={concurrency:<4} {result['throughput_rps']:>8.1f} req/s  "
+                      f"p50 {result['p50_ms']:>8.1f} ms  p95 {result['p95_ms']:>8.1f} ms  "
+                      f"p99 {result['p99_ms']:>8.1f} ms  errors {result['error_rate']:.2%}  "
+                      f"rss {result['peak_rss_mb']} MB")
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        saturation = saturation_level(results)
+        report["services"][service] = {"levels": results, "saturation_concurrency": saturation}
+        print(f"INFO: {service} saturates at concurrency {saturation if saturation else '> ' + str(levels[-1])}.")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    synth = commands.add_parser("synth", help="write a synthetic request log")
+    synth.add_argument("--out", required=True)
+    synth.add_argument("--count", type=int, default=500)
+
+    replay = commands.add_parser("run", help="replay a request log at a sweep of concurrency levels")
+    replay.add_argument("--log", required=True, help="JSONL request log")
+    replay.add_argument("--levels", default="1,2,4,8,16,32", help="comma-separated concurrency levels")
+    replay.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    replay.add_argument("--warmup-requests", type=int, default=10, help="untimed requests before the sweep")
+    replay.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    replay.add_argument("--startup-timeout", type=float, default=600.0, help="seconds to wait for a server")
+    replay.add_argument("--stand-in-models", action="store_true", help="serve with lightweight stand-in models")
+    replay.add_argument("--json", help="also write the report to this file")
+
+    server = commands.add_parser("serve", help=argparse.SUPPRESS)
+    server.add_argument("service", choices=sorted(SERVICES))
+    server.add_argument("--port", type=int, required=True)
+    server.add_argument("--stand-in-models", action="store_true")
+
+    args = parser.parse_args()
+    if args.command == "synth":
+        with open(args.out, "w", encoding="utf-8") as f:
+            for entry in synthetic_log(args.count):
+                f.write(json.dumps(entry) + "\n")
+        print(f"Wrote {args.count} requests to {args.out}.")
+        return 0
+    if args.command == "serve":
+        serve(args.service, args.port, args.stand_in_models)
+        return 0
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,245 @@
+# medicine_catalog.py
+"""
+Compiled medicine catalog shared by app.py and backend_app.py.
+
+medicines_combined.json is preprocessed once into a compact binary artifact.
+The artifact holds the catalog names, including the core names parsed from each
+`strength` field, plus their lowercase keys and a key order for binary search.
+What is shared is the build: a process starting up maps the finished artifact
+read-only instead of parsing the JSON and running the strength regex again, and
+the mapped table itself sits in the page cache once for all processes. Lookups
+that stay on it (len, name(i), key(i), `in`) need nothing else. The apps,
+however, read `names` into a list once per process and build their matcher,
+gazetteer and typeahead indexes from it in memory; those are per process (or
+shared copy-on-write when serve.py preloads the app before forking).
+
+load_catalog() rebuilds the artifact when the JSON's size or mtime no longer
+matches the artifact header. The new file is written under a temporary name and
+renamed into place, so workers starting together never see a partial artifact.
+
+Layout (little endian): the HEADER struct, then name offsets (uint32, count + 1),
+key offsets (uint32, count + 1), key order (uint32, count), source flags
+(uint8, count, padded to 4 bytes), the UTF-8 name blob and the UTF-8 key blob.
+
+Usage:
+  python medicine_catalog.py build [--json medicines_combined.json] [--out medicines_combined.catalog.bin]
+"""
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import tempfile
+
+import numpy as np
+
+MAGIC = b"MEDCAT01"
+FORMAT_VERSION = 1
+# magic, format version, name count, source size, source mtime (ns), catalog version (hex digest)
+HEADER = struct.Struct("<8sIIqq16s")
+
+# Source flags per name
+FROM_NAME = 1 # an item's 'name' field
+FROM_STRENGTH = 2 # the core name parsed from an item's 'strength' field
+
+# e.g. "Paracetamol (500mg)" -> "Paracetamol", "Cetirizine 10mg" -> "Cetirizine"
+STRENGTH_CORE_RE = re.compile(r'([A-Za-z\s]+?)(?:\s*\(?\d+.*|\s+\d+.*|$)')
+
+
+def catalog_version(names):
+    """Short digest of a medicine catalog, for cache versions that must change when it does."""
+    digest = hashlib.sha256()
+    for name in names:
+        digest.update(name.encode("utf-8") + b"\0")
+    return digest.hexdigest()[:16]
+
+
+def default_artifact_path(json_path):
+    """MEDICARE_CATALOG_ARTIFACT, or the JSON path with a .catalog.bin extension."""
+    return os.environ.get("MEDICARE_CATALOG_ARTIFACT") or os.path.splitext(json_path)[0] + ".catalog.bin"
+
+
+# --- Build ---
+def parse_catalog_json(path):
+    """Sorted unique catalog names and their source flags, as {name: flags}, from medicines_combined.json."""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    flags = {}
+    for item in data:
+        if 'name' in item and isinstance(item['name'], str):
+            name = item['name'].strip()
+            flags[name] = flags.get(name, 0) | FROM_NAME
+        if 'strength' in item and isinstance(item['strength'], str):
+            strength_match = STRENGTH_CORE_RE.match(item['strength'].strip())
+            if strength_match:
+                core_name = strength_match.group(1).strip()
+                if core_name:
+                    flags[core_name] = flags.get(core_name, 0) | FROM_STRENGTH
+    return {name: flags[name] for name in sorted(flags)}
+
+
+def _offsets(blobs):
+    offsets = np.zeros(len(blobs) + 1, dtype="<u4")
+    np.cumsum([len(blob) for blob in blobs], out=offsets[1:])
+    return offsets
+
+
+def encode_catalog(name_flags, source_size=0, source_mtime_ns=0):
+    """The artifact bytes for {name: flags} (in the order given)."""
+    names = list(name_flags)
+    name_blobs = [name.encode("utf-8") for name in names]
+    key_blobs = [name.lower().encode("utf-8") for name in names]
+    key_order = np.array(sorted(range(len(names)), key=key_blobs.__getitem__), dtype="<u4")
+    sources = np.array([name_flags[name] for name in names], dtype=np.uint8).tobytes()
+    sources += b"\0" * (-len(sources) % 4)
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(names), source_size, source_mtime_ns,
+                         catalog_version(names).encode("ascii"))
+    return b"".join([
+        header, _offsets(name_blobs).tobytes(), _offsets(key_blobs).tobytes(), key_order.tobytes(), sources,
+        *name_blobs, *key_blobs,
+    ])
+
+
+def build_catalog(json_path, artifact_path):
+    """Compiles `json_path` into `artifact_path`, replacing it atomically. Returns the name count."""
+    source = os.stat(json_path)
+    name_flags = parse_catalog_json(json_path)
+    content = encode_catalog(name_flags, source.st_size, source.st_mtime_ns)
+    directory = os.path.dirname(os.path.abspath(artifact_path))
+    fd, temp_path = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(temp_path, artifact_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return len(name_flags)
+
+
+# --- Read ---
+class MedicineCatalog:
+    """Read-only view of a compiled catalog, over an mmap of the artifact or an in-memory buffer."""
+
+    def __init__(self, buffer, path=None):
+        magic, format_version, count, self.source_size, self.source_mtime_ns, version = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"{path or 'buffer'} is not a version {FORMAT_VERSION} medicine catalog")
+        self.path = path
+        self.version = version.decode("ascii")
+        self._buffer = buffer
+        self._count = count
+        position = HEADER.size
+        self._name_offsets = np.frombuffer(buffer, dtype="<u4", count=count + 1, offset=position)
+        position += 4 * (count + 1)
+        self._key_offsets = np.frombuffer(buffer, dtype="<u4", count=count + 1, offset=position)
+        position += 4 * (count + 1)
+        self._key_order = np.frombuffer(buffer, dtype="<u4", count=count, offset=position)
+        position += 4 * count
+        self._sources = np.frombuffer(buffer, dtype=np.uint8, count=count, offset=position)
+        position += count + (-count % 4)
+        self._names_start = position
+        self._keys_start = position + int(self._name_offsets[-1])
+        self._names = None
+
+    @classmethod
+    def open(cls, path):
+        """Maps the artifact at `path` read-only (the mapped pages are shared through the page cache)."""
+        with open(path, "rb") as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), path)
+
+    @classmethod
+    def from_names(cls, names):
+        """An in-memory catalog of `names` (kept in the order given), e.g. for a fallback list."""
+        return cls(encode_catalog({name: FROM_NAME for name in dict.fromkeys(names)}))
+
+    def __len__(self):
+        return self._count
+
+    def name(self, index):
+        start = self._names_start + int(self._name_offsets[index])
+        return bytes(self._buffer[start:self._names_start + int(self._name_offsets[index + 1])]).decode("utf-8")
+
+    def _key_bytes(self, index):
+        start = self._keys_start + int(self._key_offsets[index])
+        return bytes(self._buffer[start:self._keys_start + int(self._key_offsets[index + 1])])
+
+    def key(self, index):
+        """Lowercase name at `index`."""
+        return self._key_bytes(index).decode("utf-8")
+
+    def from_strength(self, index):
+        """True if the name at `index` is a core name parsed from a 'strength' field."""
+        return bool(self._sources[index] & FROM_STRENGTH)
+
+    @property
+    def names(self):
+        """All names as a list (decoded once per process, for the in-memory indexes built on top)."""
+        if self._names is None:
+            blob = bytes(self._buffer[self._names_start:self._keys_start])
+            offsets = self._name_offsets.tolist()
+            self._names = [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(self._count)]
+        return self._names
+
+    def __contains__(self, name):
+        """Case-insensitive membership, by binary search over the lowercase keys in the artifact."""
+        target = name.lower().encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_bytes(int(self._key_order[middle])) < target:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self._count and self._key_bytes(int(self._key_order[low])) == target
+
+
+def load_catalog(json_path, artifact_path=None):
+    """
+    The compiled catalog for `json_path`, rebuilding the artifact first if it is missing or older than
+    the JSON. An artifact deployed without its JSON is used as is. Raises FileNotFoundError if neither
+    exists; JSON errors propagate.
+    """
+    artifact_path = artifact_path or default_artifact_path(json_path)
+    if not os.path.exists(json_path):
+        if os.path.exists(artifact_path):
+            return MedicineCatalog.open(artifact_path)
+        raise FileNotFoundError(json_path)
+
+    source = os.stat(json_path)
+    if os.path.exists(artifact_path):
+        try:
+            catalog = MedicineCatalog.open(artifact_path)
+            if (catalog.source_size, catalog.source_mtime_ns) == (source.st_size, source.st_mtime_ns):
+                return catalog
+        except (ValueError, struct.error) as e:
+            print(f"WARNING: Ignoring unreadable medicine catalog {artifact_path}: {e}")
+    try:
+        count = build_catalog(json_path, artifact_path)
+    except OSError as e:
+        # e.g. a read-only deployment directory: compile in memory for this process only
+        print(f"WARNING: Could not write medicine catalog {artifact_path} ({e}); compiling in memory.")
+        name_flags = parse_catalog_json(json_path)
+        return MedicineCatalog(encode_catalog(name_flags, source.st_size, source.st_mtime_ns))
+    print(f"INFO: Compiled {count} medicine names from {json_path} into {artifact_path}.")
+    return MedicineCatalog.open(artifact_path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="compile the catalog JSON into the mmap artifact")
+    build.add_argument("--json", default="medicines_combined.json")
+    build.add_argument("--out", default=None, help="artifact path (default: MEDICARE_CATALOG_ARTIFACT or <json>.catalog.bin)")
+    args = parser.parse_args(argv)
+
+    out = args.out or default_artifact_path(args.json)
+    count = build_catalog(args.json, out)
+    print(f"SUCCESS: Compiled {count} medicine names from {args.json} into {out}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+# medicine_matcher.py
+"""
+Indexed fuzzy matching of recognised entity text against the medicine catalog.
+
+Built once when the catalog is loaded. Exact (case-insensitive) hits are a dict
+lookup; everything else is scored with rapidfuzz's C implementation over only the
+catalog names whose length can still reach the requested score. best_matches()
+scores many queries at once with rapidfuzz's multi-threaded cdist.
+"""
+import math
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from metrics import FUZZY_COMPARISONS
+
+
+# Queries scored per cdist call in best_matches(), bounding the score matrix
+MATCH_QUERY_CHUNK = 64
+
+
+class MedicineMatcher:
+    """Shared best-match lookup over LOADED_MEDICINE_NAMES."""
+
+    def __init__(self, names):
+        self.names = list(names)
+        self.names_lower = [name.lower() for name in self.names]
+
+        # lower -> canonical casing; the first catalog entry wins, as with the old next(...) scan
+        self.lower_to_canonical = {}
+        for name, name_lower in zip(self.names, self.names_lower):
+            self.lower_to_canonical.setdefault(name_lower, name)
+
+        # Length buckets: catalog indices (in catalog order) and their lowercase names
+        self._bucket_indices = {}
+        for index, name_lower in enumerate(self.names_lower):
+            self._bucket_indices.setdefault(len(name_lower), []).append(index)
+        self._bucket_choices = {
+            length: [self.names_lower[index] for index in indices]
+            for length, indices in self._bucket_indices.items()
+        }
+        # All names ordered by length (stable, so catalog order within a length), for band slices
+        self._length_order = np.argsort([len(name_lower) for name_lower in self.names_lower], kind="stable")
+        self._sorted_lengths = np.array([len(self.names_lower[index]) for index in self._length_order], dtype=np.int64)
+        self._sorted_choices = [self.names_lower[index] for index in self._length_order]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name.lower() in self.lower_to_canonical
+
+    def canonical(self, name):
+        """Returns the catalog casing of `name`, or None if it is not in the catalog."""
+        return self.lower_to_canonical.get(name.lower())
+
+    @staticmethod
+    def _length_band(query_length, score_cutoff):
+        """
+        Range of name lengths that can still reach `score_cutoff`;
+        fuzz.ratio(a, b) is at most 200 * min(len) / (len(a) + len(b)).
+        """
+        if score_cutoff <= 0:
+            return 0, float("inf")
+        return (
+            math.floor(query_length * score_cutoff / (200 - score_cutoff)),
+            math.ceil(query_length * (200 - score_cutoff) / score_cutoff),
+        )
+
+    def best_match(self, query, score_cutoff=0.0):
+        """
+        Returns (catalog_name, similarity) for the closest catalog name to `query`,
+        or ("N/A", 0.0) if nothing scores above zero (or reaches `score_cutoff`).
+        Ties resolve to the earliest catalog entry, like the linear scan this replaces.
+        Passing the caller's acceptance threshold as `score_cutoff` lets the length
+        index skip names that cannot reach it without changing any accepted match.
+        """
+        query_lower = query.lower()
+        canonical = self.lower_to_canonical.get(query_lower)
+        if canonical is not None:
+            return canonical, 100.0
+
+        query_length = len(query_lower)
+        best_score = score_cutoff
+        best_index = None
+        comparisons = 0
+        # Buckets closest in length are scored first, so the cutoff rises early
+        # and the band of lengths that can still win keeps shrinking.
+        for length in sorted(self._bucket_choices, key=lambda length: abs(length - query_length)):
+            min_length, max_length = self._length_band(query_length, best_score)
+            if not min_length <= length <= max_length:
+                continue
+            comparisons += len(self._bucket_choices[length])
+            result = process.extractOne(
+                query_lower, self._bucket_choices[length], scorer=fuzz.ratio,
+                score_cutoff=max(0.0, best_score - 1e-6), # slack so float ties still surface
+            )
+            if result is None or result[1] < score_cutoff:
+                continue
+            index = self._bucket_indices[length][result[2]]
+            if best_index is None or result[1] > best_score or (result[1] == best_score and index < best_index):
+                best_score = result[1]
+                best_index = index
+        FUZZY_COMPARISONS.inc(comparisons, source="catalog_match")
+
+        if best_index is None or best_score <= 0:
+            return "N/A", 0.0
+        return self.names[best_index], best_score
+
+    def best_matches(self, queries, score_cutoff=0.0):
+        """
+        best_match() for every query, returned in the same order. Distinct queries are
+        grouped by length and each group is scored against the band of names that can
+        reach `score_cutoff` in one cdist call; results are identical to best_match().
+        """
+        results = {}
+        pending = []
+        for query in dict.fromkeys(queries):
+            canonical = self.lower_to_canonical.get(query.lower())
+            if canonical is not None:
+                results[query] = (canonical, 100.0)
+            else:
+                pending.append(query)
+        pending.sort(key=len)
+
+        comparisons = 0
+        for start in range(0, len(pending), MATCH_QUERY_CHUNK):
+            chunk = pending[start:start + MATCH_QUERY_CHUNK]
+            min_length = self._length_band(len(chunk[0]), score_cutoff)[0]
+            max_length = self._length_band(len(chunk[-1]), score_cutoff)[1]
+            low = int(np.searchsorted(self._sorted_lengths, min_length, side="left"))
+            high = int(np.searchsorted(self._sorted_lengths, max_length, side="right"))
+            if low >= high:
+                results.update((query, ("N/A", 0.0)) for query in chunk)
+                continue
+            comparisons += len(chunk) * (high - low)
+            scores = process.cdist(
+                [query.lower() for query in chunk], self._sorted_choices[low:high], scorer=fuzz.ratio,
+                score_cutoff=score_cutoff, dtype=np.float64, workers=-1,
+            )
+            catalog_indices = self._length_order[low:high]
+            best_scores = scores.max(axis=1)
+            # Ties resolve to the earliest catalog entry
+            best_indices = np.where(scores == best_scores[:, None], catalog_indices, len(self.names)).min(axis=1)
+            for query, best_score, best_index in zip(chunk, best_scores, best_indices):
+                if best_score <= 0 or best_score < score_cutoff:
+                    results[query] = ("N/A", 0.0)
+                else:
+                    results[query] = (self.names[best_index], float(best_score))
+        FUZZY_COMPARISONS.inc(comparisons, source="catalog_match")
+        return [results[query] for query in queries]
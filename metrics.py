@@ -0,0 +1,200 @@
+# metrics.py
+"""
+Low-overhead Prometheus metrics shared by app.py and backend_app.py.
+
+Counters and histograms live in one process-wide registry (METRICS) and are
+rendered in the Prometheus text exposition format by the /metrics endpoint of
+both apps. Recording a sample is a dict lookup and a few additions under a lock,
+so the metrics can sit on the hot path of every request and pipeline stage.
+Each worker process keeps its own registry; scrape every worker (or aggregate by
+instance label) when running several.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from tracing import trace_span
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond regex stages up to slow CPU T5 generations
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 1024, 4096, 16384, 65536)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count, one series per label combination."""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def _samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed values (latencies, batch sizes, scan lengths)."""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {} # label values -> [per-bucket counts..., +Inf count, sum]
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observes the wall-clock duration of the `with` block, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def _samples(self):
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = []
+        for key, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Named metrics of one process, rendered together for /metrics."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                # Module reloads (e.g. uvicorn --reload) re-declare metrics; reuse the series
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f"Metric {metric.name} is already registered with a different type or labels")
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Prometheus text exposition of every registered metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
+
+# --- Metrics recorded by both apps ---
+HTTP_REQUESTS = METRICS.counter(
+    "medicare_http_requests_total", "HTTP requests handled, by endpoint and status code.", ("endpoint", "status")
+)
+HTTP_REQUEST_SECONDS = METRICS.histogram(
+    "medicare_http_request_seconds", "HTTP request latency, by endpoint.", ("endpoint",)
+)
+STAGE_SECONDS = METRICS.histogram(
+    "medicare_stage_seconds", "Latency of each pipeline stage.", ("stage",)
+)
+FUZZY_COMPARISONS = METRICS.counter(
+    "medicare_fuzzy_comparisons_total", "Fuzzy string comparisons performed, by caller.", ("source",)
+)
+
+
+def record_stage(stage, started):
+    """Records a stage that began at perf_counter() `started` in medicare_stage_seconds and the current trace."""
+    duration_s = time.perf_counter() - started
+    STAGE_SECONDS.observe(duration_s, stage=stage)
+    trace_span(stage, started, duration_s)
+
+
+@contextmanager
+def time_stage(stage):
+    """Times the `with` block as one pipeline stage (see record_stage)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, started)
+
+
+def record_request(endpoint, status, seconds):
+    HTTP_REQUESTS.inc(endpoint=endpoint, status=status)
+    HTTP_REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
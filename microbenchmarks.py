@@ -0,0 +1,236 @@
+# microbenchmarks.py
+"""
+Function-level microbenchmarks for the extraction hot paths of app.py and backend_app.py.
+
+Times merge_tokens, merge_ner_tokens, extract_med_details_from_segment,
+extract_general_advice, normalize_number_words, spell_correct_text,
+_extract_medicines_basic and the catalog fuzzy match over synthetic, seeded
+transcripts (1 to 50 sentences) and catalogs (100 to 100k medicine names). The
+NER, grammar and summary models are replaced by the deterministic stand-ins of
+stand_in_models.py before the apps are imported, so the suite runs offline and measures only our own code.
+
+Results are written as JSON; with --baseline they are compared against a stored
+run and the exit status is non-zero when any case got slower than --max-regression.
+Usage:
+  python microbenchmarks.py [--quick] [--json results.json] [--save-baseline baseline.json]
+  python microbenchmarks.py --baseline baseline.json [--max-regression 1.25]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import stand_in_models
+from stand_in_models import SYMPTOMS, FakeNerPipeline
+
+CATALOG_SIZES = (100, 1000, 10000, 100000)
+SENTENCE_COUNTS = (1, 5, 20, 50)
+QUICK_CATALOG_SIZES = (100, 1000)
+QUICK_SENTENCE_COUNTS = (1, 5)
+SEED = 20240601
+
+# --- Synthetic inputs ---
+_SYLLABLES = ("para", "ceta", "mol", "amo", "xi", "cil", "lin", "ibu", "pro", "fen", "met", "for", "min",
+              "azi", "thro", "my", "cin", "cet", "iri", "zine", "pan", "to", "pra", "zole", "lev", "o", "thy",
+              "rox", "ine", "sal", "bu", "ta", "dol", "cipro", "flox", "ac", "in", "dex", "tro", "vita")
+_UNITS = ("mg", "ml", "mcg", "tablet", "capsule")
+_FREQUENCIES = ("once a day", "twice a day", "three times a day", "daily", "every 8 hours", "as needed")
+_NUMBER_WORDS = ("one", "two", "three", "five", "six fifty", "ten")
+_ADVICE = ("Drink plenty of water.", "Avoid oily food.", "Get enough rest.", "Eat fresh fruits.",
+           "Reduce salt in your diet.", "Do light exercise every morning.")
+
+
+def synthetic_catalog(size, seed=SEED):
+    """`size` distinct, pronounceable medicine names, some with a strength suffix."""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < size:
+        name = "".join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        if rng.random() < 0.3:
+            name += f" {rng.choice((5, 10, 20, 250, 500, 650))}"
+        names.add(name)
+    return sorted(names)
+
+
+def synthetic_transcript(sentences, catalog, seed=SEED):
+    """A consultation transcript of `sentences` sentences mentioning medicines from `catalog`."""
+    rng = random.Random(seed + sentences)
+    parts = []
+    for index in range(sentences):
+        kind = index % 3
+        if kind == 0:
+            medicine = rng.choice(catalog).split(" ")[0].lower()
+            amount = rng.choice((str(rng.choice((5, 10, 250, 500, 650))), rng.choice(_NUMBER_WORDS)))
+            parts.append(f"Take {medicine} {amount} {rng.choice(_UNITS)} {rng.choice(_FREQUENCIES)} "
+                         f"for {rng.choice(_NUMBER_WORDS)} days.")
+        elif kind == 1:
+            parts.append(f"Patient complains of {rng.choice(SYMPTOMS)} and {rng.choice(SYMPTOMS)} "
+                         f"since {rng.choice(_NUMBER_WORDS)} days.")
+        else:
+            parts.append(rng.choice(_ADVICE))
+    return " ".join(parts)
+
+
+def misspell(word, rng):
+    """One random character edit, as a speech-to-text or typing slip would produce."""
+    position = rng.randrange(len(word))
+    edit = rng.choice(("drop", "swap", "replace"))
+    if edit == "drop" and len(word) > 3:
+        return word[:position] + word[position + 1:]
+    if edit == "swap" and position < len(word) - 1:
+        return word[:position] + word[position + 1] + word[position] + word[position + 2:]
+    return word[:position] + rng.choice("aeiou") + word[position + 1:]
+
+
+def import_apps():
+    """Imports app.py and backend_app.py with the transformer models replaced by stand-ins."""
+    stand_in_models.install()
+    os.environ["MEDICARE_WARMUP_MODELS"] = "" # no background warm-up thread
+    # Keep the benchmark's feedback store out of the working directory
+    os.environ.setdefault("MEDICARE_FEEDBACK_DB", os.path.join(tempfile.mkdtemp(prefix="medicare-bench-"), "feedback.db"))
+    import app
+    import backend_app
+    return app, backend_app
+
+
+# --- Timing ---
+def time_call(fn, min_time=0.2, repeat=5):
+    """Per-call seconds of `fn()` over `repeat` runs, each looping until `min_time` has passed."""
+    fn() # warm-up: fills lazily built indexes and caches
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / repeat or loops >= 1 << 20:
+            break
+        loops *= 2
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops)
+    return samples
+
+
+def _result(name, params, samples):
+    return {
+        "name": name,
+        "params": params,
+        "median_us": round(statistics.median(samples) * 1e6, 3),
+        "min_us": round(min(samples) * 1e6, 3),
+        "runs": len(samples),
+    }
+
+
+def run_suite(app, backend_app, catalog_sizes, sentence_counts, min_time):
+    results = []
+
+    def bench(name, params, fn):
+        result = _result(name, params, time_call(fn, min_time))
+        results.append(result)
+        print(f"{name:<36} {json.dumps(params):<22} {result['median_us']:>14.1f} us")
+
+    base_catalog = synthetic_catalog(max(catalog_sizes))[:1000]
+    ner = FakeNerPipeline(name.split(" ")[0] for name in base_catalog)
+    rng = random.Random(SEED)
+
+    for sentences in sentence_counts:
+        params = {"sentences": sentences}
+        transcript = synthetic_transcript(sentences, base_catalog)
+        raw_entities = ner(transcript)
+        bench("merge_tokens", params, lambda: app.merge_tokens(list(raw_entities)))
+        bench("merge_ner_tokens", params, lambda: backend_app.merge_ner_tokens(raw_entities))
+        bench("normalize_number_words", params, lambda: app.normalize_number_words(transcript))
+        bench("extract_general_advice", params, lambda: app.extract_general_advice(transcript))
+
+        medications = [entity for entity in app.merge_tokens(list(raw_entities)) if entity["entity"] == "Medication"]
+        bench("extract_med_details_from_segment", params, lambda: [
+            app.extract_med_details_from_segment(transcript, entity["start"], entity["end"], entity["word"].lower())
+            for entity in medications
+        ])
+
+        misspelled = " ".join(
+            misspell(word, rng) if len(word) > 4 and rng.random() < 0.2 else word for word in transcript.split()
+        )
+        bench("spell_correct_text", params, lambda: app.spell_correct_text(misspelled))
+
+    for size in catalog_sizes:
+        params = {"catalog_names": size}
+        catalog = synthetic_catalog(size)
+        sample = random.Random(SEED + size).sample(catalog, min(20, size))
+        queries = [misspell(name.split(" ")[0].lower(), rng) for name in sample]
+        transcript = synthetic_transcript(5, sample)
+
+        backend_app.LOADED_MEDICINE_NAMES = catalog
+        backend_app.MEDICINE_MATCHER = matcher = backend_app.MedicineMatcher(catalog)
+        backend_app.GAZETTEER = backend_app.Gazetteer(catalog)
+        bench("_extract_medicines_basic", params, lambda: backend_app._extract_medicines_basic(transcript))
+        bench("catalog_best_match", params, lambda: [matcher.best_match(query, score_cutoff=65) for query in queries])
+
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Prints current vs baseline per case; returns the cases slower than `max_regression`."""
+    baseline_by_case = {(item["name"], json.dumps(item["params"], sort_keys=True)): item for item in baseline["results"]}
+    regressions = []
+    for result in results:
+        reference = baseline_by_case.get((result["name"], json.dumps(result["params"], sort_keys=True)))
+        if reference is None:
+            continue
+        ratio = result["median_us"] / max(reference["median_us"], 1e-9)
+        flag = ""
+        if ratio > max_regression:
+            regressions.append({**result, "baseline_median_us": reference["median_us"], "ratio": round(ratio, 3)})
+            flag = "  REGRESSION"
+        print(f"{result['name']:<36} {json.dumps(result['params']):<22} "
+              f"{reference['median_us']:>12.1f} -> {result['median_us']:>12.1f} us (x{ratio:.2f}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="small sizes only, for a fast local check")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds of timing per case")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--save-baseline", help="write results as the new baseline to this file")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument("--max-regression", type=float, default=1.25,
+                        help="fail when a case's median is more than this factor slower than the baseline")
+    args = parser.parse_args()
+
+    app, backend_app = import_apps()
+    catalog_sizes = QUICK_CATALOG_SIZES if args.quick else CATALOG_SIZES
+    sentence_counts = QUICK_SENTENCE_COUNTS if args.quick else SENTENCE_COUNTS
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "created_at": time.time(),
+        "results": run_suite(app, backend_app, catalog_sizes, sentence_counts, args.min_time),
+    }
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report["results"], baseline, args.max_regression)
+        if regressions:
+            print(f"FAIL: {len(regressions)} case(s) slower than x{args.max_regression} of the baseline.")
+            return 1
+        print("PASS: no case regressed beyond the threshold.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
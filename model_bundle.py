@@ -0,0 +1,191 @@
+# model_bundle.py
+"""
+Versioned local snapshot of every model and tokenizer the services load.
+
+`python model_bundle.py snapshot --out /srv/medicare-models` downloads (or copies
+from the local fine-tuned directory) every model of app.py and backend_app.py and
+saves it with safetensors weights under <out>/<version>/, with a manifest.json, then
+points <out>/CURRENT at the new version. A snapshot is written to a temporary
+directory and renamed into place, so a running fleet never sees a partial bundle.
+
+With MEDICARE_MODEL_BUNDLE set (to the bundle root or to one version directory), the
+apps load strictly from the bundle: local paths, local_files_only, so no Hub
+resolution or network probing happens. safetensors weights are memory-mapped and
+loaded with low_cpu_mem_usage, skipping the random initialisation pass. A model
+missing from the bundle is an error instead of a silent download.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+# Hub sources of the models the services load, by bundle key
+HUB_MODELS = {
+    "ner": "d4data/biomedical-ner-all",
+    "grammar": "vennify/t5-base-grammar-correction",
+    "summary": "t5-base",
+}
+# backend_app.py prefers a locally fine-tuned NER model and falls back to the generic one
+FINE_TUNED_NER_PATH = "./fine_tuned_biobert_model"
+MODEL_KINDS = {
+    "ner": "token-classification",
+    "backend_ner": "token-classification",
+    "grammar": "seq2seq",
+    "summary": "seq2seq",
+}
+
+MANIFEST_FILE = "manifest.json"
+CURRENT_FILE = "CURRENT"
+
+
+def resolve_bundle_dir(path):
+    """The version directory for a bundle root (via CURRENT) or a version directory itself."""
+    if os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        return path
+    current_path = os.path.join(path, CURRENT_FILE)
+    if not os.path.exists(current_path):
+        raise FileNotFoundError(f"{path} is neither a model bundle version nor a bundle root with {CURRENT_FILE}")
+    with open(current_path, encoding="utf-8") as f:
+        return os.path.join(path, f.read().strip())
+
+
+def load_manifest(bundle_dir):
+    with open(os.path.join(bundle_dir, MANIFEST_FILE), encoding="utf-8") as f:
+        return json.load(f)
+
+
+BUNDLE_DIR = resolve_bundle_dir(os.environ["MEDICARE_MODEL_BUNDLE"]) if os.environ.get("MEDICARE_MODEL_BUNDLE") else None
+BUNDLE_MANIFEST = load_manifest(BUNDLE_DIR) if BUNDLE_DIR else None
+BUNDLE_VERSION = BUNDLE_MANIFEST["version"] if BUNDLE_MANIFEST else None
+
+# from_pretrained() arguments when loading from the bundle
+BUNDLE_LOAD_KWARGS = {"local_files_only": True, "low_cpu_mem_usage": True, "use_safetensors": True}
+BUNDLE_TOKENIZER_KWARGS = {"local_files_only": True}
+
+
+def bundled_model_path(key):
+    """Local directory of `key` in the configured bundle, or None when no bundle is configured."""
+    if BUNDLE_MANIFEST is None:
+        return None
+    entry = BUNDLE_MANIFEST["models"].get(key)
+    if entry is None:
+        raise FileNotFoundError(f"Model '{key}' is not in the model bundle at {BUNDLE_DIR}")
+    return os.path.join(BUNDLE_DIR, entry["path"])
+
+
+def model_version(key):
+    """
+    Identifies the weights `key` is loaded from, for cache keys: its Hub name without a bundle,
+    "<source>#<digest of its files' manifest digests>" with one, so a new snapshot of the same
+    source gets a new version while models whose files did not change keep theirs.
+    """
+    if BUNDLE_MANIFEST is None:
+        return HUB_MODELS[key]
+    entry = BUNDLE_MANIFEST["models"].get(key)
+    if entry is None:
+        # Loading it fails anyway (bundled_model_path); the bundle version keeps the key honest
+        return f"{HUB_MODELS[key]}#{BUNDLE_VERSION}"
+    files = BUNDLE_MANIFEST.get("files", {}).get(entry["path"])
+    if not files:
+        return f"{entry['source']}#{BUNDLE_VERSION}"
+    digest = hashlib.sha256(json.dumps(files, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    return f"{entry['source']}#{digest}"
+
+
+# --- Snapshot ---
+def _file_digests(directory):
+    digests = {}
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            sha256 = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    sha256.update(block)
+            digests[os.path.relpath(path, directory)] = sha256.hexdigest()
+    return digests
+
+
+def _save_model(source, kind, target):
+    from transformers import AutoModelForSeq2SeqLM, AutoModelForTokenClassification, AutoTokenizer
+
+    model_class = AutoModelForTokenClassification if kind == "token-classification" else AutoModelForSeq2SeqLM
+    print(f"Saving '{source}' to {target}...")
+    AutoTokenizer.from_pretrained(source).save_pretrained(target)
+    model_class.from_pretrained(source).save_pretrained(target, safe_serialization=True)
+
+
+def snapshot(out_dir, version=None):
+    """Writes a new bundle version under `out_dir`, points CURRENT at it and returns its directory."""
+    version = version or time.strftime("%Y%m%d-%H%M%S")
+    final_dir = os.path.join(out_dir, version)
+    if os.path.exists(final_dir):
+        raise FileExistsError(f"Bundle version {final_dir} already exists")
+    partial_dir = final_dir + ".partial"
+    shutil.rmtree(partial_dir, ignore_errors=True)
+    os.makedirs(partial_dir)
+
+    sources = dict(HUB_MODELS)
+    sources["backend_ner"] = FINE_TUNED_NER_PATH if os.path.exists(FINE_TUNED_NER_PATH) else HUB_MODELS["ner"]
+    saved_by_source = {}
+    manifest = {"version": version, "created_at": time.time(), "models": {}}
+    for key, source in sources.items():
+        path = saved_by_source.get(source)
+        if path is None:
+            # Models shared by both apps (the generic NER) are stored once
+            path = saved_by_source[source] = key
+            _save_model(source, MODEL_KINDS[key], os.path.join(partial_dir, path))
+        manifest["models"][key] = {"source": source, "kind": MODEL_KINDS[key], "path": path}
+    for path in set(saved_by_source.values()):
+        manifest.setdefault("files", {})[path] = _file_digests(os.path.join(partial_dir, path))
+
+    with open(os.path.join(partial_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(partial_dir, final_dir)
+    current_tmp = os.path.join(out_dir, CURRENT_FILE + ".tmp")
+    with open(current_tmp, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.replace(current_tmp, os.path.join(out_dir, CURRENT_FILE))
+    print(f"SUCCESS: Model bundle {version} written to {final_dir}.")
+    return final_dir
+
+
+def verify(bundle_dir):
+    """Checks every file of a bundle version against its manifest digests; returns the mismatches."""
+    manifest = load_manifest(bundle_dir)
+    problems = []
+    for path, expected in manifest.get("files", {}).items():
+        actual = _file_digests(os.path.join(bundle_dir, path))
+        for name, digest in expected.items():
+            if actual.get(name) != digest:
+                problems.append(os.path.join(path, name))
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    create = commands.add_parser("snapshot", help="bundle every model into a new version directory")
+    create.add_argument("--out", required=True, help="bundle root directory")
+    create.add_argument("--version", help="version name (default: a local timestamp)")
+    check = commands.add_parser("verify", help="check a bundle's files against its manifest")
+    check.add_argument("bundle", help="bundle root or version directory")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        snapshot(args.out, args.version)
+        return 0
+    bundle_dir = resolve_bundle_dir(args.bundle)
+    problems = verify(bundle_dir)
+    if problems:
+        print(f"FAIL: {len(problems)} file(s) differ from the manifest: {', '.join(problems)}")
+        return 1
+    print(f"PASS: {bundle_dir} matches its manifest.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,291 @@
+# model_registry.py
+"""
+Lazy, thread-safe loading of the transformer models used by the backends.
+
+Models are registered with a loader (and optionally a warm-up function that runs
+a dummy inference) and are only loaded on first use, or ahead of time by a
+background warm-up thread. Per-model load state is exposed for readiness checks.
+
+An optional memory budget bounds the resident size of the loaded models: when a
+load pushes the total over budget, the least-recently-used idle models are
+evicted, and models idle for longer than `idle_seconds` are evicted as well.
+Evicted models are reloaded transparently on their next use.
+"""
+import gc
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Model load states, in lifecycle order
+UNLOADED = "unloaded"
+LOADING = "loading"
+LOADED = "loaded"
+WARM = "warm"
+FAILED = "failed"
+
+
+def estimate_model_bytes(obj):
+    """
+    Estimates the resident size of a loaded model object by summing the tensors in
+    its state dict (which also covers int8 packed weights), counting tied weights
+    once. Understands torch modules, pipelines (via `.model`) and tuples/lists of
+    those; anything else counts as zero.
+    """
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_model_bytes(item) for item in obj)
+    if hasattr(obj, "state_dict") and callable(obj.state_dict):
+        seen = set()
+        total = 0
+        for value in obj.state_dict().values():
+            for tensor in (value if isinstance(value, (tuple, list)) else (value,)):
+                if not hasattr(tensor, "element_size"):
+                    continue
+                key = tensor.data_ptr()
+                if key in seen:
+                    continue
+                seen.add(key)
+                total += tensor.numel() * tensor.element_size()
+        return total
+    if hasattr(obj, "model"):
+        return estimate_model_bytes(obj.model)
+    return 0
+
+
+class _ModelEntry:
+    def __init__(self, name, loader, warmup, pinned):
+        self.name = name
+        self.loader = loader
+        self.warmup = warmup
+        self.pinned = pinned
+        self.value = None
+        self.state = UNLOADED
+        self.error = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.size_bytes = None # last measured size, kept across evictions
+        self.last_used = None
+        self.in_use = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    """Holds named model loaders and loads each model on demand, within an optional memory budget."""
+
+    def __init__(self, memory_budget_mb=None, idle_seconds=None):
+        """
+        `memory_budget_mb`: upper bound on the summed size of loaded models (None = unbounded).
+        `idle_seconds`: evict unpinned models unused for this long (None = never).
+        """
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024) if memory_budget_mb else None
+        self.idle_seconds = idle_seconds
+        self._entries = {}
+        self._budget_lock = threading.Lock() # guards in_use/last_used bookkeeping and eviction
+        self._warmup_thread = None
+
+    @classmethod
+    def from_env(cls):
+        """Builds a registry configured by MEDICARE_MODEL_MEMORY_BUDGET_MB and MEDICARE_MODEL_IDLE_SECONDS."""
+        budget = os.environ.get("MEDICARE_MODEL_MEMORY_BUDGET_MB")
+        idle = os.environ.get("MEDICARE_MODEL_IDLE_SECONDS")
+        return cls(
+            memory_budget_mb=float(budget) if budget else None,
+            idle_seconds=float(idle) if idle else None,
+        )
+
+    def register(self, name, loader, warmup=None, pinned=False):
+        """
+        Registers `loader()` (returns the loaded model object) under `name`.
+        `warmup(model)`, if given, runs a dummy inference to prime allocations and kernels.
+        Pinned models are never evicted.
+        """
+        if name in self._entries:
+            raise ValueError(f"Model '{name}' is already registered")
+        self._entries[name] = _ModelEntry(name, loader, warmup, pinned)
+
+    def get(self, name):
+        """
+        Returns the loaded model, loading it first if needed. Raises if loading fails.
+        The model may be evicted once the caller is done with it; wrap inference in
+        `use()` to keep it resident for the duration.
+        """
+        entry = self._entries[name]
+        value = entry.value
+        if value is None or entry.state not in (LOADED, WARM):
+            with entry.lock:
+                if entry.state not in (LOADED, WARM):
+                    self._load(entry)
+                value = entry.value
+        with self._budget_lock:
+            entry.last_used = time.monotonic()
+        self.evict_idle()
+        return value
+
+    @contextmanager
+    def use(self, name):
+        """Context manager yielding the loaded model and protecting it from eviction while in use."""
+        entry = self._entries[name]
+        with self._budget_lock:
+            entry.in_use += 1
+        try:
+            yield self.get(name)
+        finally:
+            with self._budget_lock:
+                entry.in_use -= 1
+                entry.last_used = time.monotonic()
+
+    def _load(self, entry):
+        # Caller holds entry.lock. A failed load is retried on the next get().
+        if entry.size_bytes:
+            self._make_room(entry.size_bytes, exclude=entry)
+        entry.state = LOADING
+        entry.error = None
+        started = time.perf_counter()
+        try:
+            entry.value = entry.loader()
+        except Exception as e:
+            entry.state = FAILED
+            entry.error = str(e)
+            entry.load_failures += 1
+            print(f"ERROR: Failed to load model '{entry.name}': {e}")
+            raise
+        entry.load_seconds = time.perf_counter() - started
+        entry.size_bytes = estimate_model_bytes(entry.value)
+        entry.loads += 1
+        entry.state = LOADED
+        with self._budget_lock:
+            entry.last_used = time.monotonic()
+        print(f"INFO: Model '{entry.name}' loaded in {entry.load_seconds:.2f}s "
+              f"(~{entry.size_bytes / (1024 * 1024):.0f} MB, {self.resident_bytes() / (1024 * 1024):.0f} MB resident).")
+        self._make_room(0, exclude=entry)
+
+    def _make_room(self, incoming_bytes, exclude=None):
+        """Evicts least-recently-used idle models until `incoming_bytes` more fits in the budget."""
+        if self.memory_budget_bytes is None:
+            return
+        if self.resident_bytes() + incoming_bytes <= self.memory_budget_bytes:
+            return
+        with self._budget_lock:
+            candidates = sorted(
+                (
+                    entry for entry in self._entries.values()
+                    if entry is not exclude and entry.state in (LOADED, WARM)
+                    and not entry.pinned and entry.in_use == 0
+                ),
+                key=lambda entry: entry.last_used or 0,
+            )
+        for victim in candidates:
+            if self.resident_bytes() + incoming_bytes <= self.memory_budget_bytes:
+                return
+            self._evict(victim, reason="memory budget")
+        if self.resident_bytes() + incoming_bytes > self.memory_budget_bytes:
+            print(f"WARNING: Model memory budget of {self.memory_budget_bytes / (1024 * 1024):.0f} MB "
+                  f"exceeded and no idle model can be evicted.")
+
+    def evict_idle(self):
+        """Evicts unpinned models that have not been used for `idle_seconds`."""
+        if self.idle_seconds is None:
+            return
+        now = time.monotonic()
+        with self._budget_lock:
+            idle = [
+                entry for entry in self._entries.values()
+                if entry.state in (LOADED, WARM) and not entry.pinned and entry.in_use == 0
+                and entry.last_used is not None and now - entry.last_used > self.idle_seconds
+            ]
+        for entry in idle:
+            self._evict(entry, reason="idle")
+
+    def _evict(self, entry, reason):
+        if not entry.lock.acquire(blocking=False):
+            return # being loaded or warmed up right now
+        try:
+            with self._budget_lock:
+                if entry.state not in (LOADED, WARM) or entry.in_use:
+                    return
+                entry.value = None
+                entry.state = UNLOADED
+                entry.evictions += 1
+        finally:
+            entry.lock.release()
+        gc.collect()
+        print(f"INFO: Evicted model '{entry.name}' ({reason}); {self.resident_bytes() / (1024 * 1024):.0f} MB resident.")
+
+    def warm_up(self, name):
+        """Loads `name` and runs its warm-up inference once."""
+        with self.use(name) as model:
+            entry = self._entries[name]
+            with entry.lock:
+                if entry.state == WARM or entry.warmup is None:
+                    return
+                started = time.perf_counter()
+                entry.warmup(model)
+                entry.warmup_seconds = time.perf_counter() - started
+                entry.state = WARM
+        print(f"SUCCESS: Model '{name}' warmed up in {entry.warmup_seconds:.2f}s.")
+
+    def start_background_warmup(self, names):
+        """Loads and warms up `names`, in order, on a daemon thread."""
+        def run():
+            for name in names:
+                try:
+                    self.warm_up(name)
+                except Exception as e:
+                    print(f"ERROR: Background warm-up of model '{name}' failed: {e}")
+
+        self._warmup_thread = threading.Thread(target=run, name="model-warmup", daemon=True)
+        self._warmup_thread.start()
+        return self._warmup_thread
+
+    def state(self, name):
+        return self._entries[name].state
+
+    def is_loaded(self, name):
+        return self._entries[name].state in (LOADED, WARM)
+
+    def resident_bytes(self):
+        return sum(
+            entry.size_bytes or 0
+            for entry in self._entries.values()
+            if entry.state in (LOADED, WARM)
+        )
+
+    def states(self):
+        """Per-model load state, for the readiness endpoint."""
+        return {
+            name: {
+                "state": entry.state,
+                "load_seconds": entry.load_seconds,
+                "warmup_seconds": entry.warmup_seconds,
+                "error": entry.error,
+            }
+            for name, entry in self._entries.items()
+        }
+
+    def stats(self):
+        """Load/evict counters and memory accounting per model and in total."""
+        now = time.monotonic()
+        models = {
+            name: {
+                "state": entry.state,
+                "pinned": entry.pinned,
+                "size_mb": round(entry.size_bytes / (1024 * 1024), 1) if entry.size_bytes else None,
+                "idle_seconds": round(now - entry.last_used, 1) if entry.last_used is not None else None,
+                "in_use": entry.in_use,
+                "loads": entry.loads,
+                "load_failures": entry.load_failures,
+                "evictions": entry.evictions,
+            }
+            for name, entry in self._entries.items()
+        }
+        return {
+            "memory_budget_mb": self.memory_budget_bytes / (1024 * 1024) if self.memory_budget_bytes else None,
+            "idle_seconds": self.idle_seconds,
+            "resident_mb": round(self.resident_bytes() / (1024 * 1024), 1),
+            "loads": sum(model["loads"] for model in models.values()),
+            "evictions": sum(model["evictions"] for model in models.values()),
+            "models": models,
+        }
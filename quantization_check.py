@@ -0,0 +1,140 @@
+# quantization_check.py
+"""
+Accuracy and latency check of int8 dynamically quantized models against fp32.
+
+Loads every app.py model twice (fp32 and int8) through the same loaders the server
+uses, runs both over a fixed corpus of consultation snippets and reports:
+  - NER: precision/recall/F1 of the int8 (word, entity group) set against fp32
+  - grammar and summary T5: exact-match rate and mean fuzz.ratio against fp32
+  - mean latency per text and estimated model size for both modes
+
+Exits non-zero when the int8 outputs fall below the given quality thresholds.
+Usage: python quantization_check.py [--min-ner-f1 0.95] [--min-text-similarity 90] [--json report.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+# Import app.py without kicking off its background model warm-up
+os.environ["MEDICARE_WARMUP_MODELS"] = ""
+
+from rapidfuzz import fuzz
+
+import app
+from inference_mode import FP32, INT8
+from model_registry import estimate_model_bytes
+
+CORPUS = [
+    "Patient has fever and headache since three days. Take paracetamol 500 mg twice a day for five days.",
+    "Complains of dry cough and sore throat. Prescribed azithromycin 500 mg once a day for three days.",
+    "Known case of diabetes mellitus. Continue metformin 500 mg twice daily after food.",
+    "Blood pressure is high. Start amlodipine 5 mg once daily in the morning and reduce salt.",
+    "Child with loose motions and vomiting. Give ORS after every motion and zinc 20 mg daily for fourteen days.",
+    "Patient reports burning sensation while passing urine. Advised urine culture and ciprofloxacin 500 mg twice a day.",
+    "Severe back pain after lifting weights. Take ibuprofen 400 mg three times a day after meals and get enough rest.",
+    "Itching and skin rash on both arms. Apply the cream at night and take cetirizine 10 mg at bedtime.",
+    "Acidity and chest burning after meals. Pantoprazole 40 mg before breakfast for two weeks, avoid oily food.",
+    "Asthma patient with wheezing. Salbutamol inhaler two puffs as needed and drink plenty of water.",
+    "Patient feels tired and dizzy. Check haemoglobin and start iron tablets once a day for one month.",
+    "Follow up for thyroid. Continue levothyroxine 50 mcg on empty stomach every morning.",
+]
+
+
+def _grammar_correct(grammar, text):
+    grammar_tokenizer, grammar_model = grammar
+    input_ids = grammar_tokenizer.encode(f"grammar: {text}", return_tensors="pt").to(app.device)
+    outputs = grammar_model.generate(input_ids, max_length=128, num_beams=4, early_stopping=True)
+    return grammar_tokenizer.decode(outputs[0], skip_special_tokens=True)
+
+
+def _summarize(summary_pipeline, text):
+    return summary_pipeline(text, max_new_tokens=100, min_length=20, do_sample=False)[0]['summary_text']
+
+
+def _ner_entities(ner_pipeline, text):
+    return {(entity['word'].strip().lower(), entity['entity_group']) for entity in ner_pipeline(text)}
+
+
+def _timed_outputs(fn, model, corpus):
+    fn(model, corpus[0]) # warm-up, not timed
+    outputs = []
+    started = time.perf_counter()
+    for text in corpus:
+        outputs.append(fn(model, text))
+    return outputs, (time.perf_counter() - started) / len(corpus) * 1000
+
+
+def _set_agreement(reference_sets, candidate_sets):
+    true_positives = sum(len(ref & cand) for ref, cand in zip(reference_sets, candidate_sets))
+    reference_total = sum(len(ref) for ref in reference_sets)
+    candidate_total = sum(len(cand) for cand in candidate_sets)
+    precision = true_positives / candidate_total if candidate_total else 1.0
+    recall = true_positives / reference_total if reference_total else 1.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": round(precision, 4), "recall": round(recall, 4), "f1": round(f1, 4)}
+
+
+def _text_agreement(reference_texts, candidate_texts):
+    exact = sum(ref.strip() == cand.strip() for ref, cand in zip(reference_texts, candidate_texts))
+    similarity = sum(fuzz.ratio(ref, cand) for ref, cand in zip(reference_texts, candidate_texts))
+    return {
+        "exact_match_rate": round(exact / len(reference_texts), 4),
+        "mean_similarity": round(similarity / len(reference_texts), 2),
+    }
+
+
+def compare_model(name, loader, run_fn, agreement_fn, corpus):
+    """Loads one model in both modes and compares int8 outputs to fp32."""
+    report = {}
+    outputs = {}
+    for mode in (FP32, INT8):
+        model = loader(inference_mode=mode)
+        outputs[mode], latency_ms = _timed_outputs(run_fn, model, corpus)
+        report[mode] = {
+            "mean_latency_ms": round(latency_ms, 1),
+            "size_mb": round(estimate_model_bytes(model) / (1024 * 1024), 1),
+        }
+        del model
+    report["agreement"] = agreement_fn(outputs[FP32], outputs[INT8])
+    report["speedup"] = round(report[FP32]["mean_latency_ms"] / max(report[INT8]["mean_latency_ms"], 1e-9), 2)
+    print(f"{name}: fp32 {report[FP32]['mean_latency_ms']} ms / {report[FP32]['size_mb']} MB, "
+          f"int8 {report[INT8]['mean_latency_ms']} ms / {report[INT8]['size_mb']} MB "
+          f"(x{report['speedup']}), agreement {report['agreement']}")
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--min-ner-f1", type=float, default=0.95, help="minimum NER entity F1 of int8 vs fp32")
+    parser.add_argument("--min-text-similarity", type=float, default=90.0,
+                        help="minimum mean fuzz.ratio of int8 vs fp32 T5 outputs")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    report = {
+        "ner": compare_model("ner", app.load_ner_model, _ner_entities, _set_agreement, CORPUS),
+        "grammar": compare_model("grammar", app.load_grammar_model, _grammar_correct, _text_agreement, CORPUS),
+        "summary": compare_model("summary", app.load_summary_model, _summarize, _text_agreement, CORPUS),
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    failures = []
+    if report["ner"]["agreement"]["f1"] < args.min_ner_f1:
+        failures.append(f"NER F1 {report['ner']['agreement']['f1']} < {args.min_ner_f1}")
+    for name in ("grammar", "summary"):
+        similarity = report[name]["agreement"]["mean_similarity"]
+        if similarity < args.min_text_similarity:
+            failures.append(f"{name} similarity {similarity} < {args.min_text_similarity}")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        return 1
+    print("PASS: int8 outputs are within the configured quality thresholds.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
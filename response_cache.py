@@ -0,0 +1,205 @@
+# response_cache.py
+"""
+Whole-response cache with single-flight coalescing for the extraction endpoints.
+
+Keys hash the endpoint, a version string and the request body with whitespace
+normalized (as stage_cache.py does for stage inputs). The version must change
+whenever the answer for the same body could change: learned feedback, the medicine
+catalog, model versions. A stale entry is then never looked up again and simply
+ages out of the LRU. `invalidate()` drops everything at once.
+
+Concurrent requests with the same key share one computation. Flask request
+threads block on the leader's Future (`get_or_compute`), and FastAPI coroutines
+await a shared task running it (`get_or_compute_async`), which a cancelled request
+does not cancel. Only successful results are stored. Each stores
+the serialized body with an ETag, so handlers can answer If-None-Match with 304.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import NamedTuple
+
+from metrics import METRICS
+from stage_cache import normalize_stage_input
+
+RESPONSE_CACHE_LOOKUPS = METRICS.counter(
+    "medicare_response_cache_lookups_total", "Response cache lookups, by endpoint cache and result.",
+    ("cache", "result"),
+)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes # serialized JSON
+    etag: str # quoted, ready for the ETag header
+
+
+def _normalize_body(value):
+    if isinstance(value, str):
+        return normalize_stage_input(value)
+    if isinstance(value, dict):
+        return {key: _normalize_body(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_normalize_body(item) for item in value]
+    return value
+
+
+def etag_matches(if_none_match, etag):
+    """True when an If-None-Match header value covers `etag`."""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class ResponseCache:
+    """Bounded LRU of serialized responses with a TTL and in-flight request coalescing."""
+
+    def __init__(self, name, max_entries=1024, ttl_seconds=300.0):
+        self.name = name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict() # key -> (CachedResponse, stored_at)
+        self._lock = threading.Lock()
+        self._inflight = {} # key -> Future (threads)
+        self._inflight_async = {} # key -> asyncio.Future (event loop)
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    @classmethod
+    def from_env(cls, name):
+        """Configured by MEDICARE_RESPONSE_CACHE_SIZE (0 disables) and MEDICARE_RESPONSE_CACHE_TTL_SECONDS."""
+        return cls(
+            name,
+            max_entries=int(os.environ.get("MEDICARE_RESPONSE_CACHE_SIZE", "1024")),
+            ttl_seconds=float(os.environ.get("MEDICARE_RESPONSE_CACHE_TTL_SECONDS", "300")),
+        )
+
+    @staticmethod
+    def key(endpoint, body, version=""):
+        payload = json.dumps([endpoint, version, _normalize_body(body)], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def serialize(result):
+        """JSON body and strong ETag for a response result."""
+        body = json.dumps(result, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return CachedResponse(body, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and time.monotonic() - item[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                RESPONSE_CACHE_LOOKUPS.inc(cache=self.name, result="hit")
+                return item[0]
+            if item is not None:
+                del self._entries[key]
+        return None
+
+    def _store(self, key, response, generation):
+        with self._lock:
+            if generation != self._generation: # invalidated while this was computed
+                return
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _miss(self):
+        with self._lock:
+            self.misses += 1
+            generation = self._generation
+        RESPONSE_CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        return generation
+
+    def _coalesced(self):
+        with self._lock:
+            self.coalesced += 1
+        RESPONSE_CACHE_LOOKUPS.inc(cache=self.name, result="coalesced")
+
+    def invalidate(self):
+        """Drops every entry; results computed before this call are not stored."""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Cached response for `key`, or `compute()` (returning a JSON-serializable result) run by
+        exactly one of the threads asking for `key` at the same time. Returns (CachedResponse, result)
+        where result is "hit", "miss" or "coalesced".
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "hit"
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            self._coalesced()
+            return future.result(), "coalesced"
+
+        generation = self._miss()
+        try:
+            response = self.serialize(compute())
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        self._store(key, response, generation)
+        future.set_result(response)
+        return response, "miss"
+
+    async def get_or_compute_async(self, key, compute):
+        """
+        get_or_compute() for coroutines: `compute` is an async callable. It runs in its own task,
+        which every request for `key` (the first one included) awaits through asyncio.shield, so a
+        cancelled request never cancels the computation the others are waiting for.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached, "hit"
+        task = self._inflight_async.get(key)
+        if task is not None:
+            self._coalesced()
+            return await asyncio.shield(task), "coalesced"
+
+        generation = self._miss()
+        task = self._inflight_async[key] = asyncio.ensure_future(self._compute_async(key, compute, generation))
+        # Retrieves the outcome, so a failure nobody is left waiting for isn't logged as never retrieved
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+        return await asyncio.shield(task), "miss"
+
+    async def _compute_async(self, key, compute, generation):
+        try:
+            response = self.serialize(await compute())
+        finally:
+            self._inflight_async.pop(key, None)
+        self._store(key, response, generation)
+        return response
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "in_flight": len(self._inflight) + len(self._inflight_async),
+            }
@@ -0,0 +1,161 @@
+# serve.py
+"""
+Production launcher for app.py (Flask) and backend_app.py (FastAPI).
+
+The master process imports the app once, which loads the medicine catalog and
+the models (app.py's warm-up runs synchronously here instead of on its
+background thread, since threads do not survive fork). By default every
+registered model is warmed, the summary model included; an explicitly set
+MEDICARE_WARMUP_MODELS narrows the list. The master then forks the
+workers, so model weights and the catalog are shared copy-on-write instead of
+being loaded once per worker. gc.freeze() keeps the garbage collector from
+touching, and so copying, the preloaded objects.
+
+The cores given to the server are divided between the workers: each worker's
+torch intra-op pool gets cores // workers threads, so the workers don't
+oversubscribe the node. Workers are recycled gracefully after a (jittered)
+number of requests. A SIGHUP to the master starts a complete new set of workers
+and then gracefully stops the old ones; the new workers are forked from the same
+preloaded master, so code and models are not reloaded (restart the master for that).
+
+Usage:
+  python serve.py app [--cores C] [--workers N] [--bind 0.0.0.0:5000]
+  python serve.py backend [--cores C] [--workers N] [--bind 0.0.0.0:8000]
+"""
+import argparse
+import gc
+import importlib
+import os
+import sys
+
+from gunicorn.app.base import BaseApplication
+
+APPS = {
+    "app": {
+        "module": "app",
+        "bind": "0.0.0.0:5000",
+        # Request threads per worker, so concurrent /ner calls can share micro-batches
+        "worker_class": "gthread",
+    },
+    "backend": {
+        "module": "backend_app",
+        "bind": "0.0.0.0:8000",
+        "worker_class": "uvicorn.workers.UvicornWorker",
+    },
+}
+
+
+def available_cores():
+    """CPU cores this process may run on (respects taskset/cgroup CPU affinity)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def plan_workers(cores, workers=None):
+    """
+    Returns (workers, torch_threads_per_worker) for `cores` cores. By default each
+    worker gets two intra-op threads, which keeps single-request T5 latency reasonable
+    while still scaling throughput with the number of workers.
+    """
+    cores = max(1, cores)
+    if workers is None:
+        workers = max(1, cores // 2)
+    workers = max(1, workers)
+    return workers, max(1, cores // workers)
+
+
+def preload(app_name, torch_threads):
+    """Imports the app in the master and loads everything the workers will share."""
+    import torch
+    torch.set_num_threads(torch_threads)
+
+    if app_name == "app":
+        configured_warmup = os.environ.get("MEDICARE_WARMUP_MODELS")
+        # Warm up synchronously below rather than on app.py's background thread
+        os.environ["MEDICARE_WARMUP_MODELS"] = ""
+        module = importlib.import_module(APPS[app_name]["module"])
+        if configured_warmup is None:
+            # Every registered model, so no worker loads its own copy of one later
+            warmup_models = list(module.MODEL_REGISTRY.states())
+        else:
+            warmup_models = [name.strip() for name in configured_warmup.split(",") if name.strip()]
+        for name in warmup_models:
+            module.MODEL_REGISTRY.warm_up(name)
+    else:
+        # backend_app.py loads its NER pipeline at import
+        module = importlib.import_module(APPS[app_name]["module"])
+
+    gc.collect()
+    gc.freeze()
+    return module.app
+
+
+class PreforkServer(BaseApplication):
+    """gunicorn application that preloads one of the apps in the master."""
+
+    def __init__(self, app_name, options, torch_threads):
+        self.app_name = app_name
+        self.options = options
+        self.torch_threads = torch_threads
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        return preload(self.app_name, self.torch_threads)
+
+
+def post_fork(server, worker):
+    # Worker processes re-apply the per-worker intra-op thread count
+    import torch
+    torch.set_num_threads(server.app.torch_threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=sorted(APPS))
+    parser.add_argument("--bind", help="host:port to listen on (default: the app's usual port)")
+    parser.add_argument("--cores", type=int, default=int(os.environ.get("MEDICARE_CORES", available_cores())),
+                        help="CPU cores to use across all workers (default: all available)")
+    parser.add_argument("--workers", type=int,
+                        default=int(os.environ["MEDICARE_WORKERS"]) if os.environ.get("MEDICARE_WORKERS") else None,
+                        help="worker processes (default: cores / 2)")
+    parser.add_argument("--request-threads", type=int, default=int(os.environ.get("MEDICARE_REQUEST_THREADS", "4")),
+                        help="request threads per Flask worker")
+    parser.add_argument("--max-requests", type=int, default=int(os.environ.get("MEDICARE_MAX_REQUESTS", "2000")),
+                        help="recycle a worker after this many requests (0 disables)")
+    parser.add_argument("--max-requests-jitter", type=int,
+                        default=int(os.environ.get("MEDICARE_MAX_REQUESTS_JITTER", "200")),
+                        help="random extra requests so workers don't recycle all at once")
+    parser.add_argument("--timeout", type=int, default=int(os.environ.get("MEDICARE_WORKER_TIMEOUT", "120")),
+                        help="seconds before a silent worker is killed and replaced")
+    parser.add_argument("--graceful-timeout", type=int,
+                        default=int(os.environ.get("MEDICARE_GRACEFUL_TIMEOUT", "60")),
+                        help="seconds a recycled worker gets to finish in-flight requests")
+    args = parser.parse_args()
+
+    workers, torch_threads = plan_workers(args.cores, args.workers)
+    print(f"INFO: Serving '{args.app}' with {workers} workers x {torch_threads} torch threads on {args.cores} cores.")
+
+    options = {
+        "bind": args.bind or APPS[args.app]["bind"],
+        "workers": workers,
+        "worker_class": APPS[args.app]["worker_class"],
+        "threads": args.request_threads,
+        "preload_app": True,
+        "max_requests": args.max_requests,
+        "max_requests_jitter": args.max_requests_jitter,
+        "timeout": args.timeout,
+        "graceful_timeout": args.graceful_timeout,
+        "post_fork": post_fork,
+    }
+    PreforkServer(args.app, options, torch_threads).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# spelling_index.py
+"""
+Symmetric-delete (SymSpell-style) spelling correction for the /ner pre-processing.
+
+Built once from the general English word frequencies plus the medicine catalog and
+the symptom vocabulary. Every dictionary word's prefix is expanded into all
+strings reachable by deleting up to `max_edit_distance` characters. Those deletes
+are stored as a sorted array of 64-bit hashes, so a lookup only hashes the
+query's own deletes, binary-searches them and verifies the few candidates with
+unrestricted Damerau-Levenshtein distance, the distance SpellChecker's chained
+single edits measure (a transposition may be followed by another edit on the same
+letters, e.g. 'wihfs' -> 'wish'). This replaces the per-token edit-distance-2 search
+of SpellChecker().correction().
+
+Corrections follow SpellChecker's rule: the smallest edit distance wins, then the
+most frequent word. Numeric tokens and tokens from the medicine catalog or symptom
+vocabulary are never corrected, and per-word results are cached.
+"""
+import csv
+import hashlib
+import os
+import re
+from array import array
+from functools import lru_cache
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import DamerauLevenshtein
+
+_TOKEN_RE = re.compile(r"[a-z]+")
+_EDGE_PUNCTUATION = ".,;:!?\"'()[]{}"
+
+
+def vocabulary_from_names(names):
+    """Lowercase word tokens of catalog names (e.g. "Vitamin C 500" -> vitamin, c)."""
+    vocabulary = set()
+    for name in names:
+        vocabulary.update(_TOKEN_RE.findall(name.lower()))
+    return vocabulary
+
+
+def vocabulary_from_symptoms_csv(path):
+    """Lowercase word tokens of every disease and symptom in assets/symptoms.csv."""
+    vocabulary = set()
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            for cell in row:
+                vocabulary.update(_TOKEN_RE.findall(cell.lower().replace('_', ' ')))
+    vocabulary.discard("symptom") # header row
+    return vocabulary
+
+
+def symptoms_digest(path):
+    """Short digest of assets/symptoms.csv (or "missing"), for cache versions that must change with it."""
+    if not os.path.exists(path):
+        return "missing"
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+class SymSpellIndex:
+    """Precomputed symmetric-delete index with O(1)-ish per-word lookups."""
+
+    def __init__(self, word_frequencies, protected_words=(), max_edit_distance=2, prefix_length=7,
+                 cache_size=65536):
+        """
+        `word_frequencies`: lowercase word -> count (e.g. SpellChecker().word_frequency.dictionary).
+        `protected_words`: lowercase tokens that are never corrected; they are also added to the
+        dictionary, so close misspellings of them are corrected towards them.
+        """
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.frequencies = dict(word_frequencies)
+        # Catalog/symptom words missing from the general dictionary get the median frequency
+        default_frequency = int(np.median(list(self.frequencies.values()))) if self.frequencies else 1
+        for word in protected_words:
+            self.frequencies.setdefault(word, default_frequency)
+        self.protected_words = frozenset(protected_words)
+        self.longest_word_length = max((len(word) for word in self.frequencies), default=0)
+
+        self.words = list(self.frequencies)
+        self._word_lengths = [len(word) for word in self.words]
+        hashes = array('q')
+        word_ids = array('i')
+        for word_id, word in enumerate(self.words):
+            deletes = self._deletes(word[:prefix_length])
+            hashes.extend(hash(delete) for delete in deletes)
+            word_ids.extend([word_id] * len(deletes))
+        hashes = np.frombuffer(hashes, dtype=np.int64)
+        order = np.argsort(hashes, kind="stable")
+        self._delete_hashes = hashes[order]
+        self._delete_word_ids = np.frombuffer(word_ids, dtype=np.int32)[order]
+
+        self.correct_word = lru_cache(maxsize=cache_size)(self._correct_word)
+
+    def _deletes(self, word):
+        """`word` plus every string reachable by deleting up to max_edit_distance characters."""
+        deletes = {word}
+        frontier = {word}
+        for _ in range(self.max_edit_distance):
+            frontier = {
+                candidate[:i] + candidate[i + 1:]
+                for candidate in frontier if len(candidate) > 1
+                for i in range(len(candidate))
+            }
+            deletes |= frontier
+        return deletes
+
+    def lookup(self, word):
+        """Best dictionary word within max_edit_distance of lowercase `word`, or None."""
+        if word in self.frequencies:
+            return word
+        query_hashes = np.fromiter(
+            (hash(delete) for delete in self._deletes(word[:self.prefix_length])), dtype=np.int64
+        )
+        lows = np.searchsorted(self._delete_hashes, query_hashes, side="left")
+        highs = np.searchsorted(self._delete_hashes, query_hashes, side="right")
+        word_ids = set()
+        for low, high in zip(lows.tolist(), highs.tolist()):
+            if low != high:
+                word_ids.update(self._delete_word_ids[low:high].tolist())
+        word_length = len(word)
+        # A length difference beyond the edit budget can never verify
+        candidates = [
+            self.words[word_id] for word_id in word_ids
+            if abs(self._word_lengths[word_id] - word_length) <= self.max_edit_distance
+        ]
+        if not candidates:
+            return None
+        matches = process.extract(
+            word, candidates, scorer=DamerauLevenshtein.distance, score_cutoff=self.max_edit_distance, limit=None
+        )
+        if not matches:
+            return None
+        # Smallest distance first, then highest frequency, then alphabetical for determinism
+        best_distance = min(match[1] for match in matches)
+        return min(
+            (match[0] for match in matches if match[1] == best_distance),
+            key=lambda candidate: (-self.frequencies[candidate], candidate),
+        )
+
+    def _should_check(self, word):
+        """Mirrors SpellChecker: skip lone punctuation, overlong and numeric tokens."""
+        if len(word) == 1 and not word.isalnum():
+            return False
+        if len(word) > self.longest_word_length + 3:
+            return False
+        if any(char.isdigit() for char in word):
+            return False
+        return True
+
+    def _correct_word(self, word):
+        word_lower = word.lower()
+        if word_lower in self.frequencies or not self._should_check(word_lower):
+            return word
+        if word_lower.strip(_EDGE_PUNCTUATION) in self.protected_words:
+            return word
+        correction = self.lookup(word_lower)
+        return correction if correction is not None else word
+
+    def correct_text(self, text):
+        """Corrects each whitespace-separated token of `text`."""
+        return " ".join(self.correct_word(word) for word in text.split())
@@ -0,0 +1,167 @@
+# stage_cache.py
+"""
+Content-addressed result cache for the /ner pipeline stages.
+
+Each stage (spell check, grammar T5, NER, summary) gets its own StageCache keyed on
+a hash of the stage name, the model version and the whitespace-normalized stage
+input. Lookups go to a bounded in-process LRU with a TTL first and then, if
+configured, to an SQLite tier on disk that all worker processes share. Values must
+be JSON-serializable so they can live in the disk tier.
+"""
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+CACHE_LOOKUPS = METRICS.counter(
+    "medicare_stage_cache_lookups_total", "Stage cache lookups, by cache and result.", ("cache", "result")
+)
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_stage_input(text):
+    """Collapses runs of whitespace so trivially re-spaced transcripts share a cache entry."""
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+class SqliteCacheTier:
+    """On-disk cache tier shared across worker processes (SQLite in WAL mode)."""
+
+    def __init__(self, path, ttl_seconds, max_entries=100000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._puts = 0
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS stage_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+        )
+
+    def _connect(self):
+        # One connection per thread, reopened after fork
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT value, created FROM stage_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_seconds:
+            return False, None
+        return True, json.loads(row[0])
+
+    def put(self, key, value):
+        connection = self._connect()
+        connection.execute(
+            "INSERT OR REPLACE INTO stage_cache (key, value, created) VALUES (?, ?, ?)",
+            (key, json.dumps(value), time.time()),
+        )
+        self._puts += 1
+        if self._puts % 256 == 0:
+            self.prune()
+
+    def prune(self):
+        """Drops expired entries and the oldest entries beyond `max_entries`."""
+        connection = self._connect()
+        connection.execute("DELETE FROM stage_cache WHERE created < ?", (time.time() - self.ttl_seconds,))
+        connection.execute(
+            "DELETE FROM stage_cache WHERE key IN ("
+            " SELECT key FROM stage_cache ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class StageCache:
+    """Two-tier (memory LRU, optional shared disk) cache for one pipeline stage."""
+
+    def __init__(self, name, model_version, max_entries=1024, ttl_seconds=3600.0, disk_tier=None):
+        self.name = name
+        self.model_version = model_version
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_tier = disk_tier
+        self._entries = OrderedDict() # key -> (value, expires_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, stage_input):
+        payload = f"{self.name}\0{self.model_version}\0{normalize_stage_input(stage_input)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get_or_compute(self, stage_input, compute):
+        """Returns the cached result for `stage_input`, or computes, stores and returns `compute(stage_input)`."""
+        key = self.key(stage_input)
+        now = time.monotonic()
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None and cached[1] > now:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="memory_hit")
+                return cached[0]
+
+        if self.disk_tier is not None:
+            try:
+                hit, value = self.disk_tier.get(key)
+            except sqlite3.Error as e:
+                print(f"WARNING: Stage cache disk tier read failed for '{self.name}': {e}")
+                hit, value = False, None
+            if hit:
+                self._remember(key, value)
+                with self._lock:
+                    self.disk_hits += 1
+                CACHE_LOOKUPS.inc(cache=self.name, result="disk_hit")
+                return value
+
+        with self._lock:
+            self.misses += 1
+        CACHE_LOOKUPS.inc(cache=self.name, result="miss")
+        value = compute(stage_input)
+        self._remember(key, value)
+        if self.disk_tier is not None:
+            try:
+                self.disk_tier.put(key, value)
+            except sqlite3.Error as e:
+                print(f"WARNING: Stage cache disk tier write failed for '{self.name}': {e}")
+        return value
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "model_version": self.model_version,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
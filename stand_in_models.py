@@ -0,0 +1,142 @@
+# stand_in_models.py
+"""
+Deterministic, lightweight stand-ins for the transformer models, for the offline
+microbenchmarks and the load replay harness.
+
+install() swaps the transformers loaders that app.py and backend_app.py import
+(AutoTokenizer, AutoModelFor*, pipeline) for fakes. It must run before the apps
+are imported. The fakes keep the real call signatures:
+  - NER tags medicine-like words as Medication (split into "##" subword pieces),
+    symptom words as Sign_symptom and number+unit pairs as Dosage
+  - grammar "correction" returns its input unchanged
+  - summarization returns the first sentence
+Each model call can sleep for a fixed time to emulate inference cost
+(MEDICARE_STAND_IN_LATENCY_MS, per call, not per item).
+"""
+import os
+import re
+import time
+
+SYMPTOMS = ("fever", "headache", "cough", "vomiting", "rash", "dizziness", "fatigue", "nausea")
+DOSAGE_UNITS = frozenset(("mg", "ml", "mcg", "tablet", "capsule"))
+STAND_IN_LATENCY_MS = float(os.environ.get("MEDICARE_STAND_IN_LATENCY_MS", "0"))
+
+_WORD_RE = re.compile(r"[A-Za-z]+|\d+(?:\.\d+)?")
+# Without an explicit vocabulary, words with common drug-name endings count as medicines
+_MEDICINE_SUFFIX_RE = re.compile(r"(?:mol|cin|cillin|fen|min|zole|zine|ine|dol|lin|xin|pril|tide)$", re.IGNORECASE)
+
+
+def _simulate_inference():
+    if STAND_IN_LATENCY_MS > 0:
+        time.sleep(STAND_IN_LATENCY_MS / 1000)
+
+
+class FakeNerPipeline:
+    """Stands in for the token-classification pipeline (aggregation_strategy="simple")."""
+
+    def __init__(self, medicine_words=None):
+        self.medicine_words = {word.lower() for word in medicine_words} if medicine_words is not None else None
+
+    def __call__(self, texts, **kwargs):
+        _simulate_inference()
+        if isinstance(texts, str):
+            return self._tag(texts)
+        return [self._tag(text) for text in texts]
+
+    def _is_medicine(self, word):
+        if self.medicine_words is not None:
+            return word.lower() in self.medicine_words
+        return len(word) > 4 and _MEDICINE_SUFFIX_RE.search(word) is not None
+
+    def _tag(self, text):
+        entities = []
+        tokens = list(_WORD_RE.finditer(text))
+        for index, match in enumerate(tokens):
+            word = match.group(0)
+            if self._is_medicine(word):
+                split = min(4, len(word))
+                entities.append(self._entity("Medication", word[:split], match.start(), match.start() + split))
+                if split < len(word):
+                    entities.append(self._entity("Medication", "##" + word[split:], match.start() + split, match.end()))
+            elif word.lower() in SYMPTOMS:
+                entities.append(self._entity("Sign_symptom", word, match.start(), match.end()))
+            elif word[0].isdigit() and index + 1 < len(tokens) and tokens[index + 1].group(0).lower() in DOSAGE_UNITS:
+                entities.append(self._entity("Dosage", word, match.start(), match.end()))
+                unit = tokens[index + 1]
+                entities.append(self._entity("Dosage", unit.group(0), unit.start(), unit.end()))
+        return entities
+
+    @staticmethod
+    def _entity(group, word, start, end):
+        return {"entity_group": group, "score": 0.9, "word": word, "start": start, "end": end}
+
+
+class FakeSummarizationPipeline:
+    def __call__(self, texts, **kwargs):
+        _simulate_inference()
+        single = isinstance(texts, str)
+        summaries = [{"summary_text": text.split(".")[0].strip() + "."} for text in ([texts] if single else texts)]
+        return summaries[0:1] if single else summaries
+
+
+class FakeEncoding(dict):
+    """Tokenizer output: keeps the raw texts and supports .to(device) like a BatchEncoding."""
+
+    def to(self, device):
+        return self
+
+
+class FakeTokenizer:
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def __call__(self, texts, **kwargs):
+        return FakeEncoding(input_ids=[texts] if isinstance(texts, str) else list(texts))
+
+    def encode(self, text, **kwargs):
+        return FakeEncoding(input_ids=[text])
+
+    def decode(self, output, skip_special_tokens=True):
+        return output.split(": ", 1)[-1] if output.startswith("grammar: ") else output
+
+    def batch_decode(self, outputs, skip_special_tokens=True):
+        return [self.decode(output) for output in outputs]
+
+
+class FakeModel:
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def to(self, device):
+        return self
+
+    def eval(self):
+        return self
+
+    def state_dict(self):
+        return {}
+
+    def generate(self, input_ids=None, **kwargs):
+        # Grammar "correction" echoes the (prefixed) input; the tokenizer strips the prefix
+        _simulate_inference()
+        texts = input_ids["input_ids"] if isinstance(input_ids, dict) else input_ids
+        return list(texts)
+
+
+def fake_pipeline(task, *args, **kwargs):
+    if task == "ner":
+        return FakeNerPipeline()
+    if task == "summarization":
+        return FakeSummarizationPipeline()
+    raise ValueError(f"No stand-in for pipeline task '{task}'")
+
+
+def install():
+    """Replaces the transformers loaders with the stand-ins; call before importing the apps."""
+    import transformers
+    transformers.AutoTokenizer = FakeTokenizer
+    transformers.AutoModelForTokenClassification = FakeModel
+    transformers.AutoModelForSeq2SeqLM = FakeModel
+    transformers.pipeline = fake_pipeline
@@ -0,0 +1,83 @@
+# test_detail_extraction.py
+"""
+Regression corpus for detail_extraction.py.
+
+detail_extraction_corpus.json holds generated prescription transcripts and token
+soup. The expected values were recorded by running the original per-call-regex
+implementations from app.py (before the shared module) on each input. The
+precompiled extractors must reproduce them exactly.
+"""
+import json
+import os
+
+import pytest
+
+from detail_extraction import assign_details, extract_general_advice, extract_segment_details, scan_details
+
+with open(os.path.join(os.path.dirname(__file__), "detail_extraction_corpus.json"), encoding="utf-8") as f:
+    CORPUS = json.load(f)
+
+
+@pytest.mark.parametrize("segment, expected", CORPUS["segment_details"])
+def test_segment_details_match_original_app_rules(segment, expected):
+    assert list(extract_segment_details(segment)) == expected
+
+
+@pytest.mark.parametrize("text, expected", CORPUS["advice"])
+def test_general_advice_matches_original(text, expected):
+    assert sorted(extract_general_advice(text)) == expected
+
+
+def test_scan_details_reports_spans_in_order():
+    text = "Paracetamol 500 mg twice a day after food for five days. Drink plenty of water."
+    details = scan_details(text)
+    assert [(detail.kind, detail.value) for detail in details] == [
+        ("dosage", "500 mg"), ("frequency", "twice a day"), ("timing", "after food"),
+        ("duration", "for 5 days"), ("advice", "Drink plenty of water."),
+    ]
+    assert all(text[detail.start:detail.end] == detail.text for detail in details)
+
+
+def _span(text, name):
+    start = text.index(name)
+    return start, start + len(name)
+
+
+def test_assign_details_keeps_interleaved_details_with_their_medicine():
+    text = "Dolo 650 twice a day after food, Amoxicillin 500 mg three times a day before food for five days"
+    details = assign_details(text, [_span(text, "Dolo 650"), _span(text, "Amoxicillin")])
+    assert details == [
+        # The strength in the name is not a dosage, and Amoxicillin's duration is its own
+        {"dosage": "N/A", "duration": "N/A", "frequency": "twice a day", "timing": "after food"},
+        {"dosage": "500 mg", "duration": "5 days", "frequency": "3 times a day", "timing": "before food"},
+    ]
+
+
+def test_assign_details_does_not_borrow_another_medicines_duration():
+    text = "Take Paracetamol 500 mg twice a day. Ibuprofen 400 mg for 3 days."
+    details = assign_details(text, [_span(text, "Paracetamol"), _span(text, "Ibuprofen")])
+    assert details == [
+        {"dosage": "500 mg", "duration": "N/A", "frequency": "twice a day", "timing": "N/A"},
+        {"dosage": "400 mg", "duration": "3 days", "frequency": "N/A", "timing": "N/A"},
+    ]
+
+
+def test_assign_details_shares_a_duration_no_medicine_owns():
+    text = "Dolo 650 twice a day, Amoxicillin 500 mg thrice daily for 3 days, continue both for 7 days"
+    details = assign_details(text, [_span(text, "Dolo 650"), _span(text, "Amoxicillin")])
+    assert [medicine["duration"] for medicine in details] == ["7 days", "3 days"]
+
+
+def test_assign_details_does_not_join_name_strength_to_a_dosage():
+    text = "Take Dolo 650 one tablet at night for 3 days and Pan 40 before breakfast"
+    details = assign_details(text, [_span(text, "Dolo 650"), _span(text, "Pan 40")])
+    assert details == [
+        {"dosage": "1 tablet", "duration": "3 days", "frequency": "N/A", "timing": "at night"},
+        {"dosage": "N/A", "duration": "N/A", "frequency": "N/A", "timing": "before breakfast"},
+    ]
+
+
+def test_assign_details_takes_a_bare_number_after_the_name():
+    assert assign_details("Paracetamol 650 twice a day", [(0, 11)]) == [
+        {"dosage": "650 mg", "duration": "N/A", "frequency": "twice a day", "timing": "N/A"},
+    ]
@@ -0,0 +1,71 @@
+# test_feedback_index.py
+"""FeedbackIndex lookups against the linear scan over stored feedback they replace."""
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from feedback_index import FeedbackIndex
+
+WORDS = ["paracetamol", "500", "mg", "twice", "a", "day", "fever", "cough", "for", "five", "days", "amoxicillin"]
+
+
+def _linear_scan(entries, text_lower, threshold):
+    """The earliest stored entry whose original text scores above `threshold`."""
+    for text, payload in entries:
+        score = fuzz.ratio(text_lower, text.lower())
+        if score > threshold:
+            return payload, score
+    return None, 0.0
+
+
+def test_find_matches_linear_scan():
+    rng = random.Random(5)
+    index = FeedbackIndex()
+    entries = []
+    for entry in range(300):
+        text = " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+        entries.append((text, {"entry": entry}))
+        index.add(text, {"entry": entry})
+    for _ in range(300):
+        text = rng.choice(entries)[0] if rng.random() < 0.5 else " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+        for threshold in (60, 90):
+            payload, score, _ = index.find(text.lower(), threshold)
+            assert (payload, score) == _linear_scan(entries, text.lower(), threshold)
+
+
+def test_exact_hit_on_the_first_entry_scores_nothing():
+    index = FeedbackIndex()
+    index.add("Paracetamol 500 mg twice a day", {"entry": 0})
+    index.add("Paracetamol 500 mg twice a day", {"entry": 1})
+    assert index.find("paracetamol 500 mg twice a day") == ({"entry": 0}, 100.0, 0)
+
+
+def test_earlier_fuzzy_match_beats_later_exact_match():
+    index = FeedbackIndex()
+    index.add("paracetamol 500 mg twice a day.", {"entry": 0})
+    index.add("paracetamol 500 mg twice a day", {"entry": 1})
+    payload, score, _ = index.find("paracetamol 500 mg twice a day")
+    assert payload == {"entry": 0} and 90 < score < 100
+    assert index.find("amoxicillin for five days")[0] is None
+
+
+def test_remove_repoints_exact_match_to_next_entry_with_the_same_text():
+    index = FeedbackIndex()
+    index.add("paracetamol 500 mg", {"entry": 3}, entry_id=3)
+    index.add("amoxicillin for five days", {"entry": 4}, entry_id=4)
+    index.add("paracetamol 500 mg", {"entry": 7}, entry_id=7)
+    index.remove(3)
+    assert index.find("paracetamol 500 mg") == ({"entry": 7}, 100.0, 0)
+    assert index.entry_ids() == [4, 7] and 3 not in index
+    index.remove(7)
+    assert index.find("paracetamol 500 mg")[0] is None
+    index.remove(7) # already gone
+
+
+def test_entry_ids_must_increase():
+    index = FeedbackIndex()
+    index.add("paracetamol 500 mg", {}, entry_id=5)
+    with pytest.raises(ValueError):
+        index.add("amoxicillin", {}, entry_id=5)
+    assert index.add("amoxicillin", {}) == 6
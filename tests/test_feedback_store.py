@@ -0,0 +1,105 @@
+# test_feedback_store.py
+"""Hot-index eviction, cold exact matches and cross-worker syncing of feedback_store.py."""
+import os
+import sqlite3
+import time
+
+import pytest
+
+from feedback_store import FeedbackStore
+
+TEXTS = [
+    "paracetamol five hundred twice daily", "amoxicillin capsule thrice a day", "ibuprofen after food for fever",
+    "cetirizine at night for allergy", "pantoprazole before breakfast", "metformin with meals for sugar",
+    "azithromycin once daily three days", "vitamin c chewable every morning", "omeprazole on an empty stomach",
+    "salbutamol inhaler when breathless", "dolo six fifty when needed", "cough syrup two spoons at bedtime",
+]
+
+
+def _payload(text):
+    return {"original_text": text, "corrected_medicines": []}
+
+
+def _is_hot(store, text):
+    """Hot entries also match a slightly different text; evicted ones only match exactly."""
+    return store.find(text + ".")[0] is not None
+
+
+def test_least_used_then_oldest_entries_are_evicted(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), hot_capacity=10)
+    for text in TEXTS[:10]:
+        store.add(text, _payload(text))
+    store.find(TEXTS[0])
+    store.find(TEXTS[1])
+    # One over capacity evicts the excess plus a tenth of the capacity: the two oldest unused entries
+    store.add(TEXTS[10], _payload(TEXTS[10]))
+    assert len(store) == 9
+    assert store.stats()["evictions"] == 2
+    assert [_is_hot(store, text) for text in TEXTS[:11]] == [True, True, False, False] + [True] * 7
+
+
+def test_evicted_entries_still_match_their_exact_text(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), hot_capacity=1)
+    store.add(TEXTS[0], _payload(TEXTS[0]))
+    store.add(TEXTS[1], _payload(TEXTS[1]))
+    assert not _is_hot(store, TEXTS[0])
+    payload, score, _ = store.find(TEXTS[0])
+    assert payload == _payload(TEXTS[0]) and score == 100.0
+    assert store.stats()["cold_exact_hits"] == 1
+
+
+def test_entries_past_the_maximum_age_leave_the_hot_index(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    FeedbackStore(path)
+    with sqlite3.connect(path) as connection:
+        for created, text in ((time.time() - 7200, TEXTS[0]), (time.time(), TEXTS[1])):
+            connection.execute(
+                "INSERT INTO feedback (created, text_lower, payload) VALUES (?, ?, '{}')", (created, text)
+            )
+    store = FeedbackStore(path, max_age_seconds=3600)
+    assert len(store) == 1
+    assert not _is_hot(store, TEXTS[0]) and _is_hot(store, TEXTS[1])
+    assert store.find(TEXTS[0])[1] == 100.0
+
+
+def test_startup_loads_only_the_newest_rows(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    writer = FeedbackStore(path)
+    for text in TEXTS:
+        writer.add(text, _payload(text))
+    store = FeedbackStore(path, hot_capacity=4)
+    assert len(store) == 4
+    assert [_is_hot(store, text) for text in TEXTS] == [False] * 8 + [True] * 4
+
+
+def test_other_workers_rows_arrive_at_the_next_sync(tmp_path):
+    path = str(tmp_path / "feedback.db")
+    writer = FeedbackStore(path)
+    reader = FeedbackStore(path, sync_interval_seconds=3600)
+    writer.add(TEXTS[0], _payload(TEXTS[0]))
+    # Within the sync interval the reader keeps its hot index as it was
+    assert not _is_hot(reader, TEXTS[0])
+    reader.sync(force=True)
+    assert _is_hot(reader, TEXTS[0])
+
+    eager = FeedbackStore(path, sync_interval_seconds=0)
+    writer.add(TEXTS[1], _payload(TEXTS[1]))
+    assert _is_hot(eager, TEXTS[1])
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_worker_opens_its_own_connection(tmp_path):
+    store = FeedbackStore(str(tmp_path / "feedback.db"), sync_interval_seconds=0)
+    parent_connection = store._connect()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reopened = store._connect() is not parent_connection
+            store.add(TEXTS[0], _payload(TEXTS[0]))
+            os._exit(0 if reopened else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    assert store._connect() is parent_connection
+    assert store.find(TEXTS[0])[0] == _payload(TEXTS[0])
@@ -0,0 +1,111 @@
+# test_gazetteer.py
+"""Exact and fuzzy catalog matching of gazetteer.py against a brute-force reference."""
+import random
+import re
+
+from rapidfuzz import fuzz
+
+from gazetteer import Gazetteer
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+SYLLABLES = ["par", "ace", "ta", "mol", "amo", "xi", "cil", "lin", "dol", "ibu", "pro", "fen", "vit", "amin", "c"]
+FILLER = ["take", "the", "tablet", "twice", "daily", "after", "food", "and", "for", "days", "patient", "has", "fever"]
+
+
+def _catalog(rng, size):
+    names = ["Vitamin", "Vitamin C", "Vitamin C Forte", "C Forte", "Dolo 650", "Dolo"]
+    while len(names) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))) for _ in range(rng.randint(1, 3))]
+        if rng.random() < 0.3:
+            words.append(str(rng.choice([5, 10, 250, 500, 650])))
+        names.append(" ".join(words).title())
+    return names
+
+
+def _typo(rng, word):
+    index = rng.randrange(len(word))
+    return word[:index] + rng.choice("aeiou") + word[index + 1:]
+
+
+def _transcript(rng, names):
+    parts = []
+    for _ in range(rng.randint(5, 25)):
+        roll = rng.random()
+        if roll < 0.3:
+            parts.append(rng.choice(names))
+        elif roll < 0.4:
+            parts.append(_typo(rng, rng.choice(names)))
+        else:
+            parts.append(rng.choice(FILLER))
+    return " ".join(parts)
+
+
+def _reference(gazetteer, names, text, fuzzy_cutoff):
+    """Every window compared with every catalog name; longest exact hits first, then best fuzzy ones."""
+    keys = {}
+    for name in names:
+        keys.setdefault(tuple(TOKEN_RE.findall(name.lower())), name)
+    key_order = list(keys)
+    spans = [(match.start(), match.end(), match.group(0)) for match in TOKEN_RE.finditer(text.lower())]
+    tokens = [token for _, _, token in spans]
+    longest = max(len(key) for key in keys)
+
+    covered = [False] * len(spans)
+    chosen = []
+    exact = [(first, last) for first in range(len(tokens)) for last in range(first + 1, min(first + longest, len(tokens)) + 1)
+             if tuple(tokens[first:last]) in keys]
+    for first, last in sorted(exact, key=lambda hit: (hit[0] - hit[1], hit[0])):
+        if not any(covered[first:last]):
+            covered[first:last] = [True] * (last - first)
+            chosen.append((first, last, keys[tuple(tokens[first:last])], 100.0, "exact"))
+
+    fuzzy = []
+    for first in range(len(spans)):
+        if covered[first]:
+            continue
+        for last in range(first + 1, min(first + gazetteer.max_window_tokens, len(spans)) + 1):
+            if covered[last - 1]:
+                break
+            window = " ".join(tokens[first:last])
+            if len(window) < gazetteer.min_window_chars or window.replace(" ", "").isdigit():
+                continue
+            scores = [fuzz.ratio(window, " ".join(key)) for key in key_order]
+            best = max(scores)
+            if best >= fuzzy_cutoff:
+                fuzzy.append((first, last, keys[key_order[scores.index(best)]], best))
+    for first, last, name, score in sorted(fuzzy, key=lambda hit: (-hit[3], hit[0] - hit[1], hit[0])):
+        if not any(covered[first:last]):
+            covered[first:last] = [True] * (last - first)
+            chosen.append((first, last, name, score, "fuzzy"))
+
+    matches = []
+    for first, last, name, score, kind in sorted(chosen, key=lambda hit: hit[0]):
+        if name not in [match[0] for match in matches]:
+            matches.append((name, spans[first][0], spans[last - 1][1], score, kind))
+    return matches
+
+
+def test_find_matches_brute_force_reference():
+    rng = random.Random(11)
+    names = _catalog(rng, 300)
+    gazetteer = Gazetteer(names)
+    for _ in range(200):
+        text = _transcript(rng, names)
+        matches, _ = gazetteer.find(text)
+        assert [tuple(match) for match in matches] == _reference(gazetteer, names, text, gazetteer.fuzzy_cutoff)
+
+
+def test_longest_exact_name_wins_and_each_name_is_reported_once():
+    gazetteer = Gazetteer(["Vitamin", "Vitamin C", "C Forte", "Dolo 650"], fuzzy_cutoff=None)
+    matches, comparisons = gazetteer.find("Vitamin C forte daily, then vitamin C again and Dolo-650")
+    assert [(match.name, match.start, match.end, match.kind) for match in matches] == [
+        ("Vitamin C", 0, 9, "exact"), ("Dolo 650", 48, 56, "exact"),
+    ]
+    assert comparisons == 0
+
+
+def test_suffix_names_are_found_through_dictionary_links():
+    # "b c" is only reachable from the "a b c d" branch through failure/dictionary links
+    gazetteer = Gazetteer(["A B C D", "B C", "C"], fuzzy_cutoff=None)
+    matches, _ = gazetteer.find("a b c x c")
+    assert [(match.name, match.start, match.end) for match in matches] == [("B C", 2, 5), ("C", 8, 9)]
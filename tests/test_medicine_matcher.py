@@ -0,0 +1,73 @@
+# test_medicine_matcher.py
+"""MedicineMatcher against the linear fuzz.ratio scan over the catalog it replaces."""
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from medicine_matcher import MedicineMatcher
+
+SYLLABLES = ["par", "ace", "ta", "mol", "amo", "xi", "cil", "lin", "dol", "ibu", "pro", "fen", "vit", "amin", "c"]
+
+
+def _catalog(rng, size):
+    names = []
+    while len(names) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 3))]
+        names.append(" ".join(words).title())
+    # Repeats with other casing, so ties between equal names are exercised too
+    return names + [name.upper() for name in rng.sample(names, size // 20)]
+
+
+def _queries(rng, names, count):
+    queries = []
+    for _ in range(count):
+        query = rng.choice(names).lower()
+        for _ in range(rng.randint(0, 3)):
+            index = rng.randrange(len(query))
+            query = query[:index] + rng.choice("aeioumnst ") + query[index + 1:]
+        queries.append(query if rng.random() < 0.8 else query[:rng.randint(1, len(query))])
+    return queries
+
+
+def _linear_scan(names, query, score_cutoff):
+    """The scan best_match() replaces: the first catalog name with the highest fuzz.ratio."""
+    query_lower = query.lower()
+    for name in names:
+        if name.lower() == query_lower:
+            return name, 100.0
+    best_name, best_score = "N/A", 0.0
+    for name in names:
+        score = fuzz.ratio(query_lower, name.lower())
+        if score > best_score:
+            best_name, best_score = name, score
+    if best_score <= 0 or best_score < score_cutoff:
+        return "N/A", 0.0
+    return best_name, best_score
+
+
+@pytest.mark.parametrize("score_cutoff", [0.0, 50.0, 70.0, 85.0])
+def test_best_match_is_identical_to_linear_scan(score_cutoff):
+    rng = random.Random(int(score_cutoff))
+    names = _catalog(rng, 600)
+    matcher = MedicineMatcher(names)
+    for query in _queries(rng, names, 700):
+        assert matcher.best_match(query, score_cutoff) == _linear_scan(names, query, score_cutoff)
+
+
+def test_exact_hits_keep_the_first_catalog_casing():
+    matcher = MedicineMatcher(["Paracetamol", "PARACETAMOL", "Vitamin C"])
+    assert matcher.best_match("paracetamol") == ("Paracetamol", 100.0)
+    assert matcher.canonical("VITAMIN c") == "Vitamin C"
+    assert "vitamin c" in matcher and "vitamin" not in matcher
+    assert MedicineMatcher([]).best_match("paracetamol") == ("N/A", 0.0)
+
+
+@pytest.mark.parametrize("score_cutoff", [0.0, 70.0])
+def test_best_matches_is_identical_to_best_match(score_cutoff):
+    rng = random.Random(7)
+    names = _catalog(rng, 600)
+    matcher = MedicineMatcher(names)
+    queries = _queries(rng, names, 400)
+    queries += rng.sample(queries, 50) # repeated queries are scored once
+    assert matcher.best_matches(queries, score_cutoff) == [matcher.best_match(query, score_cutoff) for query in queries]
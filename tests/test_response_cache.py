@@ -0,0 +1,59 @@
+# test_response_cache.py
+"""Single-flight coalescing of response_cache.py for coroutines."""
+import asyncio
+import json
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def test_cancelled_leader_does_not_fail_coalesced_requests():
+    async def scenario():
+        cache = ResponseCache("test")
+        release = asyncio.Event()
+
+        async def compute():
+            await release.wait()
+            return {"medicines": ["Paracetamol"]}
+
+        leader = asyncio.ensure_future(cache.get_or_compute_async("key", compute))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(cache.get_or_compute_async("key", compute))
+        await asyncio.sleep(0)
+        leader.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        response, result = await follower
+        assert leader.cancelled()
+        assert result == "coalesced"
+        assert json.loads(response.body) == {"medicines": ["Paracetamol"]}
+        # The computation still completed and was stored for later requests
+        cached, result = await cache.get_or_compute_async("key", compute)
+        assert result == "hit" and cached.body == response.body
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_waiter_and_is_not_stored():
+    async def scenario():
+        cache = ResponseCache("test")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0)
+            raise ValueError("model failed")
+
+        results = await asyncio.gather(
+            cache.get_or_compute_async("key", compute), cache.get_or_compute_async("key", compute),
+            return_exceptions=True,
+        )
+        assert len(calls) == 1
+        assert all(isinstance(result, ValueError) for result in results)
+        with pytest.raises(ValueError):
+            await cache.get_or_compute_async("key", compute)
+        assert len(calls) == 2
+
+    asyncio.run(scenario())
+
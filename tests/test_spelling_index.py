@@ -0,0 +1,61 @@
+# test_spelling_index.py
+"""spelling_index.py gives SpellChecker().correction()'s answers, and leaves protected and numeric tokens alone."""
+import random
+
+import pytest
+from spellchecker import SpellChecker
+
+from spelling_index import SymSpellIndex
+
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+@pytest.fixture(scope="module")
+def spell():
+    return SpellChecker()
+
+
+@pytest.fixture(scope="module")
+def index(spell):
+    return SymSpellIndex(spell.word_frequency.dictionary, protected_words={"dolo", "amoxicillin", "paracetamol"})
+
+
+def _misspell(rng, word):
+    for _ in range(rng.randint(1, 2)):
+        i = rng.randrange(len(word))
+        edit = rng.choice("dirt")
+        if edit == "d" and len(word) > 2:
+            word = word[:i] + word[i + 1:]
+        elif edit == "i":
+            word = word[:i] + rng.choice(LETTERS) + word[i:]
+        elif edit == "r":
+            word = word[:i] + rng.choice(LETTERS) + word[i + 1:]
+        elif edit == "t" and i + 1 < len(word):
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+    return word
+
+
+def test_corrections_match_spellchecker(spell, index):
+    rng = random.Random(5)
+    words = sorted(word for word in spell.word_frequency.dictionary if 4 <= len(word) <= 8 and word.isalpha())
+    # 'wihfs' -> 'wish' needs a transposition after an edit, which restricted (OSA) distance misses
+    queries = ["wihfs"] + [_misspell(rng, rng.choice(words)) for _ in range(80)]
+    for query in queries:
+        expected = spell.correction(query) or query
+        corrected = index.correct_word(query)
+        # Equally frequent candidates at the same distance may be broken differently
+        assert corrected == expected or spell[corrected] == spell[expected], query
+
+
+def test_protected_words_are_never_corrected(index):
+    assert index.correct_word("Dolo") == "Dolo"
+    assert index.correct_word("dolo,") == "dolo,"
+    assert index.correct_word("(amoxicillin)") == "(amoxicillin)"
+    # Close misspellings are corrected towards them
+    assert index.correct_word("paracetmol") == "paracetamol"
+
+
+def test_numeric_and_punctuation_tokens_are_left_alone(index):
+    for token in ["650", "500mg", "2x", "1-0-1", ",", ".", "?"]:
+        assert index.correct_word(token) == token
+    assert index.correct_text("take dolo 650 , twice") == "take dolo 650 , twice"
@@ -0,0 +1,73 @@
+# test_text_chunker.py
+"""Chunk size limits and offset bookkeeping of text_chunker.py."""
+import random
+
+import pytest
+
+from text_chunker import chunk_text, stitch_entities
+
+WORDS = ["patient", "paracetamol", "500", "mg", "twice", "a", "day", "for", "five", "days", "fever", "cough"]
+
+
+def _transcript(seed, words, punctuated):
+    rng = random.Random(seed)
+    parts = []
+    for index in range(words):
+        parts.append(rng.choice(WORDS))
+        if punctuated and rng.random() < 0.08:
+            parts[-1] += "."
+    return " ".join(parts)
+
+
+@pytest.mark.parametrize("punctuated", [False, True])
+@pytest.mark.parametrize("max_chars, context_sentences", [(1000, 1), (1000, 2), (300, 0), (120, 1)])
+def test_chunks_including_context_fit_the_limit(punctuated, max_chars, context_sentences):
+    for seed in range(20):
+        text = _transcript(seed, 1500, punctuated)
+        chunks = chunk_text(text, max_chars, context_sentences)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert len(chunk.text) <= max_chars
+            assert chunk.text == text[chunk.start:chunk.end]
+            # The chunk holds all of its own text apart from surrounding whitespace
+            owned = text[chunk.owned_start:chunk.owned_end]
+            assert chunk.start <= chunk.owned_start + len(owned) - len(owned.lstrip())
+            assert chunk.end >= chunk.owned_end - (len(owned) - len(owned.rstrip()))
+        # Owned spans tile the text, so nothing is dropped or reported twice
+        assert chunks[0].owned_start == 0 and chunks[-1].owned_end == len(text)
+        assert all(left.owned_end == right.owned_start for left, right in zip(chunks, chunks[1:]))
+
+
+def test_single_overlong_token_is_hard_cut():
+    text = "x" * 2500
+    chunks = chunk_text(text, 1000, 1)
+    assert all(len(chunk.text) <= 1000 for chunk in chunks)
+    assert "".join(text[chunk.owned_start:chunk.owned_end] for chunk in chunks) == text
+
+
+def test_short_text_is_one_unchanged_chunk():
+    chunks = chunk_text("Paracetamol 500 mg twice a day.", 1000, 1)
+    assert [(chunk.text, chunk.start, chunk.end) for chunk in chunks] == [("Paracetamol 500 mg twice a day.", 0, 31)]
+
+
+def test_stitched_entities_use_global_offsets_once():
+    text = _transcript(7, 1500, True)
+    chunks = chunk_text(text, 1000, 1)
+    # One entity per occurrence of "paracetamol" that each chunk sees, context included
+    chunk_entities = []
+    for chunk in chunks:
+        entities = []
+        position = chunk.text.find("paracetamol")
+        while position >= 0:
+            entities.append({"word": "paracetamol", "start": position, "end": position + 11})
+            position = chunk.text.find("paracetamol", position + 1)
+        chunk_entities.append(entities)
+    stitched = stitch_entities(chunks, chunk_entities)
+    starts = [entity["start"] for entity in stitched]
+    expected = []
+    position = text.find("paracetamol")
+    while position >= 0:
+        expected.append(position)
+        position = text.find("paracetamol", position + 1)
+    assert starts == expected
+    assert all(text[entity["start"]:entity["end"]] == "paracetamol" for entity in stitched)
@@ -0,0 +1,58 @@
+# test_typeahead.py
+"""Ranking of typeahead.py against a brute-force reference."""
+import random
+
+from typeahead import TypeaheadIndex
+
+SYLLABLES = ["par", "ace", "ta", "mol", "amo", "xi", "cil", "lin", "dol", "ibu", "pro", "fen", "vit", "amin", "c"]
+
+
+def _catalog(rng, size):
+    names = set()
+    while len(names) < size:
+        words = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 3))]
+        names.add(" ".join(words).title())
+    return sorted(names)
+
+
+def _reference(names, counts, prefix, limit):
+    """The ranking rule spelled out: every matching name, most confirmed first, then name starts, alphabetically."""
+    def word_starts(name_lower):
+        return [index for index in range(1, len(name_lower))
+                if name_lower[index].isalnum() and not name_lower[index - 1].isalnum()]
+    by_name = [name for name in names if name.lower().startswith(prefix)]
+    by_word = sorted(
+        ((name.lower()[start:], name) for name in names for start in word_starts(name.lower())
+         if name.lower().startswith(prefix, start)),
+    )
+    popular = sorted((name for name in names if counts.get(name) and name in by_name + [name for _, name in by_word]),
+                     key=lambda name: (-counts[name], names.index(name)))
+    ranked = []
+    for name in popular + sorted(by_name, key=str.lower) + [name for _, name in by_word]:
+        if name not in ranked:
+            ranked.append(name)
+    return ranked[:limit]
+
+
+def test_suggest_matches_reference_ranking_as_feedback_arrives():
+    rng = random.Random(3)
+    names = _catalog(rng, 400)
+    index = TypeaheadIndex(names, top_k=10)
+    counts = {}
+    for round_index in range(5):
+        for name in rng.sample(names, 60):
+            count = rng.randint(1, 3)
+            index.record(name, count)
+            counts[name] = counts.get(name, 0) + count
+        for name in rng.sample(names, 40):
+            prefix = name.lower()[:rng.randint(1, 4)].strip()
+            for limit in (1, 5, 10):
+                suggestions, match = index.suggest(prefix, limit)
+                assert match == "prefix"
+                assert suggestions == _reference(names, counts, prefix, limit)
+
+
+def test_fuzzy_fallback_ranks_close_prefixes():
+    index = TypeaheadIndex(["Paracetamol", "Pantoprazole", "Amoxicillin", "Azithromycin"])
+    assert index.suggest("paracetomol", 5) == (["Paracetamol"], "fuzzy")
+    assert index.suggest("xyz", 5) == ([], "none")
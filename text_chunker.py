@@ -0,0 +1,137 @@
+# text_chunker.py
+"""
+Sentence-aware chunking of long consultation transcripts for the /ner model stages.
+
+The grammar T5 model generates at most 128 tokens and the NER and summary models
+have fixed context windows, so a long transcript is split into chunks of whole
+sentences that each fit the model. Chunks are run through the stage as one batch and
+the results are stitched back together, so latency grows linearly with transcript
+length and no text is dropped. Texts that already fit are passed through as a
+single chunk, unchanged.
+
+A chunk may carry neighbouring sentences as read-only context. Only results that
+start inside the chunk's own sentences (`owned_start`..`owned_end`, global offsets)
+are kept, so an entity near a chunk boundary is recognised with context on both
+sides and reported exactly once.
+"""
+import re
+from typing import List, NamedTuple, Tuple
+
+# A sentence runs up to and including its terminal punctuation (or the end of the text)
+_SENTENCE_RE = re.compile(r'[^.!?\n]+(?:[.!?]+|\n|$)')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class TextChunk(NamedTuple):
+    text: str # text[start:end] of the original transcript
+    start: int # global offset of the chunk text
+    end: int
+    owned_start: int # global span of the sentences this chunk reports results for
+    owned_end: int
+
+
+def sentence_spans(text: str, max_chars: int) -> List[Tuple[int, int]]:
+    """
+    (start, end) spans of the sentences of `text`, with surrounding whitespace excluded.
+    Sentences longer than `max_chars` are split further at whitespace.
+    """
+    spans = []
+    for match in _SENTENCE_RE.finditer(text):
+        start, end = match.start(), match.end()
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        while end - start > max_chars:
+            # Cut at the last whitespace inside the limit, or hard-cut a single overlong token
+            cut = text.rfind(' ', start + 1, start + max_chars + 1)
+            if cut <= start:
+                cut = start + max_chars
+            spans.append((start, cut))
+            start = cut
+            while start < end and text[start].isspace():
+                start += 1
+        if end > start:
+            spans.append((start, end))
+    return spans
+
+
+def chunk_text(text: str, max_chars: int, context_sentences: int = 0) -> List[TextChunk]:
+    """
+    Packs consecutive sentences of `text` into chunks of at most `max_chars` characters,
+    context included. With `context_sentences`, each chunk also includes up to that many
+    neighbouring sentences on either side as context. A quarter of `max_chars` per side
+    is reserved for it, and context that does not fit is cut at whitespace next to the
+    chunk's own sentences (or left out).
+    """
+    if len(text) <= max_chars:
+        return [TextChunk(text, 0, len(text), 0, len(text))]
+
+    context_chars = max_chars // 4 if context_sentences > 0 else 0
+    owned_chars = max_chars - 2 * context_chars
+    spans = sentence_spans(text, owned_chars)
+    groups = [] # [first_sentence_index, last_sentence_index]
+    for index, (start, end) in enumerate(spans):
+        if groups and end - spans[groups[-1][0]][0] <= owned_chars:
+            groups[-1][1] = index
+        else:
+            groups.append([index, index])
+
+    chunks = []
+    for group_index, (first, last) in enumerate(groups):
+        context_first = max(0, first - context_sentences)
+        context_last = min(len(spans) - 1, last + context_sentences)
+        start = _context_start(text, spans[context_first][0], spans[first][0], context_chars)
+        end = _context_end(text, spans[context_last][1], spans[last][1], context_chars)
+        # Owned spans tile the whole text, so whitespace between sentences belongs somewhere too
+        owned_start = 0 if group_index == 0 else spans[first][0]
+        owned_end = len(text) if group_index == len(groups) - 1 else spans[groups[group_index + 1][0]][0]
+        chunks.append(TextChunk(text[start:end], start, end, owned_start, owned_end))
+    return chunks
+
+
+def _context_start(text: str, start: int, own_start: int, context_chars: int) -> int:
+    """`start`, moved forward to a word start so that at most `context_chars` precede `own_start`."""
+    if own_start - start <= context_chars:
+        return start
+    cut = text.find(' ', own_start - context_chars, own_start)
+    if cut < 0:
+        return own_start
+    while cut < own_start and text[cut].isspace():
+        cut += 1
+    return cut
+
+
+def _context_end(text: str, end: int, own_end: int, context_chars: int) -> int:
+    """`end`, moved back to a word end so that at most `context_chars` follow `own_end`."""
+    if end - own_end <= context_chars:
+        return end
+    cut = text.rfind(' ', own_end, own_end + context_chars + 1)
+    if cut < 0:
+        return own_end
+    while cut > own_end and text[cut - 1].isspace():
+        cut -= 1
+    return cut
+
+
+def join_chunk_outputs(outputs: List[str]) -> str:
+    """Joins per-chunk text outputs (corrected text, summaries) back into one text."""
+    return _WHITESPACE_RE.sub(' ', ' '.join(output.strip() for output in outputs)).strip()
+
+
+def stitch_entities(chunks: List[TextChunk], chunk_entities: List[List[dict]]) -> List[dict]:
+    """
+    Shifts each chunk's entity `start`/`end` to global offsets and keeps only the
+    entities that start inside the chunk's owned sentences.
+    """
+    stitched = []
+    for chunk, entities in zip(chunks, chunk_entities):
+        for entity in entities:
+            start = entity.get("start")
+            if start is None:
+                stitched.append(entity)
+                continue
+            start += chunk.start
+            if chunk.owned_start <= start < chunk.owned_end:
+                stitched.append({**entity, "start": start, "end": entity["end"] + chunk.start})
+    return stitched
@@ -0,0 +1,173 @@
+# tracing.py
+"""
+Sampled per-request tracing for app.py and backend_app.py.
+
+Each request decides once, at entry, whether it is traced (MEDICARE_TRACE_SAMPLE_RATE,
+changeable at runtime through /debug/traces). Unsampled requests only pay for a
+random draw and a context-variable lookup per trace point; nothing is formatted or
+copied. A sampled request records structured events (entities, catalog matches,
+extracted details) and stage spans, and its finished trace goes into a bounded
+ring buffer that /debug/traces reads.
+
+Traces hold raw transcripts, so /debug/traces is disabled (404) unless
+MEDICARE_DEBUG_TOKEN is set, and then requires "Authorization: Bearer <token>"
+for both reading traces and changing the sample rate.
+"""
+import contextvars
+import hmac
+import itertools
+import os
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+_current_trace = contextvars.ContextVar("medicare_trace", default=None)
+
+
+def _snapshot(value):
+    """JSON-safe copy of a traced value (numpy scalars become Python numbers)."""
+    if isinstance(value, dict):
+        return {str(key): _snapshot(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_snapshot(item) for item in value]
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if hasattr(value, "item"):
+        return value.item()
+    return repr(value)
+
+
+class Trace:
+    """Events and stage spans of one sampled request."""
+
+    def __init__(self, trace_id, name, fields):
+        self.trace_id = trace_id
+        self.name = name
+        self.fields = fields
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+        self.error = None
+        self.events = []
+
+    def _offset_ms(self, perf_counter_value):
+        return round((perf_counter_value - self._started) * 1000, 3)
+
+    def event(self, name, fields):
+        # Copied so later in-place changes (e.g. token merging) don't rewrite the record
+        self.events.append({"at_ms": self._offset_ms(time.perf_counter()), "event": name, **_snapshot(fields)})
+
+    def span(self, name, started, duration_s):
+        self.events.append({"at_ms": self._offset_ms(started), "span": name, "duration_ms": round(duration_s * 1000, 3)})
+
+    def finish(self):
+        self.duration_ms = self._offset_ms(time.perf_counter())
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "error": self.error,
+            **self.fields,
+            "events": self.events,
+        }
+
+
+class Tracer:
+    """Decides which requests are traced and keeps the most recent finished traces."""
+
+    def __init__(self, sample_rate=0.0, buffer_size=200, debug_token=None):
+        self.sample_rate = sample_rate
+        self.debug_token = debug_token or None
+        self._traces = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.sampled = 0
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            float(os.environ.get("MEDICARE_TRACE_SAMPLE_RATE", "0")),
+            int(os.environ.get("MEDICARE_TRACE_BUFFER_SIZE", "200")),
+            os.environ.get("MEDICARE_DEBUG_TOKEN"),
+        )
+
+    def debug_access_status(self, authorization):
+        """
+        HTTP status for a /debug/traces call with this Authorization header value:
+        200 if allowed, 404 if no debug token is configured, 401 if the token is missing or wrong.
+        """
+        if self.debug_token is None:
+            return 404
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not hmac.compare_digest(token.strip().encode(), self.debug_token.encode()):
+            return 401
+        return 200
+
+    @property
+    def sample_rate(self):
+        return self._sample_rate
+
+    @sample_rate.setter
+    def sample_rate(self, value):
+        value = float(value)
+        if not 0.0 <= value <= 1.0:
+            raise ValueError(f"sample_rate must be between 0 and 1, got {value}")
+        self._sample_rate = value
+
+    @contextmanager
+    def request(self, name, **fields):
+        """Traces the `with` block as one request if it is sampled; yields the Trace or None."""
+        if self._sample_rate <= 0.0 or random.random() >= self._sample_rate:
+            yield None
+            return
+        trace = Trace(next(self._ids), name, _snapshot(fields))
+        token = _current_trace.set(trace)
+        try:
+            yield trace
+        except BaseException as e:
+            trace.error = repr(e)
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.finish()
+            with self._lock:
+                self._traces.append(trace)
+                self.sampled += 1
+
+    def traces(self, limit=None):
+        """Finished traces, newest first."""
+        with self._lock:
+            traces = list(self._traces)
+        traces.reverse()
+        return [trace.to_dict() for trace in traces[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sample_rate": self._sample_rate,
+                "buffer_size": self._traces.maxlen,
+                "buffered": len(self._traces),
+                "sampled": self.sampled,
+            }
+
+
+TRACER = Tracer.from_env()
+
+
+def trace_event(event, /, **fields):
+    """Records a structured event on the current request's trace; a no-op when it isn't sampled."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event(event, fields)
+
+
+def trace_span(name, started, duration_s):
+    """Records a timed stage (perf_counter start, duration in seconds) on the current trace, if any."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.span(name, started, duration_s)
@@ -0,0 +1,161 @@
+# typeahead.py
+"""
+Prefix autocomplete over the medicine catalog for per-keystroke suggestions.
+
+Built once when the catalog loads. The lowercase names are kept sorted, and so is
+every word-start suffix of them ("vitamin c" is also found under "c"), so the
+names starting with a typed prefix are one contiguous range found by bisect. The
+top k are the names most often confirmed in doctor feedback, then names starting
+with the prefix before names with a later word starting with it, alphabetically.
+Feedback counts only grow, so each prefix of a confirmed name keeps its own
+bounded list of the `top_k` most confirmed names, updated when the name is
+recorded. A keystroke is then O(log n + k) and never touches a model. Only when
+no name has the prefix is the query compared, as a possibly misspelled prefix,
+against the first characters of the names sharing its first character, with
+rapidfuzz.
+"""
+import bisect
+import re
+import threading
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_RANGE_END = "\U0010ffff" # sorts after every character a name can continue with
+
+
+class TypeaheadIndex:
+    """Sorted-array prefix index with feedback-frequency ranking and a fuzzy fallback."""
+
+    def __init__(self, names, fuzzy_cutoff=75.0, top_k=50):
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.top_k = top_k # most confirmed names kept per prefix; suggest() limits above it fill alphabetically
+        self.names = []
+        self._names_lower = []
+        self._ids_by_lower = {}
+        for name in names:
+            name_lower = name.lower()
+            if name_lower not in self._ids_by_lower: # the first catalog casing wins
+                self._ids_by_lower[name_lower] = len(self.names)
+                self.names.append(name)
+                self._names_lower.append(name_lower)
+
+        # Whole names, and suffixes starting at a later word, each sorted for bisect
+        name_order = sorted(range(len(self.names)), key=self._names_lower.__getitem__)
+        self._name_keys = [self._names_lower[name_id] for name_id in name_order]
+        self._name_key_ids = name_order
+        word_keys = sorted(
+            (name_lower[word.start():], name_id)
+            for name_id, name_lower in enumerate(self._names_lower)
+            for word in list(_WORD_RE.finditer(name_lower))[1:]
+        )
+        self._word_keys = [key for key, _ in word_keys]
+        self._word_key_ids = [name_id for _, name_id in word_keys]
+
+        self._counts = {} # name id -> times confirmed in feedback
+        self._popular = {} # prefix -> up to top_k name ids having it, by count, highest first
+        self._name_prefixes = {} # name id -> its prefixes, for names recorded so far
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.names)
+
+    # --- Popularity ---
+    def record(self, name, count=1):
+        """Counts `name` as chosen `count` more times; names outside the catalog are ignored."""
+        name_id = self._ids_by_lower.get(name.lower())
+        if name_id is None or count <= 0: # counts only grow
+            return
+        with self._lock:
+            counts = self._counts
+            counts[name_id] = counts.get(name_id, 0) + count
+            rank = (-counts[name_id], name_id)
+            for prefix in self._prefixes(name_id):
+                top = self._popular.get(prefix, [])
+                # Always a new list, so a concurrent suggest() never sees one half-updated
+                if name_id in top:
+                    position = top.index(name_id)
+                    if position == 0 or (-counts[top[position - 1]], top[position - 1]) < rank:
+                        continue # still in order
+                    top = top[:position] + top[position + 1:]
+                elif len(top) >= self.top_k and rank > (-counts[top[-1]], top[-1]):
+                    continue
+                else:
+                    top = list(top)
+                # Walk up from the end to the name's place
+                position = len(top)
+                while position and (-counts[top[position - 1]], top[position - 1]) > rank:
+                    position -= 1
+                top.insert(position, name_id)
+                self._popular[prefix] = top[:self.top_k]
+
+    def record_feedback(self, payload):
+        """Counts every corrected medicine of one stored feedback entry (FeedbackRequest.dict())."""
+        for medicine in payload.get('corrected_medicines', []):
+            self.record(medicine['name'])
+
+    def _prefixes(self, name_id):
+        """Every prefix a query can match `name_id` by: of the whole name and of each word-start suffix."""
+        prefixes = self._name_prefixes.get(name_id)
+        if prefixes is None:
+            name_lower = self._names_lower[name_id]
+            starts = {0} | {word.start() for word in _WORD_RE.finditer(name_lower)}
+            prefixes = self._name_prefixes[name_id] = tuple(
+                {name_lower[start:end] for start in starts for end in range(start + 1, len(name_lower) + 1)}
+            )
+        return prefixes
+
+    # --- Lookup ---
+    @staticmethod
+    def _prefix_range(keys, prefix):
+        return bisect.bisect_left(keys, prefix), bisect.bisect_left(keys, prefix + _RANGE_END)
+
+    def suggest(self, query, limit=10):
+        """Returns (up to `limit` catalog names, "prefix" | "fuzzy" | "none") for a partially typed name."""
+        prefix = query.strip().lower()
+        if not prefix or limit <= 0:
+            return [], "none"
+
+        chosen = []
+        seen = set()
+
+        def take(name_id):
+            if name_id not in seen:
+                seen.add(name_id)
+                chosen.append(name_id)
+            return len(chosen) >= limit
+
+        for name_id in self._popular.get(prefix, ()):
+            if take(name_id):
+                break
+        for keys, key_ids in ((self._name_keys, self._name_key_ids), (self._word_keys, self._word_key_ids)):
+            if len(chosen) >= limit:
+                break
+            low, high = self._prefix_range(keys, prefix)
+            # At most top_k + limit entries are visited, whatever the range size
+            for index in range(low, high):
+                if take(key_ids[index]):
+                    break
+        if chosen:
+            return [self.names[name_id] for name_id in chosen], "prefix"
+        suggestions = self._fuzzy_suggest(prefix, limit)
+        return suggestions, ("fuzzy" if suggestions else "none")
+
+    def _fuzzy_suggest(self, prefix, limit):
+        """
+        Names whose first len(prefix) characters are closest to `prefix` (a mistyped prefix).
+        Only names sharing the prefix's first character are compared, one bisect range.
+        """
+        low, high = self._prefix_range(self._name_keys, prefix[0])
+        if low == high:
+            return []
+        heads = [key[:len(prefix)] for key in self._name_keys[low:high]]
+        scores = process.cdist([prefix], heads, scorer=fuzz.ratio, score_cutoff=self.fuzzy_cutoff,
+                               dtype=np.float64)[0]
+        hits = np.flatnonzero(scores > 0)
+        name_ids = self._name_key_ids
+        counts = self._counts
+        # Hits are in name order already, and sorted() is stable
+        ranked = sorted(hits, key=lambda hit: (-scores[hit], -counts.get(name_ids[low + hit], 0)))
+        return [self.names[name_ids[low + hit]] for hit in ranked[:limit]]